@@ -0,0 +1,76 @@
+"""Compare the incremental entities summary index with the former full rebuild.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_entities_summary
+"""
+import time
+
+from types import SimpleNamespace
+
+from custom_components.perplexity_assistant.summary import EntitiesSummaryIndex
+
+from .fixtures import build_install
+
+
+SIZES: list[int] = [1_000, 10_000, 50_000]
+UPDATES: int = 1_000
+
+
+def full_rebuild(install: SimpleNamespace) -> str:
+    """Reference implementation: the summary as it was built before the index existed."""
+    entities = install.hass.states.async_all()
+    summary = f"The Home Assistant instance has {len(entities)} entities."
+    for entity in entities:
+        ha_entity = install.entity_registry.async_get(entity.entity_id)
+        ha_device = install.device_registry.async_get(ha_entity.device_id) if ha_entity else None
+        room = ha_device.area_id if ha_device and hasattr(ha_device, "area_id") else None
+        summary += f"\n- {entity.entity_id}: {entity.state} (in room: {room})"
+    return summary
+
+
+def build_index(install: SimpleNamespace) -> EntitiesSummaryIndex:
+    """Create an index wired to the synthetic installation (without the event bus)."""
+    index = EntitiesSummaryIndex(install.hass)
+    index._entity_registry = install.entity_registry
+    index._device_registry = install.device_registry
+    index._async_rebuild()
+    return index
+
+
+def timed(func, repeat: int = 1) -> float:
+    """Return the mean duration of `func` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main() -> None:
+    print(f"{'entities':>9} | {'full rebuild':>12} | {'index build':>11} | {'event update':>12} | {'read (clean)':>12} | {'read (dirty)':>12}")
+    for size in SIZES:
+        install = build_install(size)
+        index = build_index(install)
+        assert index.get_summary() == full_rebuild(install), "index and full rebuild disagree"
+
+        entity_ids = list(install.states)
+        events = [
+            SimpleNamespace(data={"entity_id": entity_ids[i % size], "new_state": SimpleNamespace(state=str(i), name=install.states[entity_ids[i % size]].name)})
+            for i in range(UPDATES)
+        ]
+
+        rebuild_ms = timed(lambda: full_rebuild(install), repeat=3)
+        build_ms = timed(lambda: build_index(install), repeat=3)
+        update_ms = timed(lambda: [index._async_on_state_changed(e) for e in events]) / UPDATES
+        clean_ms = timed(lambda: index.get_summary(), repeat=1000)
+
+        def dirty_read() -> None:
+            index._async_on_state_changed(events[0])
+            index._dirty = True
+            index.get_summary()
+
+        dirty_ms = timed(dirty_read, repeat=20)
+        print(f"{size:>9} | {rebuild_ms:>10.2f}ms | {build_ms:>9.2f}ms | {update_ms * 1000:>10.2f}us | {clean_ms * 1000:>10.2f}us | {dirty_ms:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare the encodings of the entities summary: size, build time and answerability.
+
+For synthetic installations of several sizes, reports for each format the size of the
+full summary (bytes, tokens estimated from the length and from the word pieces), the
+time to encode it from scratch (the lines are maintained per entity, so only their join is
+timed for the lines format), and the share of the entities the fixture prompts are
+about whose ID, room and state can be read back from the text. The compact formats
+leave out the diagnostic entities, and the terse one only counts the unavailable and
+unknown ones, which is what keeps their answerability below 100%.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_entity_encoding
+"""
+import re
+import time
+
+from custom_components.perplexity_assistant.const import ENTITIES_FORMAT_LINES, ENTITIES_FORMATS
+from custom_components.perplexity_assistant.encoding import measure
+from custom_components.perplexity_assistant.summary import EntitiesSummaryIndex
+
+from .bench_entities_summary import build_index
+from .eval_entity_context import build_prompts
+from .fixtures import build_install
+
+
+SIZES: list[int] = [200, 2_000, 10_000]
+REPEAT: int = 5
+ITEM_PATTERN: re.Pattern = re.compile(r"\s*(?:\((?P<state>[^:()]+): (?P<collapsed>[^)]*)\)|(?P<stem>\w+)\{(?P<members>[^}]*)\}|(?P<item>[^,]+))")
+
+
+def decode(summary: str, entity_format: str) -> dict[str, tuple[str | None, str]]:
+    """Read the entities back from a summary, as a model would.
+
+    Args:
+        summary (str): Summary returned by the index.
+        entity_format (str): Encoding of the summary.
+    Returns:
+        dict[str, tuple[str | None, str]]: Room and state of each entity listed.
+    """
+    entities: dict[str, tuple[str | None, str]] = {}
+    for line in summary.split("\n- ")[1:]:
+        if entity_format == ENTITIES_FORMAT_LINES:
+            entity_id, rest = line.split(": ", 1)
+            state, _, room = rest.rpartition(" (in room: ")
+            entities[entity_id] = (room.rstrip(")"), state)
+            continue
+
+        room, groups = line.split(": ", 1)
+        room = room.removeprefix("room ")
+        for group in groups.split("; "):
+            domain, items = group.split(": ", 1)
+            for match in ITEM_PATTERN.finditer(items):
+                if match["collapsed"]:
+                    pairs = [(object_id, match["state"]) for object_id in match["collapsed"].split(", ")]
+                elif match["stem"]:
+                    pairs = [(match["stem"] + object_id, state) for object_id, _, state in (member.partition("=") for member in match["members"].split(", "))]
+                else:
+                    object_id, _, state = match["item"].partition("=")
+                    pairs = [(object_id, state)] if state else [] # Counted entities cannot be read back
+                for object_id, state in pairs:
+                    entities[f"{domain}.{object_id}"] = (room, state)
+    return entities
+
+
+def build_time(index: EntitiesSummaryIndex, entity_format: str) -> float:
+    """Return the mean time to encode the full summary from scratch, in milliseconds."""
+    durations: list[float] = []
+    for _ in range(REPEAT):
+        index._dirty = True
+        index._encoded.clear()
+        start = time.perf_counter()
+        index.get_summary(0.0, entity_format)
+        durations.append((time.perf_counter() - start) * 1000)
+    return sum(durations) / len(durations)
+
+
+def main() -> None:
+    print(f"{'entities':>9} | {'format':>7} | {'bytes':>9} | {'tokens':>7} | {'pieces':>7} | {'vs lines':>8} | {'build':>8} | {'answerable':>10}")
+
+    for size in SIZES:
+        install = build_install(size)
+        index = build_index(install)
+        prompts = build_prompts(install)
+        expected = set().union(*(entities for _prompt, entities in prompts))
+        reference = measure(index.get_summary(0.0, ENTITIES_FORMAT_LINES))
+
+        for entity_format in ENTITIES_FORMATS:
+            summary = index.get_summary(0.0, entity_format)
+            size_of = measure(summary)
+
+            decoded = decode(summary, entity_format)
+            answerable = sum(
+                decoded.get(entity_id) == (str(index._rooms.get(entity_id)), install.states[entity_id].state)
+                for entity_id in expected
+            )
+            print(
+                f"{size:>9} | {entity_format:>7} | {size_of['bytes']:>9} | {size_of['tokens']:>7} | {size_of['token_pieces']:>7} | "
+                f"{100 * size_of['token_pieces'] / reference['token_pieces']:>7.1f}% | {build_time(index, entity_format):>6.2f}ms | "
+                f"{100 * answerable / len(expected):>9.1f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
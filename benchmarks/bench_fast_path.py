@@ -0,0 +1,82 @@
+"""Compare the latency of commands recognized locally with a round trip to the API.
+
+The local time covers matching the command against the entities index (the
+service call itself is Home Assistant's and is the same on both paths). The
+remote time is a request to the local API stand-in, so it excludes Internet
+latency: the real gap is larger.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_fast_path
+"""
+import asyncio
+import statistics
+import time
+
+from types import SimpleNamespace
+
+from custom_components.perplexity_assistant import fastpath
+from custom_components.perplexity_assistant.client import PerplexityClient
+from custom_components.perplexity_assistant.fastpath import FastPathMatcher
+
+from .bench_entities_summary import build_index
+from .fixtures import build_install
+from .standin import PerplexityStandIn
+
+
+SIZES: list[int] = [1_000, 10_000, 50_000]
+REMOTE_RUNS: int = 10
+PROMPTS: list[tuple[str, str]] = [
+    ("Turn on the kitchen lights", "en"),
+    ("turn the office fan off", "en"),
+    ("Éteins les lumières du garage", "fr"),
+    ("Schalte das Licht im Bedroom aus", "de"),
+    ("Open the living room covers", "en"),
+    ("What is the weather like tomorrow?", "en"),      # Falls through to the API
+]
+PAYLOAD: dict = {"model": "sonar", "messages": [{"role": "user", "content": "Turn on the kitchen lights"}]}
+
+
+def measure_local(size: int) -> tuple[float, dict]:
+    """Return the median time in milliseconds to match a prompt, and the matcher counters."""
+    install = build_install(size)
+    fastpath.area_registry = SimpleNamespace(async_get=lambda hass: install.area_registry)
+    matcher = FastPathMatcher(install.hass, build_index(install))
+    matcher._index._unsubscribers = [lambda: None]  # Mark the index as started (no event bus here)
+
+    durations: list[float] = []
+    for _ in range(20):
+        for prompt, language in PROMPTS:
+            start = time.perf_counter()
+            matcher.match(prompt, [language])
+            durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), matcher.stats
+
+
+async def measure_remote() -> float:
+    """Return the median time in milliseconds of a request to the API stand-in."""
+    standin = PerplexityStandIn()
+    client = PerplexityClient(None, base_url=await standin.async_start())
+    durations: list[float] = []
+
+    try:
+        for _ in range(REMOTE_RUNS):
+            start = time.perf_counter()
+            await client.async_post(PAYLOAD, "pplx-benchmark")
+            durations.append((time.perf_counter() - start) * 1000)
+    finally:
+        await client.async_close()
+        await standin.async_stop()
+    return statistics.median(durations)
+
+
+def main() -> None:
+    print(f"{'entities':>9} | {'local match':>11} | {'fast path rate':>14}")
+    for size in SIZES:
+        local_ms, stats = measure_local(size)
+        print(f"{size:>9} | {local_ms:>9.3f}ms | {stats['rate']:>13.1f}%")
+
+    print(f"remote round trip (stand-in, no Internet latency): {asyncio.run(measure_remote()):.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Measure the time and allocations of building and serializing a request body.
+
+"before" rebuilds the SYSTEM_STATUS message and the full payload dict with a
+configuration lookup per field, then serializes everything (as the HTTP client
+does for a JSON body). "after" renders the precompiled request template: only
+the dynamic fields are built and serialized, after the static prefix.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_payload_build
+"""
+import json
+import time
+import tracemalloc
+
+from datetime import datetime
+from typing import Any
+
+from custom_components.perplexity_assistant.const import *
+from custom_components.perplexity_assistant.conversation import PerplexityAgent
+from custom_components.perplexity_assistant.template import RequestTemplate
+
+from .bench_entities_summary import build_index
+from .fixtures import build_install
+
+
+RUNS: int = 2_000
+ENTITIES: int = 200     # A summary of about the size sent once reduced to the relevant entities
+OPTIONS: dict = {CONF_MODEL: "sonar-pro", CONF_MAX_TOKENS: 400, CONF_LANGUAGE: "en"}
+DATA: dict = {CONF_API_KEY: "pplx-benchmark", CONF_ALLOW_ACTIONS_ON_ENTITIES: True}
+USER_MESSAGES: list[dict] = [{"role": "user", "content": "USER SYSTEM PROMPT:  | USER PROMPT: Turn off the kitchen lights"}]
+
+
+def get_config(key: str, default: Any = None) -> Any:
+    """Same lookup as PerplexityAgent._get_config."""
+    return OPTIONS.get(key, DATA.get(key, default))
+
+
+def build_before(entities_summary: str) -> bytes:
+    """Build and serialize a request the way it was done before the request template."""
+    SYSTEM_STATUS = f"""
+            DATE & TIME: {datetime.now()}
+            HOME ASSISTANT VERSION: 2026.2.0
+            ENTITIES: {entities_summary}
+            YOUR NAME IS Perplexity
+            AUTHORIZATIONS
+                - enable_vocal_notifications={get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS)}
+                - enable_actions_on_entities={get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES)}
+            USER NAME: AUTOMATED SERVICE CALL
+            USER LANGUAGE: {get_config(CONF_LANGUAGE, 'en')}
+            """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "system", "content": SYSTEM_STATUS}]
+    messages.extend(USER_MESSAGES)
+    payload = {
+        "model": get_config(CONF_MODEL, DEFAULT_MODEL),
+        "messages": messages,
+        "stream": False,
+        "max_tokens": get_config(CONF_MAX_TOKENS, DEFAULT_MAX_TOKENS),
+        "temperature": get_config(CONF_CREATIVITY, DEFAULT_CREATIVITY),
+        "top_p": get_config(CONF_DIVERSITY, DEFAULT_DIVERSITY),
+        "frequency_penalty": get_config(CONF_FREQUENCY_PENALTY, DEFAULT_FREQUENCY_PENALTY),
+        "response_format": PerplexityAgent.RESPONSE_FORMAT,
+        "disable_search": not get_config(CONF_ENABLE_WEBSEARCH, DEFAULT_ENABLE_WEBSEARCH),
+    }
+    _headers = {"Authorization": f"Bearer {get_config(CONF_API_KEY, '')}"}
+    return json.dumps(payload).encode()
+
+
+def compile_template() -> RequestTemplate:
+    """Compile the template with the same configuration."""
+    return RequestTemplate(
+        model=get_config(CONF_MODEL, DEFAULT_MODEL),
+        enable_websearch=get_config(CONF_ENABLE_WEBSEARCH, DEFAULT_ENABLE_WEBSEARCH),
+        max_tokens=get_config(CONF_MAX_TOKENS, DEFAULT_MAX_TOKENS),
+        temperature=get_config(CONF_CREATIVITY, DEFAULT_CREATIVITY),
+        top_p=get_config(CONF_DIVERSITY, DEFAULT_DIVERSITY),
+        frequency_penalty=get_config(CONF_FREQUENCY_PENALTY, DEFAULT_FREQUENCY_PENALTY),
+        response_format=PerplexityAgent.RESPONSE_FORMAT,
+        system_prompt=SYSTEM_PROMPT,
+        agent_name="Perplexity",
+        ha_version="2026.2.0",
+        language=get_config(CONF_LANGUAGE, "en"),
+        enable_vocal_notifications=get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS),
+        allow_actions=get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES),
+        allow_entities=True,
+        api_keys=[get_config(CONF_API_KEY, "")],
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+    )
+
+
+def build_after(template: RequestTemplate, entities_summary: str) -> bytes:
+    """Build and serialize a request with the precompiled template."""
+    status = template.system_status(entities_summary, "AUTOMATED SERVICE CALL")
+    return template.serialize(template.payload(USER_MESSAGES, status))
+
+
+def measure(build) -> tuple[float, int]:
+    """Return (microseconds per build, peak bytes allocated during a build)."""
+    build()
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        build()
+    elapsed = (time.perf_counter() - start) / RUNS * 1_000_000
+
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    entities_summary = build_index(build_install(ENTITIES)).get_summary(0)
+    template = compile_template()
+
+    before, after = build_before(entities_summary), build_after(template, entities_summary)
+    strip = lambda body: {**json.loads(body), "messages": None}
+    assert strip(before) == strip(after), "The template must produce the same body"
+
+    print(f"body: {len(after) / 1024:.1f} KiB ({len(entities_summary) / 1024:.1f} KiB of entities), {RUNS} runs")
+    print(f"{'build':>8} | {'time':>9} | {'allocated (peak)':>16} | {'serialized':>10}")
+    serialized = {"before": len(before), "after": len(after) - len(template._prefix)}
+    for name, build in (("before", lambda: build_before(entities_summary)), ("after", lambda: build_after(template, entities_summary))):
+        elapsed, peak = measure(build)
+        print(f"{name:>8} | {elapsed:>7.1f}us | {peak / 1024:>13.1f}KiB | {serialized[name] / 1024:>7.1f}KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure time to first token and first sentence, streamed versus non-streamed.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_streaming_latency
+"""
+import asyncio
+import statistics
+import time
+
+from custom_components.perplexity_assistant.client import PerplexityClient
+from custom_components.perplexity_assistant.streaming import ContentStreamParser, SentenceSplitter
+
+from .standin import PerplexityStandIn
+
+
+RUNS: int = 10
+PAYLOAD: dict = {"model": "sonar", "messages": [{"role": "user", "content": "How is my home?"}]}
+
+
+async def measure_streamed(client: PerplexityClient) -> tuple[float, float, float]:
+    """Return (first token, first sentence, complete) times in milliseconds for a streamed request."""
+    parser, splitter = ContentStreamParser(), SentenceSplitter()
+    first_token = first_sentence = None
+    start = time.perf_counter()
+
+    async for chunk in client.async_stream(PAYLOAD, "pplx-benchmark"):
+        text = parser.feed(chunk["choices"][0]["delta"]["content"])
+        if text and first_token is None:
+            first_token = time.perf_counter()
+        if splitter.feed(text) and first_sentence is None:
+            first_sentence = time.perf_counter()
+
+    end = time.perf_counter()
+    return ((first_token - start) * 1000, ((first_sentence or end) - start) * 1000, (end - start) * 1000)
+
+
+async def measure_blocking(client: PerplexityClient) -> float:
+    """Return the time in milliseconds until a non-streamed response is available."""
+    start = time.perf_counter()
+    await client.async_post(PAYLOAD, "pplx-benchmark")
+    return (time.perf_counter() - start) * 1000
+
+
+async def main() -> None:
+    standin = PerplexityStandIn()
+    client = PerplexityClient(None, base_url=await standin.async_start())
+
+    try:
+        streamed = [await measure_streamed(client) for _ in range(RUNS)]
+        blocking = [await measure_blocking(client) for _ in range(RUNS)]
+    finally:
+        await client.async_close()
+        await standin.async_stop()
+
+    print(f"{'mode':>10} | {'first token':>11} | {'first sentence':>14} | {'complete':>9}")
+    print(f"{'stream':>10} | {statistics.median(s[0] for s in streamed):>9.0f}ms | {statistics.median(s[1] for s in streamed):>12.0f}ms | {statistics.median(s[2] for s in streamed):>7.0f}ms")
+    blocking_ms = statistics.median(blocking)
+    print(f"{'blocking':>10} | {blocking_ms:>9.0f}ms | {blocking_ms:>12.0f}ms | {blocking_ms:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""Measure how long the entities summary blocks the event loop, with and without the background refresh.
+
+A synthetic installation of 20k entities is served by an index on a running event
+loop. Between two requests, a few entity states change, so every request finds the
+encoded summary outdated. Without the background refresh, each request re-encodes the
+summary on the loop; with it, the request only copies the entities and the encoding
+runs in an executor. The blocking time is measured around each read, and a ticker task
+records how late the loop wakes it up (the lag also includes the turns the executor
+thread holds the interpreter lock, and garbage collections of the fixture).
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.bench_summary_offloop
+"""
+import asyncio
+import random
+import time
+
+from types import SimpleNamespace
+
+from custom_components.perplexity_assistant.const import ENTITIES_FORMAT_GROUPED, ENTITIES_FORMAT_TERSE
+
+from .bench_entities_summary import build_index
+from .fixtures import STATES, build_install
+
+
+ENTITIES: int = 20_000
+REQUESTS: int = 30
+CHANGES_PER_REQUEST: int = 20
+TICK: float = 0.001                 # in seconds
+MAX_BLOCKING_SHARE: float = 0.5     # The background refresh must at least halve the worst blocking time
+
+
+def wire_loop(index, loop: asyncio.AbstractEventLoop) -> None:
+    """Give the index the two Home Assistant helpers it uses for the background refresh."""
+    index.hass = SimpleNamespace(
+        states=index.hass.states,
+        async_add_executor_job=lambda target, *args: loop.run_in_executor(None, target, *args),
+        async_create_background_task=lambda target, name: loop.create_task(target, name=name),
+    )
+    index._unsubscribers = [lambda: None]   # Marks the index as started, without an event bus
+
+
+async def ticker(lags: list[float], stop: asyncio.Event) -> None:
+    """Record how late the loop wakes up a task sleeping TICK seconds."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run(entity_format: str, background: bool) -> dict[str, float]:
+    """Serve REQUESTS reads of the summary while states change, and measure the loop blocking time."""
+    install = build_install(ENTITIES)
+    index = build_index(install)
+    wire_loop(index, asyncio.get_running_loop())
+    index.background_refresh = background
+    index.get_summary(0.0, entity_format)   # First text, always encoded on the loop
+    index.loop_time = 0.0
+
+    rng = random.Random(1)
+    entity_ids = list(install.states)
+    lags: list[float] = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    blocking: list[float] = []
+
+    for _ in range(REQUESTS):
+        for entity_id in rng.sample(entity_ids, CHANGES_PER_REQUEST):
+            index._set_line(entity_id, rng.choice(STATES[entity_id.split(".", 1)[0]]))
+        start = time.perf_counter()
+        index.get_summary(0.0, entity_format)
+        blocking.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)           # Time between requests, during which the background refresh completes
+
+    stop.set()
+    await tick_task
+    return {
+        "mean": 1000 * sum(blocking) / len(blocking),
+        "max": 1000 * max(blocking),
+        "lag": 1000 * max(lags),
+        "loop": 1000 * index.loop_time,
+        "refreshes": index.background_refreshes,
+    }
+
+
+async def main() -> None:
+    print(f"{ENTITIES} entities, {REQUESTS} requests, {CHANGES_PER_REQUEST} state changes between requests")
+    print(f"{'format':>7} | {'mode':>10} | {'blocking (mean)':>15} | {'blocking (max)':>14} | {'max loop lag':>12} | {'loop total':>10} | {'refreshes':>9}")
+    for entity_format in (ENTITIES_FORMAT_GROUPED, ENTITIES_FORMAT_TERSE):
+        results = {}
+        for background in (False, True):
+            results[background] = result = await run(entity_format, background)
+            mode = "background" if background else "on loop"
+            print(f"{entity_format:>7} | {mode:>10} | {result['mean']:>13.2f}ms | {result['max']:>12.2f}ms | {result['lag']:>10.2f}ms | {result['loop']:>8.1f}ms | {result['refreshes']:>9}")
+        assert results[True]["refreshes"] > 0, "The summary was never refreshed in the background"
+        assert results[True]["max"] <= MAX_BLOCKING_SHARE * results[False]["max"], "The background refresh must reduce the loop blocking time"
+    print(f"ok: with the background refresh, the loop blocks for at most {100 * MAX_BLOCKING_SHARE:.0f}% of the on-loop encoding time")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Check that concurrent identical requests of the ask service share a single upstream call.
+
+A Home Assistant instance is started with a config entry of the integration (see
+loadgen.async_start_hass) and its requests sent to the local API stand-in. N identical
+requests are sent at the same time through the agent (async_ask), once with distinct
+prompts for comparison and once with the same prompt: the identical burst must reach
+the stand-in once, and only the first response may carry the cost of the request.
+
+Usage (from the repository root, with Home Assistant and the requirements of its
+conversation and tts integrations installed):
+    python -m benchmarks.eval_coalescing
+"""
+import asyncio
+import tempfile
+import time
+
+from homeassistant.core import Context, HomeAssistant, ServiceCall
+
+from custom_components.perplexity_assistant.const import (
+    CONF_API_KEY,
+    CONF_ENABLE_FAST_PATH,
+    CONF_ENABLE_WARM_UP,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_RATE_LIMIT,
+    DOMAIN,
+)
+
+from .loadgen import DEFAULT_API_KEY, async_start_hass
+from .standin import PerplexityStandIn
+
+
+CONCURRENCY: list[int] = [2, 10, 50]
+PROMPT: str = "Give me a summary of the house"
+
+
+async def burst(agent, hass: HomeAssistant, standin: PerplexityStandIn, count: int, prompts: list[str]) -> tuple[int, float, list[dict]]:
+    """Return (upstream requests, wall time in milliseconds, responses) of a burst of concurrent ask calls."""
+    async def ask(prompt: str) -> dict:
+        call = ServiceCall(hass, DOMAIN, "ask", {"prompt": prompt, "execute_actions": False}, Context())
+        return await agent.async_ask(call)
+
+    before = standin.requests
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(ask(prompt) for prompt in prompts))
+    return standin.requests - before, (time.perf_counter() - start) * 1000, responses
+
+
+async def main() -> None:
+    standin = PerplexityStandIn(first_token_delay=0.2, token_delay=0.001)
+    base_url = await standin.async_start()
+    options = {
+        CONF_API_KEY: DEFAULT_API_KEY,
+        CONF_RATE_LIMIT: 0,
+        CONF_MAX_CONCURRENT_REQUESTS: max(CONCURRENCY),   # The distinct burst is not queued by the scheduler
+        CONF_ENABLE_WARM_UP: False,     # The warm-up would reach the real API before the client is redirected
+        CONF_ENABLE_FAST_PATH: False,   # Every request must reach the stand-in
+    }
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass, entry = await async_start_hass(config_dir, options)
+        try:
+            agent = hass.data[DOMAIN][entry.entry_id]
+            agent.client.base_url = base_url
+            await hass.async_block_till_done()
+
+            print(f"{'requests':>8} | {'upstream (distinct)':>19} | {'upstream (identical)':>20} | {'distinct':>8} | {'identical':>9} | {'cost (identical)':>16}")
+            for count in CONCURRENCY:
+                distinct_hits, distinct_ms, _ = await burst(agent, hass, standin, count, [f"{PROMPT} ({index})" for index in range(count)])
+                identical_hits, identical_ms, responses = await burst(agent, hass, standin, count, [f"{PROMPT} ({count} at once)"] * count)
+
+                assert all(not response["error"] for response in responses), "Every request must succeed"
+                assert identical_hits == 1, f"{identical_hits} upstream requests for {count} identical requests"
+                leaders = [response for response in responses if not response["coalesced"]]
+                assert len(leaders) == 1 and leaders[0]["cost"] > 0, "A single response must carry the cost of the request"
+                assert all(response["cost"] == 0 for response in responses if response["coalesced"]), "Coalesced responses must not be billed again"
+                assert all(response["response"] == leaders[0]["response"] for response in responses)
+
+                cost = sum(response["cost"] for response in responses)
+                print(f"{count:>8} | {distinct_hits:>19} | {identical_hits:>20} | {distinct_ms:>6.0f}ms | {identical_ms:>7.0f}ms | {cost:>16.4f}")
+            print("ok: concurrent identical requests share a single upstream call, billed once")
+        finally:
+            await hass.async_stop(force=True)
+            await standin.async_stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
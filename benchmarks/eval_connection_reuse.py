@@ -0,0 +1,54 @@
+"""Check that consecutive requests reuse the pooled connection of the client.
+
+Requests are sent one after the other through the same PerplexityClient, alternating
+plain and streamed responses, against the local API stand-in. Each request carries its
+own RequestTrace: the connection trace of the client (on_connection_create_end) adds a
+connection time to the trace of a request only when a new connection is opened, so it
+must fire for the first request and never again.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_connection_reuse
+"""
+import asyncio
+
+from custom_components.perplexity_assistant.client import PerplexityClient
+from custom_components.perplexity_assistant.tracing import STAGE_CONNECT, RequestTrace
+
+from .standin import PerplexityStandIn
+
+
+PAYLOAD: dict = {"model": "sonar", "messages": [{"role": "user", "content": "Is the garage door open?"}]}
+API_KEY: str = "pplx-" + "0" * 48
+REQUESTS: int = 10
+
+
+async def send(client: PerplexityClient, stream: bool) -> RequestTrace:
+    """Send one request, read its whole response and return its trace."""
+    trace = RequestTrace("eval")
+    if stream:
+        chunks = [chunk async for chunk in client.async_stream(PAYLOAD, API_KEY, trace=trace)]
+        assert chunks and all("error" not in chunk for chunk in chunks), "Every streamed request must succeed"
+    else:
+        data = await client.async_post(PAYLOAD, API_KEY, trace=trace)
+        assert "error" not in data, "Every request must succeed"
+    return trace
+
+
+async def main() -> None:
+    standin = PerplexityStandIn(first_token_delay=0.01, token_delay=0.0)
+    client = PerplexityClient(None, base_url=await standin.async_start())
+
+    try:
+        traces = [await send(client, stream=index % 2 == 1) for index in range(REQUESTS)]
+        connects = [index for index, trace in enumerate(traces) if STAGE_CONNECT in trace.stages]
+        print(f"{REQUESTS} consecutive requests (plain and streamed): {len(connects)} connection opened, {len(standin.connections)} seen by the stand-in")
+        assert connects == [0], f"Only the first request may open a connection, opened by requests {connects}"
+        assert len(standin.connections) == 1, "Every request must reach the stand-in on the same connection"
+        print("ok: consecutive requests reuse the pooled connection")
+    finally:
+        await client.async_close()
+        await standin.async_stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Offline evaluation of the relevance-filtered entities context.
+
+For a fixture set of prompts on synthetic installations, reports the size of the
+full entities summary and of the filtered one (estimated tokens), and the recall:
+the share of the entities a prompt is about that are listed in the filtered context
+(at most max_entities can be listed, so the expected set is capped to that size).
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_entity_context
+"""
+import random
+import time
+
+from types import SimpleNamespace
+
+from custom_components.perplexity_assistant.const import DEFAULT_CONTEXT_MAX_ENTITIES
+from custom_components.perplexity_assistant.context import estimate_tokens
+
+from .bench_entities_summary import build_index
+from .fixtures import AREAS, DOMAINS, build_install
+
+
+SIZES: list[int] = [200, 2_000, 10_000, 50_000]
+PROMPTS_PER_TEMPLATE: int = 5
+TOKEN_BUDGET: int = 2000    # in tokens (approx.), the filter is off by default
+
+
+def build_prompts(install: SimpleNamespace, seed: int = 7) -> list[tuple[str, set[str]]]:
+    """Build the fixture prompts, each with the entities it is about.
+
+    Args:
+        install (SimpleNamespace): Synthetic installation.
+        seed (int): Random seed, so runs are reproducible.
+    Returns:
+        list[tuple[str, set[str]]]: (prompt, expected entity IDs) pairs.
+    """
+    rng = random.Random(seed)
+    states = list(install.states.values())
+    prompts: list[tuple[str, set[str]]] = [("What time is it?", set()), ("Tell me a joke about robots.", set())]
+
+    for _ in range(PROMPTS_PER_TEMPLATE):
+        entity = rng.choice([s for s in states if s.domain in ("light", "switch", "fan")])
+        prompts.append((f"Turn off the {entity.name.lower()}", {entity.entity_id}))
+
+        entity = rng.choice([s for s in states if s.domain in ("lock", "cover")])
+        prompts.append((f"Is the {entity.name} open?", {entity.entity_id}))
+
+        area, domain = rng.choice(AREAS), rng.choice(DOMAINS[:6])
+        expected = {s.entity_id for s in states if s.domain == domain and s.entity_id.split(".", 1)[1].startswith(area)}
+        prompts.append((f"Which {domain.replace('_', ' ')}s are in the {area.replace('_', ' ')}?", expected))
+
+    return prompts
+
+
+def listed_entities(summary: str) -> set[str]:
+    """Return the entity IDs listed in a summary."""
+    return {line.split(":", 1)[0] for line in summary.split("\n- ")[1:] if not line.startswith("other entities")}
+
+
+def main() -> None:
+    print(f"budget={TOKEN_BUDGET} tokens, max entities={DEFAULT_CONTEXT_MAX_ENTITIES}")
+    print(f"{'entities':>9} | {'full':>9} | {'filtered (mean)':>15} | {'reduction':>9} | {'recall (mean)':>13} | {'recall (min)':>12} | {'selection':>9}")
+
+    for size in SIZES:
+        install = build_install(size)
+        index = build_index(install)
+        full_tokens = estimate_tokens(index.get_summary())
+
+        filtered_tokens: list[int] = []
+        recalls: list[float] = []
+        durations: list[float] = []
+        for prompt, expected in build_prompts(install):
+            start = time.perf_counter()
+            summary = index.get_relevant_summary(prompt, DEFAULT_CONTEXT_MAX_ENTITIES, TOKEN_BUDGET)
+            durations.append((time.perf_counter() - start) * 1000)
+            filtered_tokens.append(estimate_tokens(summary))
+            if expected:
+                recalls.append(len(expected & listed_entities(summary)) / min(len(expected), DEFAULT_CONTEXT_MAX_ENTITIES))
+
+        mean_tokens = sum(filtered_tokens) / len(filtered_tokens)
+        print(f"{size:>9} | {full_tokens:>9} | {mean_tokens:>15.0f} | {100 * (1 - mean_tokens / full_tokens):>8.1f}% | {100 * sum(recalls) / len(recalls):>12.1f}% | {100 * min(recalls):>11.1f}% | {sum(durations) / len(durations):>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
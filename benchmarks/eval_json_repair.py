@@ -0,0 +1,129 @@
+"""Fuzz the tolerant decoding of the structured responses.
+
+Builds a corpus of malformed responses from a few valid ones: each one cut off at
+every position (as max_tokens does), wrapped in markdown fences or in text, given
+trailing commas, raw line breaks or stray backslashes, and a random mix of these
+defects. For each kind of defect, reports how many responses are decoded, how many
+are lost and the mean decoding time. A decoded response must never be wrong: its
+answer must be the original one (or its start, for a cut-off response) and each
+of its actions must be one of the original actions, complete.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_json_repair
+"""
+import json
+import random
+import time
+
+from collections import defaultdict
+from collections.abc import Callable
+
+from custom_components.perplexity_assistant.conversation import PerplexityAgentResponse
+from custom_components.perplexity_assistant.repair import ResponseRepairer
+
+
+RESPONSES: list[dict] = [
+    {"content": "The living room is at 21.5 °C and the heating is off.", "actions": None},
+    {"content": "Turning on the kitchen lights and closing the garage door.", "actions": [
+        {"domain": "light", "service": "turn_on", "target": "light.kitchen_ceiling, light.kitchen_island", "parameters": {"brightness_pct": 80}},
+        {"domain": "cover", "service": "close_cover", "target": "cover.garage_door", "parameters": None},
+    ]},
+    {"content": "Le salon est à 21,5 °C. J'ai baissé le \"chauffage\" à 19 °C — bonne nuit 🌙", "actions": [
+        {"domain": "climate", "service": "set_temperature", "target": "climate.living_room", "parameters": {"temperature": 19}},
+        {"domain": "light", "service": "turn_off", "target": "light.bedroom", "parameters": {}},
+        {"domain": "lock", "service": "lock", "target": "lock.front_door", "parameters": None},
+    ]},
+]
+RANDOM_CASES: int = 300
+MIN_CUT_RECOVERY: float = 0.9   # Share of the cut-off responses that must be decoded (a cut before the answer cannot be)
+
+
+def serializations(response: dict) -> list[str]:
+    """Return the valid documents of a response, compact, spaced and with escaped non-ASCII characters."""
+    return [json.dumps(response, ensure_ascii=False), json.dumps(response, indent=2, ensure_ascii=False), json.dumps(response)]
+
+
+def add_trailing_commas(document: str) -> str:
+    return document.replace("}", ",}").replace("]", ",]").replace("{,}", "{}").replace("[,]", "[]")
+
+
+def add_line_breaks(document: str) -> str:
+    return document.replace(" the ", "\nthe ", 1).replace(" est ", "\test ", 1).replace(" is ", "\tis ", 1)
+
+
+def add_stray_backslash(document: str) -> str:
+    return document.replace(" is ", " is \\d ", 1).replace(" est ", " est \\d ", 1).replace(" on ", " on \\d ", 1)
+
+
+DEFECTS: dict[str, Callable[[str, random.Random], str]] = {
+    "fences": lambda document, rng: f"```json\n{document}\n```",
+    "surrounding text": lambda document, rng: f"Here is the answer: {document} Hope this helps!",
+    "trailing commas": lambda document, rng: add_trailing_commas(document),
+    "line breaks": lambda document, rng: add_line_breaks(document),
+    "stray backslash": lambda document, rng: add_stray_backslash(document),
+}
+
+
+def mix(document: str, rng: random.Random) -> str:
+    """Apply a random set of defects, then cut the document at a random position half of the time."""
+    for defect in rng.sample(list(DEFECTS.values()), rng.randint(1, len(DEFECTS))):
+        document = defect(document, rng)
+    return document[:rng.randint(1, len(document))] if rng.random() < 0.5 else document
+
+
+def build_corpus() -> list[tuple[str, dict, str]]:
+    """Return the (kind of defect, original response, malformed document) cases."""
+    rng = random.Random(7)
+    corpus: list[tuple[str, dict, str]] = []
+    for response in RESPONSES:
+        for document in serializations(response):
+            corpus.extend(("cut off", response, document[:position]) for position in range(1, len(document)))
+            corpus.extend((kind, response, defect(document, rng)) for kind, defect in DEFECTS.items())
+    for _ in range(RANDOM_CASES):
+        response = rng.choice(RESPONSES)
+        corpus.append(("mixed", response, mix(rng.choice(serializations(response)), rng)))
+    return corpus
+
+
+def is_faithful(decoded: PerplexityAgentResponse, original: dict) -> bool:
+    """Return whether a decoded response only holds what the original says: the start of its answer, and complete original actions."""
+    content = " ".join(decoded.content.replace("\\d", "").split())   # Undoes the line breaks and stray backslashes added
+    expected = " ".join(original["content"].split())
+    actions = [action.model_dump() for action in decoded.actions or []]
+    return expected.startswith(content) and all(action in (original["actions"] or []) for action in actions)
+
+
+def main() -> None:
+    repairer = ResponseRepairer(PerplexityAgentResponse)
+    results: dict[str, dict[str, float]] = defaultdict(lambda: {"cases": 0, "decoded": 0, "lost": 0, "wrong": 0, "time": 0.0})
+
+    for kind, original, document in build_corpus():
+        result = results[kind]
+        result["cases"] += 1
+        start = time.perf_counter()
+        try:
+            decoded, _repairs = repairer.decode(document)
+        except ValueError:
+            decoded = None
+        result["time"] += time.perf_counter() - start
+        if decoded is None:
+            result["lost"] += 1
+        elif is_faithful(decoded, original):
+            result["decoded"] += 1
+        else:
+            result["wrong"] += 1
+            print(f"wrong decoding of {document!r}: {decoded!r}")
+
+    print(f"{'defect':>16} | {'cases':>5} | {'decoded':>7} | {'lost':>5} | {'wrong':>5} | {'mean time':>9}")
+    for kind, result in results.items():
+        print(f"{kind:>16} | {result['cases']:>5} | {result['decoded']:>7} | {result['lost']:>5} | {result['wrong']:>5} | {1e6 * result['time'] / result['cases']:>7.1f}µs")
+    print(f"repairer counters: {repairer.stats}")
+
+    assert not any(result["wrong"] for result in results.values()), "A repaired response must never hold a wrong answer or action"
+    assert all(results[kind]["lost"] == 0 for kind in DEFECTS), "Responses that are only malformed must all be decoded"
+    assert results["cut off"]["decoded"] >= MIN_CUT_RECOVERY * results["cut off"]["cases"], "Too many cut-off responses are lost"
+    print("ok: no wrong decoding, every malformed response recovered, and most cut-off ones")
+
+
+if __name__ == "__main__":
+    main()
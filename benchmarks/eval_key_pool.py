@@ -0,0 +1,89 @@
+"""Check the throughput gained with several API keys, and the ejection of rejected keys.
+
+Requests go through the same scheduler and key pool as the agent, against the local
+API stand-in: the scheduler allows the per-key rate limit once per key of the pool,
+and each request is sent with the key the pool chooses, with another key when it is
+rejected. The stand-in does not check the keys, so rejections are injected as faults.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_key_pool
+"""
+import asyncio
+import time
+
+from custom_components.perplexity_assistant.client import PerplexityClient
+from custom_components.perplexity_assistant.const import RATE_LIMIT_BURST
+from custom_components.perplexity_assistant.keypool import KeyPool
+from custom_components.perplexity_assistant.scheduler import PRIORITY_AUTOMATION, RequestScheduler
+
+from .standin import PerplexityStandIn
+
+
+PAYLOAD: dict = {"model": "sonar", "messages": [{"role": "user", "content": "Is the garage door open?"}]}
+KEYS: list[str] = [f"pplx-{index:048d}" for index in range(1, 4)]
+RATE_LIMIT: float = 300     # Requests per minute, per key
+REQUESTS: int = 45
+MIN_SPEEDUP: float = 2.0    # With three keys, the requests must complete at least twice as fast as with one
+
+
+async def send(client: PerplexityClient, scheduler: RequestScheduler, pool: KeyPool, api_keys: list[str]) -> dict:
+    """Send one request the way the agent does: scheduler slot, then a key of the pool."""
+    pool.configure(api_keys, RATE_LIMIT, RATE_LIMIT_BURST)
+    scheduler.configure(RATE_LIMIT * max(1, pool.available), RATE_LIMIT_BURST, 8, 0)
+    async with scheduler.async_slot(PRIORITY_AUTOMATION):
+        while True:
+            key = pool.acquire()
+            data = None
+            try:
+                data = await client.async_post(PAYLOAD, key.key)
+            finally:
+                switch_key = pool.release(key, data)
+            if not switch_key:
+                return data
+
+
+async def run(client: PerplexityClient, api_keys: list[str]) -> tuple[float, KeyPool]:
+    """Send REQUESTS requests at once and return the seconds taken and the pool."""
+    scheduler = RequestScheduler(RATE_LIMIT, RATE_LIMIT_BURST, 8, 1, 0)
+    pool = KeyPool(rate_limit_ejection=60, auth_ejection=900)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(send(client, scheduler, pool, api_keys) for _ in range(REQUESTS)))
+    assert all("error" not in result for result in results), "Every request must succeed"
+    return time.perf_counter() - start, pool
+
+
+async def main() -> None:
+    standin = PerplexityStandIn(first_token_delay=0.02, token_delay=0.0)
+    client = PerplexityClient(None, base_url=await standin.async_start())
+
+    try:
+        print(f"{REQUESTS} requests, rate limit of {RATE_LIMIT:.0f} requests per minute per key")
+        print(f"{'keys':>4} | {'time':>7} | {'requests/min':>12} | requests per key")
+        durations = {}
+        for count in (1, len(KEYS)):
+            durations[count], pool = await run(client, KEYS[:count])
+            per_key = ", ".join(str(stats["requests"]) for stats in pool.stats["keys"].values())
+            print(f"{count:>4} | {durations[count]:>6.2f}s | {60 * REQUESTS / durations[count]:>12.0f} | {per_key}")
+        assert durations[1] >= MIN_SPEEDUP * durations[len(KEYS)], "Several keys must raise the throughput"
+
+        standin.inject(1, status=429, retry_after=1)
+        scheduler = RequestScheduler(RATE_LIMIT, RATE_LIMIT_BURST, 8, 1, 0)
+        pool = KeyPool(rate_limit_ejection=60, auth_ejection=900)
+        result = await send(client, scheduler, pool, KEYS)
+        stats = pool.stats
+        print(f"429 on the first key: {'ok' if 'error' not in result else result['error']}, {stats['available']} keys available, {stats['switches']} switch")
+        assert "error" not in result and stats["available"] == len(KEYS) - 1 and stats["switches"] == 1
+
+        standin.inject(2, status=401)
+        result = await send(client, scheduler, pool, KEYS)
+        stats = pool.stats
+        print(f"401 on the next two keys: {result.get('error', 'ok')}, {stats['available']} keys available")
+        assert result.get("status") == 401 and stats["available"] == 0, "Without a key left, the error must be returned"
+        print("ok: rejected keys are left out and the request is sent with another key while one is available")
+    finally:
+        await client.async_close()
+        await standin.async_stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
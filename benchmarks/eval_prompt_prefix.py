@@ -0,0 +1,128 @@
+"""Check that consecutive requests share a byte-identical prefix with the stable first layout.
+
+Sends a series of requests, with a few entity state changes and a different
+prompt between two requests, through both prompt layouts. For each pair of
+consecutive bodies, reports the length of their common prefix: the part of the
+request that an upstream prompt cache can reuse.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_prompt_prefix
+"""
+import os
+import time
+
+from types import SimpleNamespace
+
+from custom_components.perplexity_assistant.const import *
+from custom_components.perplexity_assistant.conversation import PerplexityAgent
+from custom_components.perplexity_assistant.template import RequestTemplate
+
+from .bench_entities_summary import build_index
+from .fixtures import build_install
+
+
+ENTITIES: int = 300
+REQUESTS: int = 20
+CHANGES: int = 3        # Entity state changes between two requests
+PROMPTS: list[str] = ["Turn off the kitchen lights", "Is the garage door open?", "What is the temperature in the office?", "Lock the front door"]
+
+
+def compile_template(layout: str) -> RequestTemplate:
+    """Compile a template with the default options and a custom prompt."""
+    return RequestTemplate(
+        model=DEFAULT_MODEL,
+        enable_websearch=DEFAULT_ENABLE_WEBSEARCH,
+        max_tokens=DEFAULT_MAX_TOKENS,
+        temperature=DEFAULT_CREATIVITY,
+        top_p=DEFAULT_DIVERSITY,
+        frequency_penalty=DEFAULT_FREQUENCY_PENALTY,
+        response_format=PerplexityAgent.RESPONSE_FORMAT,
+        system_prompt=SYSTEM_PROMPT,
+        agent_name="Perplexity",
+        ha_version="2026.2.0",
+        language=DEFAULT_LANGUAGE,
+        enable_vocal_notifications=DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS,
+        allow_actions=DEFAULT_ALLOW_ACTIONS_ON_ENTITIES,
+        allow_entities=True,
+        api_keys=["pplx-benchmark"],
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        custom_prompt="Answer like a butler.",
+        layout=layout,
+    )
+
+
+def build_body(template: RequestTemplate, index, prompt: str) -> bytes:
+    """Build a request body the way PerplexityAgent._build_system_status does (full entities context)."""
+    if template.layout == PROMPT_LAYOUT_STABLE_FIRST:
+        system_status = template.system_status(index.get_inventory(), "AUTOMATED SERVICE CALL", index.get_states())
+    else:
+        system_status = template.system_status(index.get_summary(), "AUTOMATED SERVICE CALL")
+    return template.serialize(template.payload([template.user_message(prompt)], system_status))
+
+
+def common_prefix(first: bytes, second: bytes) -> int:
+    """Return the length of the common prefix of two bodies."""
+    return len(os.path.commonprefix([first, second]))
+
+
+def run(layout: str, structural_change_at: int | None = None) -> list[tuple[int, int]]:
+    """Send the series of requests; return (common prefix with the previous body, body length) for each request after the first."""
+    install = build_install(ENTITIES)
+    index = build_index(install)
+    template = compile_template(layout)
+    entity_ids = list(install.states)
+
+    results: list[tuple[int, int]] = []
+    previous: bytes | None = None
+    for i in range(REQUESTS):
+        if i == structural_change_at:
+            # A new entity changes the inventory
+            index._set_line("light.porch_light_new", "off", "Porch light")
+        body = build_body(template, index, PROMPTS[i % len(PROMPTS)])
+        if previous is not None:
+            results.append((common_prefix(previous, body), len(body)))
+        previous = body
+
+        for j in range(CHANGES):
+            entity_id = entity_ids[(i * CHANGES + j) % len(entity_ids)]
+            index._async_on_state_changed(SimpleNamespace(data={"entity_id": entity_id, "new_state": SimpleNamespace(state=f"changed_{i}", name=install.states[entity_id].name)}))
+        time.sleep(0.001) # Move the clock, as between two real requests
+    return results
+
+
+def main() -> None:
+    print(f"{ENTITIES} entities, {REQUESTS} requests, {CHANGES} state changes between two requests")
+    print(f"{'layout':>32} | {'body':>9} | {'shared prefix (min)':>19} | {'shared prefix (mean)':>20}")
+
+    outcomes: dict[str, list[tuple[int, int]]] = {}
+    for name, layout, structural_change_at in (
+        ("classic", PROMPT_LAYOUT_CLASSIC, None),
+        ("stable first", PROMPT_LAYOUT_STABLE_FIRST, None),
+        ("stable first (entity added)", PROMPT_LAYOUT_STABLE_FIRST, REQUESTS // 2),
+    ):
+        results = outcomes[name] = run(layout, structural_change_at)
+        shared = [prefix for prefix, _ in results]
+        body = sum(length for _, length in results) / len(results)
+        print(f"{name:>32} | {body / 1024:>6.1f}KiB | {min(shared) / 1024:>16.1f}KiB | {sum(shared) / len(shared) / 1024:>14.1f}KiB ({sum(shared) / len(shared) / body:>3.0%})")
+
+    # The classic layout diverges at the date, before the entities
+    template = compile_template(PROMPT_LAYOUT_CLASSIC)
+    assert max(prefix for prefix, _ in outcomes["classic"]) < len(template._prefix) + 100
+
+    # With the stable first layout, everything up to the entity states is byte-identical between consecutive requests
+    install = build_install(ENTITIES)
+    index = build_index(install)
+    template = compile_template(PROMPT_LAYOUT_STABLE_FIRST)
+    body = build_body(template, index, PROMPTS[0])
+    stable = body.index(b"ENTITY STATES")
+    assert all(prefix >= stable for prefix, _ in outcomes["stable first"]), "The prefix must be stable up to the entity states"
+
+    # An entity added only changes the prefix from its inventory line on
+    assert sum(prefix < stable for prefix, _ in outcomes["stable first (entity added)"]) == 1
+    assert min(prefix for prefix, _ in outcomes["stable first (entity added)"]) >= len(template._prefix)
+    print("ok: consecutive requests share a byte-identical prefix up to the entity states")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Check retries, hedging and circuit breaking against a fault-injecting stand-in.
+
+Each scenario queues faults on the local API stand-in, sends requests through
+the same resilience layer as the agent, and checks the outcome, the number of
+upstream requests and the time taken.
+
+Usage (from the repository root, with Home Assistant installed):
+    python -m benchmarks.eval_resilience
+"""
+import asyncio
+import time
+
+from custom_components.perplexity_assistant.client import PerplexityClient
+from custom_components.perplexity_assistant.const import MODEL_FALLBACKS
+from custom_components.perplexity_assistant.resilience import STATE_OPEN, ResilientCaller
+
+from .standin import PerplexityStandIn
+
+
+PAYLOAD: dict = {"model": "sonar-pro", "messages": [{"role": "user", "content": "Is the garage door open?"}]}
+
+
+def new_caller() -> ResilientCaller:
+    """Return a resilience layer with short delays, so the scenarios run quickly."""
+    return ResilientCaller(MODEL_FALLBACKS, failure_threshold=3, recovery_time=1, base_delay=0.05, max_delay=2, latency_window=50, hedge_min_samples=10)
+
+
+async def scenario(name: str, standin: PerplexityStandIn, caller: ResilientCaller, client: PerplexityClient, max_retries: int = 2, hedge: bool = False, fallback: bool = True) -> tuple[dict, int, float]:
+    """Send one request and print its outcome; return (result, upstream requests, milliseconds)."""
+    before = standin.requests
+    start = time.perf_counter()
+    result = await caller.async_call(lambda payload: client.async_post(payload, "pplx-benchmark"), PAYLOAD, max_retries, hedge=hedge, fallback=fallback)
+    elapsed = (time.perf_counter() - start) * 1000
+    hits = standin.requests - before
+    outcome = "ok" if "error" not in result else result["error"]
+    print(f"{name:<38} | {outcome[:40]:<40} | {hits:>8} | {elapsed:>6.0f}ms")
+    return result, hits, elapsed
+
+
+async def main() -> None:
+    standin = PerplexityStandIn(first_token_delay=0.02, token_delay=0.0)
+    client = PerplexityClient(None, base_url=await standin.async_start())
+    print(f"{'scenario':<38} | {'outcome':<40} | {'upstream':>8} | {'time':>8}")
+
+    try:
+        caller = new_caller()
+        standin.inject(2, status=503)
+        result, hits, _ = await scenario("two 503 then success", standin, caller, client)
+        assert "error" not in result and hits == 3 and caller.retries == 2
+
+        standin.inject(1, status=429, retry_after=1)
+        result, hits, elapsed = await scenario("429 with Retry-After: 1", standin, caller, client)
+        assert "error" not in result and hits == 2 and elapsed >= 1000
+
+        standin.inject(1, status=429, retry_after=30)
+        result, hits, _ = await scenario("429 with Retry-After: 30 (too long)", standin, caller, client)
+        assert result.get("status") == 429 and hits == 1
+
+        standin.inject(1, status=400)
+        result, hits, _ = await scenario("400 is not retried", standin, caller, client)
+        assert result.get("status") == 400 and hits == 1
+
+        caller = new_caller()
+        standin.inject(3, status=500)
+        result, hits, _ = await scenario("three 500 open the breaker", standin, caller, client)
+        assert "error" in result and hits == 3 and caller.breaker("sonar-pro").state == STATE_OPEN
+
+        standin.models.clear()
+        result, hits, _ = await scenario("open breaker falls back to sonar", standin, caller, client)
+        assert "error" not in result and standin.models == ["sonar"] and caller.fallbacks_used == 1
+
+        result, hits, elapsed = await scenario("open breaker without fallback", standin, caller, client, fallback=False)
+        assert "error" in result and hits == 0 and elapsed < 10
+
+        await asyncio.sleep(1)
+        result, hits, _ = await scenario("trial request closes the breaker", standin, caller, client)
+        assert "error" not in result and hits == 1 and caller.state != STATE_OPEN
+
+        caller = new_caller()
+        for _ in range(10):
+            await caller.async_call(lambda payload: client.async_post(payload, "pplx-benchmark"), PAYLOAD, 0)
+        standin.inject(1, delay=1.5)
+        result, hits, elapsed = await scenario("slow request is hedged", standin, caller, client, hedge=True)
+        assert "error" not in result and hits == 2 and caller.hedge_wins == 1 and elapsed < 1000
+    finally:
+        await client.async_close()
+        await standin.async_stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Synthetic Home Assistant data used by the benchmarks.
+
+The benchmarks run offline, without a running Home Assistant instance. These
+helpers build lightweight stand-ins for the state machine and the registries
+that expose only the attributes the integration reads.
+"""
+import random
+
+from types import SimpleNamespace
+
+
+DOMAINS: list[str] = ["light", "switch", "sensor", "binary_sensor", "climate", "cover", "media_player", "lock", "fan", "scene"]
+AREAS: list[str] = ["living_room", "kitchen", "bedroom", "office", "garage", "bathroom", "hallway", "garden", "attic", "basement"]
+STATES: dict[str, list[str]] = {
+    "light": ["on", "off"],
+    "switch": ["on", "off"],
+    "sensor": ["21.5", "48", "1013", "unavailable", "unknown"],
+    "binary_sensor": ["on", "off", "unavailable"],
+    "climate": ["heat", "off", "auto"],
+    "cover": ["open", "closed"],
+    "media_player": ["playing", "paused", "idle", "off"],
+    "lock": ["locked", "unlocked"],
+    "fan": ["on", "off"],
+    "scene": ["2025-01-01T00:00:00+00:00"],
+}
+
+
+class FakeStates:
+    """Minimal stand-in for hass.states."""
+
+    def __init__(self, states: dict[str, SimpleNamespace]) -> None:
+        self._states = states
+
+    def async_all(self) -> list[SimpleNamespace]:
+        return list(self._states.values())
+
+    def get(self, entity_id: str) -> SimpleNamespace | None:
+        return self._states.get(entity_id)
+
+
+class FakeRegistry:
+    """Minimal stand-in for the entity, device and area registries."""
+
+    def __init__(self, entries: dict[str, SimpleNamespace]) -> None:
+        self._entries = entries
+
+    def async_get(self, key: str | None) -> SimpleNamespace | None:
+        return self._entries.get(key) if key else None
+
+    def async_get_area(self, area_id: str | None) -> SimpleNamespace | None:
+        return self.async_get(area_id)
+
+    def async_list_areas(self) -> list[SimpleNamespace]:
+        return list(self._entries.values())
+
+
+def build_install(count: int, seed: int = 42) -> SimpleNamespace:
+    """Build a synthetic installation with `count` entities.
+
+    Args:
+        count (int): Number of entities.
+        seed (int): Random seed, so runs are reproducible.
+    Returns:
+        SimpleNamespace: hass (states only), entity_registry, device_registry and area_registry stand-ins.
+    """
+    rng = random.Random(seed)
+    states: dict[str, SimpleNamespace] = {}
+    entities: dict[str, SimpleNamespace] = {}
+    devices: dict[str, SimpleNamespace] = {}
+
+    for i in range(count):
+        domain = DOMAINS[i % len(DOMAINS)]
+        area = AREAS[rng.randrange(len(AREAS))]
+        device_id = f"device_{i // 4}"
+        entity_id = f"{domain}.{area}_{domain}_{i}"
+        devices.setdefault(device_id, SimpleNamespace(id=device_id, area_id=area))
+        entities[entity_id] = SimpleNamespace(entity_id=entity_id, device_id=device_id, area_id=None,
+                                              original_name=f"{area.replace('_', ' ').title()} {domain.replace('_', ' ')} {i}",
+                                              name=None, entity_category="diagnostic" if i % 17 == 0 else None, hidden_by=None)
+        states[entity_id] = SimpleNamespace(entity_id=entity_id, domain=domain, state=rng.choice(STATES[domain]),
+                                            name=entities[entity_id].original_name, attributes={})
+
+    return SimpleNamespace(
+        hass=SimpleNamespace(states=FakeStates(states)),
+        entity_registry=FakeRegistry(entities),
+        device_registry=FakeRegistry(devices),
+        area_registry=FakeRegistry({area: SimpleNamespace(id=area, name=area.replace("_", " ").title(), aliases=set()) for area in AREAS}),
+        states=states,
+    )
@@ -0,0 +1,268 @@
+"""Drive the agent at a target rate against the local API stand-in, and report its throughput and latency.
+
+A Home Assistant instance is started in a temporary configuration directory, with a
+config entry of the integration set up as in a real installation (entities, scheduler,
+cache, traces) and its requests sent to the stand-in. Requests are started at the
+target rate whether or not the previous ones completed (open loop), through the
+"ask" service (async_ask) and the conversation entity (async_converse), with distinct
+prompts so they are neither cached nor coalesced. Reports the throughput, the p50,
+p95 and p99 latency, the errors and the lag of the event loop, and exits with an error
+when a --max-* threshold is exceeded, so it can gate a release.
+
+The stand-in replays the canned response or recorded ones (--recordings). With --record,
+requests are forwarded to the real API with --api-key and its responses are appended
+to the recordings file (this spends API credits).
+
+Usage (from the repository root, with Home Assistant and the requirements of its
+conversation and tts integrations installed):
+    python -m benchmarks.loadgen --qps 20 --duration 30
+    python -m benchmarks.loadgen --qps 50 --mode process --stream --latency-median 0.8 --error-rate 0.02
+    python -m benchmarks.loadgen --recordings benchmarks/recordings/sample.jsonl --max-p95-ms 1500 --max-loop-lag-ms 50
+    python -m benchmarks.loadgen --record benchmarks/recordings/mine.jsonl --api-key pplx-... --qps 0.2 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+from types import MappingProxyType
+
+from homeassistant import loader
+from homeassistant.auth import auth_manager_from_config
+from homeassistant.components.conversation import async_converse
+from homeassistant.config_entries import ConfigEntries, ConfigEntry, ConfigEntryState
+from homeassistant.core import Context, HomeAssistant, ServiceCall
+from homeassistant.helpers import area_registry, category_registry, device_registry, entity_registry, floor_registry, label_registry
+from homeassistant.setup import async_setup_component
+
+from custom_components.perplexity_assistant.const import (
+    BASE_URL,
+    CONF_API_KEY,
+    CONF_ENABLE_FAST_PATH,
+    CONF_ENABLE_STREAMING,
+    CONF_ENABLE_WARM_UP,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_RATE_LIMIT,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DOMAIN,
+)
+
+from .fixtures import build_install
+from .standin import PerplexityStandIn, load_recordings, lognormal_latency
+
+
+DEFAULT_API_KEY: str = "pplx-" + "0" * 48    # The stand-in does not check the key
+TICK: float = 0.005                         # in seconds, period of the event loop lag probe
+QUESTIONS: list[str] = [
+    "What is the temperature in the living room?",
+    "Will it rain tomorrow afternoon?",
+    "Is the garage door open?",
+    "Which lights are on downstairs?",
+    "How long has the washing machine been running?",
+]
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Return the value below which a share of the values fall (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))] if ordered else 0.0
+
+
+async def lag_probe(lags: list[float], stop: asyncio.Event) -> None:
+    """Record how late the loop wakes up a task sleeping TICK seconds."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def async_start_hass(config_dir: str, options: dict) -> tuple[HomeAssistant, ConfigEntry]:
+    """Start a Home Assistant instance and set up a config entry of the integration."""
+    hass = HomeAssistant(config_dir)
+    loader.async_setup(hass)
+    await hass.config.async_set_time_zone("UTC")
+    for registry in (area_registry, category_registry, device_registry, entity_registry, floor_registry, label_registry):
+        await registry.async_load(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    # The conversation entity needs the conversation integration, whose dependencies need the core integration and authentication
+    hass.auth = await auth_manager_from_config(hass, [{"type": "homeassistant"}], [])
+    await async_setup_component(hass, "homeassistant", {})
+
+    entry = ConfigEntry(
+        domain=DOMAIN,
+        data={CONF_API_KEY: options.pop(CONF_API_KEY), "create_credit_sensor": True},  # As created by the config flow
+        options=options,
+        title="Load test",
+        source="user",
+        version=1,
+        minor_version=1,
+        unique_id=None,
+        discovery_keys=MappingProxyType({}),
+        subentries_data=None,
+    )
+    await hass.config_entries.async_add(entry)
+    if entry.state is not ConfigEntryState.LOADED:
+        raise RuntimeError(f"The config entry could not be set up: {entry.state}")
+    return hass, entry
+
+
+def add_entities(hass: HomeAssistant, count: int) -> None:
+    """Give the instance a synthetic installation of entities, for the entities context."""
+    install = build_install(count)
+    for state in install.states.values():
+        hass.states.async_set(state.entity_id, state.state, {"friendly_name": state.name})
+
+
+async def async_send(agent, hass: HomeAssistant, kind: str, index: int) -> tuple[str, float, bool]:
+    """Send one request and return its kind, its latency in seconds and whether it failed."""
+    prompt = f"{QUESTIONS[index % len(QUESTIONS)]} (request {index})"
+    start = time.perf_counter()
+    if kind == "ask":
+        call = ServiceCall(hass, DOMAIN, "ask", {"prompt": prompt, "execute_actions": False}, Context())
+        response = await agent.async_ask(call)
+        failed = bool(response.get("error"))
+    else:
+        # Through the conversation entity, as the Assist pipeline does
+        agent_id = entity_registry.async_get(hass).async_get_entity_id("conversation", DOMAIN, agent.config_entry.entry_id)
+        result = await async_converse(hass, prompt, None, Context(), language="en", agent_id=agent_id)
+        # The conversation agent speaks its errors, e.g. "Error communicating with the Perplexity AI service."
+        failed = result.response.speech["plain"]["speech"].startswith("Error")
+    return kind, time.perf_counter() - start, failed
+
+
+async def async_generate(agent, hass: HomeAssistant, qps: float, duration: float, kinds: list[str]) -> list[tuple[str, float, bool]]:
+    """Start requests at a fixed rate for a duration, then wait for all of them."""
+    tasks: list[asyncio.Task] = []
+    start = time.perf_counter()
+    for index in range(int(qps * duration)):
+        # Sleeps until the planned start of the request, so a late wake-up does not lower the rate
+        await asyncio.sleep(max(0.0, start + index / qps - time.perf_counter()))
+        tasks.append(asyncio.create_task(async_send(agent, hass, kinds[index % len(kinds)], index)))
+    return await asyncio.gather(*tasks)
+
+
+def report(results: list[tuple[str, float, bool]], elapsed: float, lags: list[float], standin: PerplexityStandIn) -> dict[str, float]:
+    """Print the throughput and latency of each kind of request, and return the overall figures."""
+    print(f"{'requests':>10} | {'count':>5} | {'errors':>6} | {'req/s':>6} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'max':>8}")
+    overall = {}
+    for kind in sorted({kind for kind, _latency, _failed in results}) + ["all"]:
+        selected = [(latency, failed) for result_kind, latency, failed in results if kind in (result_kind, "all")]
+        latencies = [latency * 1000 for latency, failed in selected if not failed]
+        errors = sum(failed for _latency, failed in selected)
+        figures = {
+            "throughput": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "errors": errors,
+        }
+        print(
+            f"{kind:>10} | {len(selected):>5} | {errors:>6} | {figures['throughput']:>6.1f} | {figures['p50']:>6.0f}ms | "
+            f"{figures['p95']:>6.0f}ms | {figures['p99']:>6.0f}ms | {max(latencies, default=0.0):>6.0f}ms"
+        )
+        overall = figures
+
+    lags_ms = [lag * 1000 for lag in lags]
+    overall["loop_lag_p99"] = percentile(lags_ms, 0.99)
+    overall["loop_lag_max"] = max(lags_ms, default=0.0)
+    print(f"event loop lag: mean {statistics.fmean(lags_ms or [0.0]):.1f}ms, p99 {overall['loop_lag_p99']:.1f}ms, max {overall['loop_lag_max']:.1f}ms")
+    print(f"stand-in: {standin.requests} requests, {standin.errors} server errors, {standin.rate_limited} rate limited (429)")
+    return overall
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--qps", type=float, default=10.0, help="requests started per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds during which requests are started")
+    parser.add_argument("--mode", choices=("ask", "process", "both"), default="both", help="agent entry point driven")
+    parser.add_argument("--stream", action="store_true", help="stream the conversation responses")
+    parser.add_argument("--entities", type=int, default=500, help="entities of the synthetic installation")
+    parser.add_argument("--rate-limit", type=float, default=0, help="rate limit of the entry, in requests per minute (0 for unlimited)")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_MAX_CONCURRENT_REQUESTS, help="requests to the API running at the same time")
+    standin = parser.add_argument_group("stand-in")
+    standin.add_argument("--latency-median", type=float, default=0.6, help="median seconds before the first token")
+    standin.add_argument("--latency-sigma", type=float, default=0.4, help="spread of the log-normal first token latency")
+    standin.add_argument("--token-delay", type=float, default=0.005, help="seconds between two streamed tokens")
+    standin.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500 or 503")
+    standin.add_argument("--rate-limited-rate", type=float, default=0.0, help="share of requests answered with 429")
+    standin.add_argument("--api-rate-limit", type=float, default=0.0, help="requests per minute beyond which the stand-in answers 429")
+    standin.add_argument("--recordings", help="JSON Lines file of recorded responses to replay")
+    standin.add_argument("--record", metavar="PATH", help="forward the requests to the real API and append its responses to PATH")
+    standin.add_argument("--api-key", default=DEFAULT_API_KEY, help="API key sent to the real API when recording")
+    standin.add_argument("--seed", type=int, default=0, help="seed of the latencies and errors")
+    gates = parser.add_argument_group("thresholds (exit code 1 when exceeded)")
+    gates.add_argument("--max-p95-ms", type=float, help="p95 latency of the successful requests")
+    gates.add_argument("--max-p99-ms", type=float, help="p99 latency of the successful requests")
+    gates.add_argument("--max-loop-lag-ms", type=float, help="p99 lag of the event loop")
+    gates.add_argument("--max-error-rate", type=float, help="share of failed requests")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> int:
+    standin = PerplexityStandIn(
+        first_token_delay=lognormal_latency(args.latency_median, args.latency_sigma, args.seed),
+        token_delay=args.token_delay,
+        recordings=load_recordings(args.recordings) if args.recordings else None,
+        error_rate=args.error_rate,
+        rate_limited_rate=args.rate_limited_rate,
+        rate_limit=args.api_rate_limit,
+        seed=args.seed,
+        upstream=BASE_URL if args.record else None,
+        record_to=args.record,
+    )
+    base_url = await standin.async_start()
+    options = {
+        CONF_API_KEY: args.api_key,
+        CONF_RATE_LIMIT: args.rate_limit,
+        CONF_MAX_CONCURRENT_REQUESTS: args.max_concurrent,
+        CONF_ENABLE_STREAMING: args.stream,
+        CONF_ENABLE_WARM_UP: False,     # The warm-up would reach the real API before the client is redirected
+        CONF_ENABLE_FAST_PATH: False,   # Every request must reach the stand-in
+    }
+    kinds = ["ask", "process"] if args.mode == "both" else [args.mode]
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass, entry = await async_start_hass(config_dir, options)
+        try:
+            agent = hass.data[DOMAIN][entry.entry_id]
+            agent.client.base_url = base_url
+            add_entities(hass, args.entities)
+            await hass.async_block_till_done()
+            print(
+                f"{args.qps:g} requests/s for {args.duration:g}s ({', '.join(kinds)}{', streamed' if args.stream else ''}), "
+                f"{args.entities} entities, first token after {args.latency_median:g}s (median)"
+            )
+
+            lags: list[float] = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(lag_probe(lags, stop))
+            start = time.perf_counter()
+            results = await async_generate(agent, hass, args.qps, args.duration, kinds)
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await probe
+        finally:
+            await hass.async_stop(force=True)
+            await standin.async_stop()
+
+    overall = report(results, elapsed, lags, standin)
+    failures = [
+        f"{name} {value:.1f} > {limit:g}"
+        for name, value, limit in (
+            ("p95 latency (ms)", overall["p95"], args.max_p95_ms),
+            ("p99 latency (ms)", overall["p99"], args.max_p99_ms),
+            ("p99 loop lag (ms)", overall["loop_lag_p99"], args.max_loop_lag_ms),
+            ("error rate", overall["errors"] / max(1, len(results)), args.max_error_rate),
+        )
+        if limit is not None and value > limit
+    ]
+    for failure in failures:
+        print(f"threshold exceeded: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,308 @@
+"""Microbenchmarks of the hot paths of a request, compared with tracked baselines.
+
+The integration is set up in a temporary Home Assistant instance (see loadgen), without
+any network access, and each case is timed in the event loop like timeit: repeated until
+a round lasts ROUND_TIME, ROUNDS rounds with the garbage collector off, fastest round
+(the slower ones measure the other processes of the machine rather than the code).
+The peak memory allocated by one run is measured with tracemalloc. Cases:
+
+* entities_summary: the grouped entities summary after a state change, in full and
+  reduced to the entities relevant to a prompt, for several installation sizes.
+* payload: SYSTEM_STATUS messages, request body, budget check and serialization, as
+  _async_send_request does before sending.
+* process_response: decoding and validation of a small and a large response, and of a
+  large response cut off by max_tokens (repaired).
+* executor: fan-out of the actions of a response to service calls (no-op services).
+* usage: a billed response recorded in the usage ledger and the state writes of the
+  bill sensors.
+
+Each case is also timed relative to a calibration loop of pure Python, and compared
+with benchmarks/baselines.json in these units, so baselines taken on a faster or slower
+machine stay usable (the times shown are not scaled). A case slower or taking more
+memory than its baseline by more than the threshold is measured again up to
+CONFIRMATIONS times, and is a regression if its best measure still exceeds it: the
+suite then exits with code 1. A baseline is the median of 1 + CONFIRMATIONS measures,
+as the speed of a process varies by about 10% from one run to the next.
+
+Usage (from the repository root, with Home Assistant and the requirements of its
+conversation and tts integrations installed):
+    python -m benchmarks.microbench
+    python -m benchmarks.microbench --filter entities_summary --threshold 0.1
+    python -m benchmarks.microbench --update     # Record the current results as the baselines
+"""
+import argparse
+import asyncio
+import gc
+import inspect
+import itertools
+import json
+import logging
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.helpers.entity_platform import async_get_platforms
+
+from custom_components.perplexity_assistant.const import (
+    CONF_API_KEY,
+    CONF_ENABLE_WARM_UP,
+    CONF_ENTITIES_BACKGROUND_REFRESH,
+    CONF_ENTITIES_SUMMARY_REFRESH_RATE,
+    DOMAIN,
+)
+from custom_components.perplexity_assistant.executor import ActionCall
+from custom_components.perplexity_assistant.sensor import AlltimeBillSensor, MonthlyBillSensor, UsageTodaySensor
+from custom_components.perplexity_assistant.usage import CALLER_CONVERSATION
+
+from .loadgen import DEFAULT_API_KEY, add_entities, async_start_hass
+
+
+BASELINES: Path = Path(__file__).with_name("baselines.json")
+SIZES: list[int] = [200, 2_000, 10_000]
+ROUNDS: int = 15
+ROUND_TIME: float = 0.02            # in seconds, minimum duration of a round
+DEFAULT_THRESHOLD: float = 0.25     # Share by which a case may exceed its baseline
+CONFIRMATIONS: int = 2              # Measures again of a case exceeding its baseline, before it is a regression
+MEMORY_SLACK: int = 4096            # in bytes, allocations of the interpreter that vary between runs
+PROMPT: str = "Turn off the kitchen lights and tell me the temperature in the living room"
+USER_MESSAGES: list[dict] = [{"role": "user", "content": f"USER SYSTEM PROMPT:  | USER PROMPT: {PROMPT}"}]
+USAGE: dict = {"prompt_tokens": 1850, "completion_tokens": 120, "cost": {"total_cost": 0.0071}}
+SMALL_RESPONSE: dict = {"content": "The living room is at 21.5 degrees and the heating is off.", "actions": None}
+LARGE_RESPONSE: dict = {
+    "content": " ".join(["The kitchen lights are now off and the living room is at 21.5 degrees."] * 20),
+    "actions": [
+        {"domain": "light", "service": "turn_off", "target": f"light.kitchen_{index}", "parameters": {"transition": 2}}
+        for index in range(20)
+    ],
+}
+WORD: re.Pattern = re.compile(r"\w+")
+CALIBRATION_DATA: list[dict] = [{"entity_id": f"light.room_{index}", "state": "on", "attributes": {"brightness": index % 255}} for index in range(200)]
+
+
+def calibrate() -> None:
+    """Reference workload of the kind of the cases (JSON, strings, dicts, regular expressions), timed to compare the cases across machines."""
+    document = json.loads(json.dumps(CALIBRATION_DATA))
+    lines = [f"{item['entity_id']} ({item['state']}, {item['attributes']['brightness']})" for item in document]
+    counts: dict[str, int] = {}
+    for word in WORD.findall(" ".join(lines)):
+        counts[word] = counts.get(word, 0) + 1
+    "\n".join(sorted(lines, key=len))
+
+
+def completion(document: dict | str) -> dict:
+    """Return a chat completion response of the API with a content."""
+    content = document if isinstance(document, str) else json.dumps(document)
+    return {"model": "sonar", "choices": [{"message": {"role": "assistant", "content": content}}], "usage": USAGE}
+
+
+async def async_run(case: Callable[[], object], number: int) -> float:
+    """Run a case a number of times and return the seconds taken (its result is awaited if it is awaitable)."""
+    start = time.perf_counter()
+    for _ in range(number):
+        if inspect.isawaitable(result := case()):
+            await result
+    return time.perf_counter() - start
+
+
+async def async_autorange(case: Callable[[], object]) -> int:
+    """Return the number of runs of a case lasting at least ROUND_TIME."""
+    await async_run(case, 2)
+    number = 1
+    while (elapsed := await async_run(case, number)) < ROUND_TIME:
+        number = max(number * 2, int(number * ROUND_TIME / max(elapsed, 1e-9)) + 1)
+    return number
+
+
+async def async_measure(case: Callable[[], object]) -> tuple[float, float, int]:
+    """Time a case and measure its peak memory.
+    The rounds of the case alternate with rounds of the calibration loop, so a change of
+    speed of the machine during the measure affects both alike.
+
+    Args:
+        case (Callable[[], object]): Function running the case once.
+    Returns:
+        tuple[float, float, int]: Microseconds per run, duration of a run in calibration
+            loops (fastest rounds), and peak bytes allocated by a run.
+    """
+    number, calibration_number = await async_autorange(case), await async_autorange(calibrate)
+    rounds, calibration_rounds = [], []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(ROUNDS):
+            calibration_rounds.append(await async_run(calibrate, calibration_number) / calibration_number)
+            rounds.append(await async_run(case, number) / number)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    await async_run(case, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(rounds) * 1_000_000, min(rounds) / min(calibration_rounds), peak
+
+
+def register_services(hass: HomeAssistant) -> Counter[str]:
+    """Register no-op light services and return the number of calls of each."""
+    calls: Counter[str] = Counter()
+
+    @callback
+    def handle(call: ServiceCall) -> None:
+        calls[call.service] += 1
+
+    for service in ("turn_on", "turn_off"):
+        hass.services.async_register("light", service, handle)
+    return calls
+
+
+def build_cases(hass: HomeAssistant, agent, entities: int) -> dict[str, Callable[[], object]]:
+    """Return the cases of an installation size (the cases independent of the size with the first size)."""
+    toggle = itertools.count()
+    entity_id = next(iter(sorted(hass.states.async_entity_ids("light"))))
+
+    def change_state() -> None:
+        """Change one entity state, so the summary is outdated as it is at the start of most voice turns."""
+        hass.states.async_set(entity_id, "on" if next(toggle) % 2 else "off")
+
+    def summary_full() -> None:
+        change_state()
+        agent._generate_entities_summary()
+
+    def summary_relevant() -> None:
+        change_state()
+        agent._generate_entities_summary(PROMPT)
+
+    def payload() -> None:
+        change_state()
+        body = agent._build_payload(USER_MESSAGES, "Jane", query=PROMPT)
+        agent.budget.release(agent._check_budget(body))
+        agent.template.serialize(body)
+
+    cases = {
+        f"entities_summary/full/{entities}": summary_full,
+        f"entities_summary/relevant/{entities}": summary_relevant,
+        f"payload/{entities}": payload,
+    }
+    if entities != SIZES[0]:
+        return cases
+
+    large = json.dumps(LARGE_RESPONSE)
+    responses = {"small": completion(SMALL_RESPONSE), "large": completion(large), "large_cut_off": completion(large[:len(large) * 3 // 4])}
+    for name, data in responses.items():
+        cases[f"process_response/{name}"] = lambda data=data: agent._process_response(data, execute_actions=False)
+
+    for count, batchable in ((1, True), (10, False), (50, False), (50, True)):
+        calls = [ActionCall(f"ACTION: light.turn_off > light.room_{index}", "light", "turn_off", {}, [f"light.room_{index}"], batchable) for index in range(count)]
+        cases[f"executor/{count}{'_merged' if batchable and count > 1 else ''}"] = lambda calls=calls: agent.executor.async_run(calls)
+
+    bill_sensors = [
+        entity for platform in async_get_platforms(hass, DOMAIN) for entity in platform.entities.values()
+        if isinstance(entity, (MonthlyBillSensor, AlltimeBillSensor, UsageTodaySensor))
+    ]
+    assert len(bill_sensors) == 3, "The sensor platform must be set up"
+
+    def usage() -> None:
+        agent.usage.record("sonar", "Jane", CALLER_CONVERSATION, USAGE)
+        for sensor in bill_sensors:
+            sensor._update_from_agent()
+            sensor.async_write_ha_state()
+
+    cases["usage/record_and_bill_sensors"] = usage
+    return cases
+
+
+def regressions_of(name: str, result: dict, baseline: dict | None, threshold: float) -> list[str]:
+    """Return how a result exceeds its baseline by more than the threshold (nothing without a baseline)."""
+    if not baseline:
+        return []
+    regressions = []
+    if (change := result["relative"] / baseline["relative"] - 1) > threshold:
+        regressions.append(f"{name}: {change:+.0%} time")
+    if result["peak_kib"] * 1024 > baseline["peak_kib"] * 1024 * (1 + threshold) + MEMORY_SLACK:
+        regressions.append(f"{name}: {result['peak_kib'] / baseline['peak_kib'] - 1:+.0%} peak memory")
+    return regressions
+
+
+def report(results: dict[str, dict], baselines: dict) -> None:
+    """Print the results next to the baselines."""
+    print(f"{'case':>34} | {'time':>10} | {'baseline':>10} | {'change':>7} | {'peak':>9} | {'baseline':>9}")
+    for name, result in results.items():
+        if baseline := baselines.get("cases", {}).get(name):
+            print(
+                f"{name:>34} | {result['time_us']:>8.1f}us | {baseline['time_us']:>8.1f}us | {result['relative'] / baseline['relative'] - 1:>+6.0%} | "
+                f"{result['peak_kib']:>6.1f}KiB | {baseline['peak_kib']:>6.1f}KiB"
+            )
+        else:
+            print(f"{name:>34} | {result['time_us']:>8.1f}us | {'-':>10} | {'new':>7} | {result['peak_kib']:>6.1f}KiB | {'-':>9}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--filter", default="", help="only run the cases whose name contains this text")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="share by which a case may exceed its baseline")
+    parser.add_argument("--update", action="store_true", help="record the results as the baselines")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> int:
+    # The repaired case logs a warning on each run
+    logging.getLogger("custom_components.perplexity_assistant").setLevel(logging.ERROR)
+    options = {
+        CONF_API_KEY: DEFAULT_API_KEY,
+        CONF_ENABLE_WARM_UP: False,
+        CONF_ENTITIES_SUMMARY_REFRESH_RATE: 0,      # Every read sees the latest states
+        CONF_ENTITIES_BACKGROUND_REFRESH: False,    # The encoding runs in the measured call, not in an executor
+    }
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    results: dict[str, dict] = {}
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass, entry = await async_start_hass(config_dir, options)
+        try:
+            agent = hass.data[DOMAIN][entry.entry_id]
+            service_calls = register_services(hass)
+            for entities in SIZES:
+                add_entities(hass, entities)
+                await hass.async_block_till_done()
+                for name, case in build_cases(hass, agent, entities).items():
+                    if args.filter in name:
+                        measures: list[dict] = []
+                        for _ in range(1 + CONFIRMATIONS):
+                            time_us, relative, peak = await async_measure(case)
+                            measures.append({"time_us": round(time_us, 1), "relative": round(relative, 3), "peak_kib": round(peak / 1024, 1)})
+                            # A baseline is a typical measure, while a check keeps the best one
+                            pick = statistics.median if args.update else min
+                            results[name] = {key: pick(measure[key] for measure in measures) for key in measures[0]}
+                            if not args.update and not regressions_of(name, results[name], baselines.get("cases", {}).get(name), args.threshold):
+                                break
+                await hass.async_block_till_done()
+        finally:
+            await hass.async_stop(force=True)
+    assert service_calls or not any(name.startswith("executor") for name in results), "The actions must reach the services"
+
+    report(results, baselines)
+
+    if args.update:
+        # A filtered run only replaces the baselines of its cases
+        cases = {**baselines.get("cases", {}), **results} if args.filter else results
+        BASELINES.write_text(json.dumps({"python": platform.python_version(), "cases": dict(sorted(cases.items()))}, indent=2) + "\n")
+        print(f"baselines written to {BASELINES}")
+        return 0
+
+    regressions = [regression for name, result in results.items() for regression in regressions_of(name, result, baselines.get("cases", {}).get(name), args.threshold)]
+    for regression in regressions:
+        print(f"regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
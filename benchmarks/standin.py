@@ -0,0 +1,228 @@
+"""Local stand-in for the Perplexity chat completions endpoint.
+
+Serves canned PerplexityAgentResponse documents, or replays recorded responses of
+the API, either as a single JSON body or as a server-sent event stream. The time
+to the first token can follow a distribution (see lognormal_latency), errors and
+429 responses can be returned at random or beyond a rate limit, and faults (error
+statuses, Retry-After headers, extra latency) can be queued for the next requests.
+
+With an upstream URL, requests are forwarded to the real API (with the API key they
+carry) and its responses are appended to a recordings file, to be replayed later.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+
+from collections import deque
+from collections.abc import Callable
+
+import aiohttp
+
+from aiohttp import web
+
+
+DEFAULT_CONTENT: str = (
+    "The living room is at 21.5 degrees and all lights are off. "
+    "Tomorrow will be mostly sunny with a light breeze in the afternoon. "
+    "I also noticed the garage door has been open for two hours, you may want to close it."
+)
+RATE_LIMIT_WINDOW: float = 60   # in seconds, over which the rate limit of the stand-in is counted
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, seed: int = 0) -> Callable[[], float]:
+    """Return a latency distribution with the long tail of real API latencies.
+
+    Args:
+        median (float): Median latency in seconds.
+        sigma (float): Spread (0.5 gives a p99 about 3 times the median).
+        seed (int): Seed of the random generator, for reproducible runs.
+    Returns:
+        Callable[[], float]: Draws a latency in seconds.
+    """
+    rng = random.Random(seed)
+    return lambda: rng.lognormvariate(math.log(median), sigma)
+
+
+def uniform_latency(low: float, high: float, seed: int = 0) -> Callable[[], float]:
+    """Return a latency distribution uniform between two bounds, in seconds."""
+    rng = random.Random(seed)
+    return lambda: rng.uniform(low, high)
+
+
+def load_recordings(path: str) -> list[dict]:
+    """Read recorded chat completion responses, one JSON document per line.
+
+    Args:
+        path (str): Recordings file (JSON Lines).
+    Returns:
+        list[dict]: The responses, as returned by the API.
+    """
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class PerplexityStandIn:
+    """aiohttp application mimicking the Perplexity chat completions API."""
+
+    def __init__(
+        self,
+        content: str = DEFAULT_CONTENT,
+        first_token_delay: float | Callable[[], float] = 0.3,
+        token_delay: float = 0.02,
+        token_size: int = 4,
+        recordings: list[dict] | None = None,
+        error_rate: float = 0.0,
+        rate_limited_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: float | None = 1.0,
+        seed: int = 0,
+        upstream: str | None = None,
+        record_to: str | None = None,
+    ) -> None:
+        """Initialize the stand-in.
+
+        Args:
+            content (str): Spoken content returned in every response (without recordings).
+            first_token_delay (float | Callable[[], float]): Seconds before the first token is produced, or a distribution drawing them.
+            token_delay (float): Seconds between two streamed tokens.
+            token_size (int): Characters of the JSON document per streamed token.
+            recordings (list[dict] | None): Recorded responses, replayed in turn instead of the content.
+            error_rate (float): Share of the requests answered with a server error (500 or 503).
+            rate_limited_rate (float): Share of the requests answered with 429.
+            rate_limit (float): Requests per minute beyond which requests are answered with 429 (0 for unlimited).
+            retry_after (float | None): Retry-After header sent with the 429 responses, in seconds.
+            seed (int): Seed of the random errors.
+            upstream (str | None): Real endpoint the requests are forwarded to (recording mode).
+            record_to (str | None): File the upstream responses are appended to, as JSON Lines.
+        """
+        self.document: str = json.dumps({"content": content, "actions": []})
+        self.first_token_delay: float | Callable[[], float] = first_token_delay
+        self.token_delay: float = token_delay
+        self.token_size: int = token_size
+        self.recordings: list[dict] = recordings or []
+        self.error_rate: float = error_rate
+        self.rate_limited_rate: float = rate_limited_rate
+        self.rate_limit: float = rate_limit
+        self.retry_after: float | None = retry_after
+        self.upstream: str | None = upstream
+        self.record_to: str | None = record_to
+        self.requests: int = 0
+        self.errors: int = 0
+        self.rate_limited: int = 0
+        self.models: list[str] = []
+        self.faults: deque[dict] = deque()
+        self.connections: set[int] = set()
+        self._rng = random.Random(seed)
+        self._accepted: deque[float] = deque()   # Times of the requests counted against the rate limit
+        self._session: aiohttp.ClientSession | None = None
+        self.app = web.Application()
+        self.app.router.add_post("/chat/completions", self._handle)
+
+    def inject(self, count: int = 1, status: int | None = None, retry_after: float | None = None, delay: float = 0.0) -> None:
+        """Queue faults for the next requests.
+
+        Args:
+            count (int): Number of requests affected.
+            status (int | None): Error status returned instead of the response (None to answer normally).
+            retry_after (float | None): Retry-After header sent with the error, in seconds.
+            delay (float): Extra seconds before answering.
+        """
+        for _ in range(count):
+            self.faults.append({"status": status, "retry_after": retry_after, "delay": delay})
+
+    def _usage(self) -> dict:
+        return {"prompt_tokens": 1000, "completion_tokens": len(self.document) // 4, "cost": {"total_cost": 0.006}}
+
+    def _draw_fault(self) -> dict:
+        """Return the queued fault of the request, or a random or rate limit error."""
+        if self.faults:
+            return self.faults.popleft()
+
+        now = time.monotonic()
+        while self._accepted and self._accepted[0] < now - RATE_LIMIT_WINDOW:
+            self._accepted.popleft()
+        if self.rate_limit and len(self._accepted) >= self.rate_limit:
+            return {"status": 429, "retry_after": self.retry_after}
+        self._accepted.append(now)
+
+        draw = self._rng.random()
+        if draw < self.rate_limited_rate:
+            return {"status": 429, "retry_after": self.retry_after}
+        if draw < self.rate_limited_rate + self.error_rate:
+            return {"status": self._rng.choice((500, 503))}
+        return {}
+
+    def _response(self, model: str | None) -> dict:
+        """Return the next response to serve: the next recording, or the canned content."""
+        if self.recordings:
+            recording = self.recordings[(self.requests - 1) % len(self.recordings)]
+            return {**recording, "model": model or recording.get("model")}
+        return {"model": model, "choices": [{"message": {"role": "assistant", "content": self.document}}], "usage": self._usage()}
+
+    async def _async_forward(self, request: web.Request, body: dict) -> dict | web.Response:
+        """Send a request to the upstream API and record its response (non-streamed, the stand-in streams it itself)."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        headers = {"Authorization": request.headers.get("Authorization", "")}
+        async with self._session.post(self.upstream, json={**body, "stream": False}, headers=headers) as resp:
+            if resp.status != 200:
+                return web.Response(status=resp.status, text=await resp.text(), headers={"Retry-After": resp.headers.get("Retry-After", "")})
+            data = await resp.json()
+        if self.record_to:
+            with open(self.record_to, "a", encoding="utf-8") as file:
+                file.write(json.dumps(data) + "\n")
+        return data
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        self.connections.add(id(request.transport))
+        body = await request.json()
+        self.models.append(body.get("model"))
+
+        fault = self._draw_fault()
+        delay = self.first_token_delay() if callable(self.first_token_delay) else self.first_token_delay
+        await asyncio.sleep(delay + fault.get("delay", 0.0))
+        if fault.get("status"):
+            self.rate_limited += fault["status"] == 429
+            self.errors += fault["status"] != 429
+            headers = {"Retry-After": str(fault["retry_after"])} if fault.get("retry_after") is not None else None
+            return web.json_response({"error": {"message": "Injected fault"}}, status=fault["status"], headers=headers)
+
+        if self.upstream:
+            data = await self._async_forward(request, body)
+            if isinstance(data, web.Response):
+                return data
+        else:
+            data = self._response(body.get("model"))
+        document: str = data["choices"][0]["message"]["content"]
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_delay * (len(document) // self.token_size))
+            return web.json_response(data)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i in range(0, len(document), self.token_size):
+            chunk = {"model": data.get("model"), "choices": [{"delta": {"content": document[i:i + self.token_size]}}], "usage": data.get("usage")}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.token_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def async_start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the endpoint URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/chat/completions"
+
+    async def async_stop(self) -> None:
+        """Stop serving."""
+        await self._runner.cleanup()
+        if self._session is not None:
+            await self._session.close()
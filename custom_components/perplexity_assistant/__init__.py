@@ -3,17 +3,17 @@ import logging
 import voluptuous as vol
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.components import conversation as ha_conversation
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.typing import ConfigType
 from typing import Any
 
+from .client import PerplexityClient
 from .conversation import PerplexityAgent
 from .const import *
 
-# Platforms we set up when requested
-PLATFORMS: list[str] = ["sensor"]
+# Platforms we set up: the conversation entity and the sensors (the bill sensors only when requested, see sensor.py)
+PLATFORMS: list[str] = ["conversation", "sensor"]
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,27 +47,53 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """
     _LOGGER.debug("Setting up Perplexity Assistant from config entry")
     
-    # Forward setup to sensor platform
-    if entry.data.get("create_credit_sensor"):
-        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    
-    agent = PerplexityAgent(hass, entry.entry_id)
+    # One pooled HTTP client per config entry, closed in async_unload_entry
+    client = PerplexityClient(hass)
+    agent = PerplexityAgent(hass, entry.entry_id, client)
+    await agent.async_setup()
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = agent
+    entry.async_on_unload(entry.add_update_listener(async_update_entry))
+    
+    # Forward setup to the platforms (after the agent is created, the conversation entity and the statistics sensors use it)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     
-    # Register the conversation agent and service
-    ha_conversation.async_set_agent(hass, entry, agent)
+    # Register the services
     service_schema = vol.Schema({
         vol.Required("prompt"): cv.string,
         vol.Optional("model"): cv.string,
         vol.Optional("enable_websearch"): cv.boolean,
         vol.Optional("execute_actions"): cv.boolean,
-        vol.Optional("force_actions_execution"): cv.boolean
+        vol.Optional("force_actions_execution"): cv.boolean,
+        vol.Optional("use_cache"): cv.boolean
     })
     
     hass.services.async_register(DOMAIN, "ask", agent.async_ask, schema=service_schema, supports_response="optional")
+    batch_schema = vol.Schema({
+        vol.Required("items"): vol.All(cv.ensure_list, vol.Length(min=1), [service_schema]),
+        vol.Optional("max_concurrency", default=DEFAULT_BATCH_CONCURRENCY): vol.All(vol.Coerce(int), vol.Range(min=1, max=DEFAULT_POOL_SIZE)),
+    })
+    hass.services.async_register(DOMAIN, "ask_batch", agent.async_ask_batch, schema=batch_schema, supports_response="optional")
+    usage_schema = vol.Schema({
+        vol.Optional("days", default=USAGE_REPORT_DAYS): vol.All(vol.Coerce(int), vol.Range(min=0, max=USAGE_DAYS_KEPT)),
+    })
+    hass.services.async_register(DOMAIN, "get_usage", agent.async_get_usage, schema=usage_schema, supports_response="only")
+
+    # Connect to the API and encode the entities context now, so the first request after a restart is not a cold one
+    entry.async_create_background_task(hass, agent.async_warm_up(), f"{DOMAIN} warm-up")
     
     return True
 
+async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply a change of the config entry (options, API key, title).
+
+    Args:
+        hass (HomeAssistant): Home Assistant instance.
+        entry: Configuration entry.
+    """
+    agent: PerplexityAgent | None = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if agent:
+        agent.async_update_template()
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry for Perplexity Assistant.
 
@@ -82,8 +108,12 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """
     _LOGGER.debug("Unloading Perplexity Assistant config entry")
     
-    hass.data.get(DOMAIN, {}).pop(entry.entry_id, None) # Remove agent from data
-    hass.services.async_remove(DOMAIN, "ask") # Remove service
+    agent: PerplexityAgent | None = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None) # Remove agent from data
+    if agent:
+        await agent.async_unload()
+    hass.services.async_remove(DOMAIN, "ask") # Remove services
+    hass.services.async_remove(DOMAIN, "ask_batch")
+    hass.services.async_remove(DOMAIN, "get_usage")
 
     # Unload platforms
     await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
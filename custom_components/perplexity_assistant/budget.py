@@ -0,0 +1,122 @@
+"""Spending limits checked before a request is sent to the Perplexity API."""
+import logging
+
+from .usage import UsageLedger
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class BudgetDecision:
+    """Outcome of the budget check of a request."""
+    __slots__ = ("model", "max_tokens", "estimate", "blocked", "reason")
+
+    def __init__(self, model: str, max_tokens: int, estimate: float, blocked: bool = False, reason: str | None = None) -> None:
+        """Initialize the decision.
+
+        Args:
+            model (str): Model the request is sent to (possibly cheaper than the requested one).
+            max_tokens (int): Maximum length of the response (possibly cut).
+            estimate (float): Estimated cost of the request with this model and length.
+            blocked (bool): Whether the request must not be sent.
+            reason (str | None): Why the request was downgraded or blocked.
+        """
+        self.model: str = model
+        self.max_tokens: int = max_tokens
+        self.estimate: float = estimate
+        self.blocked: bool = blocked
+        self.reason: str | None = reason
+
+
+class BudgetGuard:
+    """Checks the estimated cost of a request against the daily and monthly budgets.
+
+    The spend of the day and of the month comes from the usage ledger, plus the estimated
+    cost of the requests still running. Once a request would bring the spend past the
+    downgrade threshold (a share of a budget), it goes down the chain of cheaper models
+    and its response length is cut. When even the cheapest request would exceed a budget,
+    it is refused.
+    """
+
+    def __init__(self, usage: UsageLedger, pricing: dict[str, dict[str, float]], downgrades: dict[str, str]) -> None:
+        """Initialize the budget guard.
+
+        Args:
+            usage (UsageLedger): Ledger the spend is read from.
+            pricing (dict[str, dict[str, float]]): Price per request, input token and output token of each model.
+            downgrades (dict[str, str]): Cheaper model of each model.
+        """
+        self.usage: UsageLedger = usage
+        self.pricing: dict[str, dict[str, float]] = pricing
+        self.downgrades: dict[str, str] = downgrades
+        self.pending: float = 0.0       # Estimated cost of the requests running
+        self.downgraded: int = 0
+        self.blocked: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Return the spend and the guard counters."""
+        return {
+            "spent_today": round(self.usage.today["cost"], 6),
+            "spent_month": round(self.usage.month["cost"], 6),
+            "pending": round(self.pending, 6),
+            "downgraded": self.downgraded,
+            "blocked": self.blocked,
+        }
+
+    def estimate(self, model: str, prompt_tokens: int, max_tokens: int) -> float:
+        """Estimate the cost of a request, assuming the response uses all of max_tokens.
+
+        Args:
+            model (str): Model of the request.
+            prompt_tokens (int): Estimated size of the prompt.
+            max_tokens (int): Maximum length of the response.
+        Returns:
+            float: Estimated cost (the price of the most expensive known model if the model is unknown).
+        """
+        price = self.pricing.get(model) or max(self.pricing.values(), key=lambda price: price["request"])
+        return price["request"] + prompt_tokens * price["input"] + max_tokens * price["output"]
+
+    def check(self, model: str, prompt_tokens: int, max_tokens: int, daily_budget: float, monthly_budget: float, threshold: float, downgrade_max_tokens: int) -> BudgetDecision:
+        """Decide how a request may be sent.
+
+        Args:
+            model (str): Requested model.
+            prompt_tokens (int): Estimated size of the prompt.
+            max_tokens (int): Requested maximum length of the response.
+            daily_budget (float): Spending limit of the day (0 for no limit).
+            monthly_budget (float): Spending limit of the month (0 for no limit).
+            threshold (float): Share of a budget (in percent) from which requests are downgraded.
+            downgrade_max_tokens (int): Maximum length of the responses of downgraded requests.
+        Returns:
+            BudgetDecision: The model and length to use, or blocked. Its estimate is reserved until release is called.
+        """
+        limits = [(limit, spent + self.pending) for limit, spent in ((daily_budget, self.usage.today["cost"]), (monthly_budget, self.usage.month["cost"])) if limit > 0]
+        estimate = self.estimate(model, prompt_tokens, max_tokens)
+        if all(spent + estimate <= limit * threshold / 100 for limit, spent in limits):
+            self.pending += estimate
+            return BudgetDecision(model, max_tokens, estimate)
+
+        # Past the threshold: go down the chain of cheaper models while the request stays above it
+        original = model
+        max_tokens = min(max_tokens, downgrade_max_tokens)
+        estimate = self.estimate(model, prompt_tokens, max_tokens)
+        while any(spent + estimate > limit * threshold / 100 for limit, spent in limits) and (cheaper := self.downgrades.get(model)):
+            model = cheaper
+            estimate = self.estimate(model, prompt_tokens, max_tokens)
+
+        if any(spent + estimate > limit for limit, spent in limits):
+            self.blocked += 1
+            reason = f"Budget exceeded: the request ({original}, about ${estimate:.4f}) would go past the spending limit."
+            _LOGGER.warning(reason)
+            return BudgetDecision(model, max_tokens, 0.0, blocked=True, reason=reason)
+
+        self.downgraded += 1
+        self.pending += estimate
+        reason = f"Budget threshold reached: request downgraded from {original} to {model} with at most {max_tokens} tokens."
+        _LOGGER.info(reason)
+        return BudgetDecision(model, max_tokens, estimate, reason=reason)
+
+    def release(self, decision: BudgetDecision) -> None:
+        """Release the estimate reserved by check, once the request is finished (its actual cost is then in the ledger)."""
+        self.pending = max(0.0, self.pending - decision.estimate)
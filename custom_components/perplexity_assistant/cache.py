@@ -0,0 +1,135 @@
+"""Persistent response cache for repeated Perplexity prompts."""
+import hashlib
+import json
+import logging
+import time
+
+from collections import OrderedDict
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import *
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivial variations share the same cache entry.
+
+    Args:
+        prompt (str): Raw prompt.
+    Returns:
+        str: Lower-cased prompt with collapsed whitespace and no trailing punctuation.
+    """
+    return " ".join(prompt.lower().split()).rstrip(" ?!.")
+
+
+def make_cache_key(prompts: list[str], model: str, websearch: bool, fingerprint: str) -> str:
+    """Build a cache key.
+
+    Args:
+        prompts (list[str]): User prompts of the request.
+        model (str): Model used for the request.
+        websearch (bool): Whether web search is enabled for the request.
+        fingerprint (str): Fingerprint of everything else the answer depends on (entities, user).
+    Returns:
+        str: Hex digest identifying the request.
+    """
+    material = json.dumps([[normalize_prompt(p) for p in prompts], model, websearch, fingerprint], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of raw API responses with a time-to-live, persisted in a Home Assistant Store."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the cache.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            entry_id (str): Configuration entry ID (one cache per entry).
+        """
+        self.hass: HomeAssistant = hass
+        self._store: Store = Store(hass, CACHE_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.response_cache")
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict() # key -> (expires_at, data)
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Return the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_rate": round(100 * self.hits / lookups, 1) if lookups else 0.0,
+        }
+
+    async def async_load(self) -> None:
+        """Load the persisted entries, dropping the expired ones."""
+        stored: dict | None = await self._store.async_load()
+        if not stored:
+            return
+
+        now = time.time()
+        for key, expires_at, data in stored.get("entries", []):
+            if expires_at > now:
+                self._entries[key] = (expires_at, data)
+        self.hits = stored.get("hits", 0)
+        self.misses = stored.get("misses", 0)
+
+    async def async_save(self) -> None:
+        """Write the cache to disk immediately (used on unload)."""
+        await self._store.async_save(self._data_to_save())
+
+    def _data_to_save(self) -> dict:
+        """Return the serializable content of the cache."""
+        return {
+            "entries": [[key, expires_at, data] for key, (expires_at, data) in self._entries.items()],
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached response for a key, if it is still fresh.
+
+        Args:
+            key (str): Cache key.
+        Returns:
+            dict | None: Raw API response, or None on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            # Only an expired entry changes what is on disk; the counters are saved with the next write or on unload
+            if self._entries.pop(key, None) is not None:
+                self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, data: dict, ttl: float, max_entries: int) -> None:
+        """Store a response, evicting the least recently used entries beyond max_entries.
+
+        Args:
+            key (str): Cache key.
+            data (dict): Raw API response.
+            ttl (float): Seconds the response stays valid.
+            max_entries (int): Maximum number of cached responses.
+        """
+        self._entries[key] = (time.time() + ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+        self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        self._entries.clear()
+        self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
@@ -0,0 +1,284 @@
+"""Pooled HTTP client for the Perplexity API."""
+import aiohttp
+import asyncio
+import json
+import logging
+import time
+
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE, __version__ as HA_VERSION
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant
+from homeassistant.util.ssl import get_default_context
+
+from .const import *
+from .template import RequestTemplate
+from .tracing import STAGE_BODY_READ, STAGE_CONNECT, STAGE_FIRST_BYTE, STAGE_PAYLOAD, RequestTrace
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header.
+
+    Args:
+        value (str | None): Header value, either a number of seconds or an HTTP date.
+    Returns:
+        float | None: Seconds to wait, or None if absent or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _connection_trace_config() -> aiohttp.TraceConfig:
+    """Return an aiohttp trace configuration adding the time spent opening connections to the RequestTrace of a request."""
+    async def on_connection_create_start(_session, context, _params) -> None:
+        context.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(_session, context, _params) -> None:
+        if isinstance(trace := context.trace_request_ctx, RequestTrace):
+            trace.add(STAGE_CONNECT, time.perf_counter() - context.connect_start)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    return trace_config
+
+
+class PerplexityClient:
+    """Long-lived HTTP client shared by every request of a config entry.
+
+    A single aiohttp session (and its connection pool) is kept open for the lifetime
+    of the config entry, so consecutive requests reuse the same keep-alive TCP/TLS
+    connection instead of paying a new handshake on every voice command. The connection
+    can also be opened ahead of a request (async_preconnect), while the user is speaking.
+    The session has its own connector (sized by pool_size, with a longer keep-alive), so
+    it is not the shared session of Home Assistant: it is closed when the config entry is
+    unloaded, or when Home Assistant shuts down.
+    """
+
+    def __init__(self, hass: HomeAssistant, base_url: str = BASE_URL, pool_size: int = DEFAULT_POOL_SIZE) -> None:
+        """Initialize the client.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            base_url (str): Chat completions endpoint.
+            pool_size (int): Maximum number of simultaneous connections to the API.
+        """
+        self.hass: HomeAssistant = hass
+        self.base_url: str = base_url
+        self._pool_size: int = pool_size
+        self._session: aiohttp.ClientSession | None = None
+        self._unsub_close: CALLBACK_TYPE | None = None   # Closes the session on Home Assistant shutdown
+        self._auth: dict[str, dict] = {}           # Headers of each API key in use
+        self._last_used: float = float("-inf")      # perf_counter() of the last response received from the API
+        self._preconnecting: asyncio.Future | None = None
+        self.preconnects: int = 0                   # Connections opened ahead of a request
+        self.preconnect_skips: int = 0              # Pre-connections skipped, a connection being open already
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                limit_per_host=self._pool_size,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                ssl=get_default_context(),
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Content-Type": "application/json", "User-Agent": f"HomeAssistant/{HA_VERSION}"},
+                trace_configs=[_connection_trace_config()],
+            )
+            if self.hass is not None and self._unsub_close is None:
+                self._unsub_close = self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, self._async_on_hass_close)
+        return self._session
+
+    async def _async_on_hass_close(self, _event: Event) -> None:
+        """Close the session when Home Assistant shuts down, the config entry not being unloaded then."""
+        self._unsub_close = None    # The listener is removed once fired
+        await self.async_close()
+
+    async def async_close(self) -> None:
+        """Close the session and every pooled connection."""
+        if self._unsub_close is not None:
+            self._unsub_close()
+            self._unsub_close = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def async_preconnect(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT) -> bool:
+        """Open a pooled connection to the API ahead of a request, unless one was used recently.
+        The connection is opened with a GET request without credentials (refused, so nothing is billed), whose
+        response is read so the connection goes back to the pool for the next request.
+
+        Args:
+            connect_timeout (float): Seconds allowed to open the connection (including TLS).
+        Returns:
+            bool: True if a connection was opened.
+        """
+        if self._preconnecting is not None or time.perf_counter() - self._last_used < WARM_CONNECTION_AGE:
+            self.preconnect_skips += 1
+            return False
+
+        self._preconnecting = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        try:
+            async with self.session.get(self.base_url, timeout=aiohttp.ClientTimeout(total=2 * connect_timeout, connect=connect_timeout)) as resp:
+                await resp.read()
+            self._last_used = time.perf_counter()
+            self.preconnects += 1
+            _LOGGER.debug(f"Connection to the Perplexity API opened ahead of a request in {(self._last_used - start) * 1000:.0f}ms.")
+            return True
+        except Exception as e:
+            _LOGGER.debug(f"Could not open a connection to the Perplexity API ahead of a request: {e}")
+            return False
+        finally:
+            self._preconnecting.set_result(None)
+            self._preconnecting = None
+
+    async def _async_wait_preconnect(self, trace: RequestTrace | None) -> None:
+        """Wait for a connection being opened ahead of the request, so the request reuses it instead of opening another one.
+
+        Args:
+            trace (RequestTrace | None): Trace the wait is added to, as connection time.
+        """
+        if self._preconnecting is None:
+            return
+        start = time.perf_counter()
+        await asyncio.shield(self._preconnecting)
+        trace.add(STAGE_CONNECT, time.perf_counter() - start) if trace else None
+
+    @staticmethod
+    async def _async_error_from_response(resp: aiohttp.ClientResponse) -> dict:
+        """Build the error returned for a non-200 response.
+
+        Args:
+            resp (aiohttp.ClientResponse): The response.
+        Returns:
+            dict: {"error": str, "status": int, "retry_after": float | None}, Retry-After being in seconds.
+        """
+        _LOGGER.error(f"Perplexity API error: status {resp.status}. Error response: {await resp.text()}")
+        return {"error": f"Status code: {resp.status}", "status": resp.status, "retry_after": parse_retry_after(resp.headers.get("Retry-After"))}
+
+    def _headers(self, api_key: str) -> dict:
+        """Return the request headers for an API key (built once per key, as requests alternate between the keys of a pool)."""
+        headers = self._auth.get(api_key)
+        if headers is None:
+            headers = self._auth[api_key] = {"Authorization": f"Bearer {api_key}"}
+        return headers
+
+    @staticmethod
+    def _body(payload: dict, template: RequestTemplate | None, trace: RequestTrace | None) -> dict:
+        """Return the body arguments of a request: the template serialization, or the payload as JSON."""
+        if not template:
+            return {"json": payload}
+        start = time.perf_counter()
+        body = template.serialize(payload)
+        trace.add(STAGE_PAYLOAD, time.perf_counter() - start) if trace else None
+        return {"data": body}
+
+    @staticmethod
+    def _trace_first_byte(trace: RequestTrace | None, sent: float, connect: float) -> float:
+        """Record the time from the request sent to the response headers (without the time spent connecting).
+
+        Args:
+            trace (RequestTrace | None): Trace of the request.
+            sent (float): perf_counter() when the request was sent.
+            connect (float): Connection time of the trace when the request was sent.
+        Returns:
+            float: perf_counter() when the headers were received.
+        """
+        received = time.perf_counter()
+        if trace:
+            trace.add(STAGE_FIRST_BYTE, received - sent - (trace.stages.get(STAGE_CONNECT, 0.0) - connect))
+        return received
+
+    async def async_post(self, payload: dict, api_key: str, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, template: RequestTemplate | None = None, trace: RequestTrace | None = None) -> dict:
+        """Send a chat completion request.
+
+        Args:
+            payload (dict): The request body (or its dynamic fields if a template is given).
+            api_key (str): Perplexity API key.
+            connect_timeout (float): Seconds allowed to open a connection (including TLS).
+            read_timeout (float): Seconds allowed between two reads of the response.
+            template (RequestTemplate | None): Template providing the static fields of the body.
+            trace (RequestTrace | None): Trace the connection, first byte and body read durations are added to.
+        Returns:
+            dict: The response from the Perplexity API, or {"error": str, "status": int | None, "retry_after": float | None} on failure.
+        """
+        timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+
+        try:
+            body = self._body(payload, template, trace)
+            await self._async_wait_preconnect(trace)
+            connect = trace.stages.get(STAGE_CONNECT, 0.0) if trace else 0.0
+            sent = time.perf_counter()
+            async with self.session.post(self.base_url, **body, headers=self._headers(api_key), timeout=timeout, trace_request_ctx=trace) as resp:
+                received = self._last_used = self._trace_first_byte(trace, sent, connect)
+                if resp.status != 200:
+                    return await self._async_error_from_response(resp)
+
+                data: dict = await resp.json()
+                trace.add(STAGE_BODY_READ, time.perf_counter() - received) if trace else None
+                _LOGGER.debug(f"Perplexity API raw response received: {data}")
+                return data
+        except Exception as e:
+            _LOGGER.error("Exception while communicating with Perplexity API: %s", e)
+            return {"error": str(e) or type(e).__name__, "status": None, "retry_after": None}
+
+    async def async_stream(self, payload: dict, api_key: str, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT, template: RequestTemplate | None = None, trace: RequestTrace | None = None) -> AsyncGenerator[dict, None]:
+        """Send a chat completion request and yield the server-sent chunks as they arrive.
+
+        Args:
+            payload (dict): The request body, or its dynamic fields if a template is given (the "stream" flag is forced on).
+            api_key (str): Perplexity API key.
+            connect_timeout (float): Seconds allowed to open a connection (including TLS).
+            read_timeout (float): Seconds allowed between two chunks.
+            template (RequestTemplate | None): Template providing the static fields of the body.
+            trace (RequestTrace | None): Trace the connection, first byte and body read (whole stream) durations are added to.
+        Yields:
+            dict: Each decoded chunk, or a single {"error": str} on failure.
+        """
+        timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+
+        try:
+            body = self._body({**payload, "stream": True}, template, trace)
+            await self._async_wait_preconnect(trace)
+            connect = trace.stages.get(STAGE_CONNECT, 0.0) if trace else 0.0
+            sent = time.perf_counter()
+            async with self.session.post(self.base_url, **body, headers=self._headers(api_key), timeout=timeout, trace_request_ctx=trace) as resp:
+                received = self._last_used = self._trace_first_byte(trace, sent, connect)
+                if resp.status != 200:
+                    yield await self._async_error_from_response(resp)
+                    return
+
+                try:
+                    async for raw_line in resp.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        yield json.loads(data)
+                finally:
+                    trace.add(STAGE_BODY_READ, time.perf_counter() - received) if trace else None
+        except Exception as e:
+            _LOGGER.error("Exception while streaming from Perplexity API: %s", e)
+            yield {"error": str(e) or type(e).__name__, "status": None, "retry_after": None}
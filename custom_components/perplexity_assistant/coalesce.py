@@ -0,0 +1,51 @@
+"""Single-flight coalescing of identical requests running at the same time."""
+import asyncio
+import logging
+
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Runs at most one request per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self) -> None:
+        """Initialize the coalescer."""
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.requests: int = 0     # Requests actually run
+        self.coalesced: int = 0    # Requests answered by a request already running
+
+    @property
+    def stats(self) -> dict:
+        """Return the coalescing statistics."""
+        total = self.requests + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 3) if total else 0.0,
+        }
+
+    async def async_run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Run a request, or join the identical request already running.
+        The request runs in its own task, so a cancelled caller does not cancel it for the others.
+
+        Args:
+            key (str): Identity of the request.
+            factory (Callable[[], Awaitable[Any]]): Starts the request (only called if none is running for the key).
+        Returns:
+            tuple[Any, bool]: The result of the request, and whether it was shared with an earlier caller.
+        """
+        task = self._in_flight.get(key)
+        if task is not None and not task.done():
+            self.coalesced += 1
+            _LOGGER.debug(f"Joining identical request already in flight ({key[:12]}).")
+            return await asyncio.shield(task), True
+
+        self.requests += 1
+        task = self._in_flight[key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda done: self._in_flight.pop(key) if self._in_flight.get(key) is done else None)
+        return await asyncio.shield(task), False
@@ -186,10 +186,16 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
                 return await self.async_step_authorization()
             if user_input["menu"] == "model_parameters":
                 return await self.async_step_model_parameters()
+            if user_input["menu"] == "performance":
+                return await self.async_step_performance()
+            if user_input["menu"] == "memory":
+                return await self.async_step_memory()
+            if user_input["menu"] == "budget":
+                return await self.async_step_budget()
 
         selector = SelectSelector(
             SelectSelectorConfig(
-                options=['api', 'model', 'model_parameters', 'authorization'],
+                options=['api', 'model', 'model_parameters', 'authorization', 'memory', 'budget', 'performance'],
                 mode=SelectSelectorMode.DROPDOWN,
                 translation_key="menu"
             )
@@ -217,15 +223,21 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
         # If the user has submitted the form
         if user_input is not None:
             api_key: str = user_input.get(CONF_API_KEY, "")
+            extra_api_keys: list[str] = [key.strip() for key in user_input.get(CONF_EXTRA_API_KEYS, []) if key.strip()]
 
-            # Check if the API key has a valid format
+            # Check if the API keys have a valid format
             if not api_key.startswith("pplx-"):
                 errors[CONF_API_KEY] = "invalid_api_key"
             elif len(api_key) != 53:
                 errors[CONF_API_KEY] = "invalid_api_key_length"
+            elif not all(key.startswith("pplx-") for key in extra_api_keys):
+                errors[CONF_EXTRA_API_KEYS] = "invalid_api_key"
+            elif not all(len(key) == 53 for key in extra_api_keys):
+                errors[CONF_EXTRA_API_KEYS] = "invalid_api_key_length"
             else:
                 options = dict(self.config_entry.options)
                 options.update(user_input)
+                options[CONF_EXTRA_API_KEYS] = extra_api_keys
                 return self.async_create_entry(title="", data=options)
 
         text_selector = TextSelector(
@@ -235,12 +247,22 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
             )
         )
         
+        extra_keys_selector = TextSelector(
+            TextSelectorConfig(
+                type=TextSelectorType.PASSWORD,
+                autocomplete="off",
+                multiple=True,
+            )
+        )
+
         # Show the form to update options
         current_api_key: str = self.config_entry.options.get(CONF_API_KEY, self.config_entry.data.get(CONF_API_KEY, ""))
+        current_extra_api_keys: list[str] = self.config_entry.options.get(CONF_EXTRA_API_KEYS, self.config_entry.data.get(CONF_EXTRA_API_KEYS, []))
 
         # Define the options schema with current values as defaults
         options_schema = vol.Schema({
             vol.Required(CONF_API_KEY, default=current_api_key): text_selector,
+            vol.Optional(CONF_EXTRA_API_KEYS, default=current_extra_api_keys): extra_keys_selector,
         })
 
         return self.async_show_form(step_id="api", data_schema=options_schema, errors=errors,)
@@ -257,6 +279,7 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
         current_model: str = self.config_entry.options.get(CONF_MODEL, self.config_entry.data.get(CONF_MODEL, DEFAULT_MODEL))
         current_language: str = self.config_entry.options.get(CONF_LANGUAGE, self.config_entry.data.get(CONF_LANGUAGE, DEFAULT_LANGUAGE))
         current_custom_system_prompt: str = self.config_entry.options.get(CONF_CUSTOM_SYSTEM_PROMPT, self.config_entry.data.get(CONF_CUSTOM_SYSTEM_PROMPT, ""))
+        current_enable_model_router: bool = self.config_entry.options.get(CONF_ENABLE_MODEL_ROUTER, self.config_entry.data.get(CONF_ENABLE_MODEL_ROUTER, DEFAULT_ENABLE_MODEL_ROUTER))
 
         text_selector = TextSelector(
             TextSelectorConfig(
@@ -270,6 +293,7 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
         options_schema = vol.Schema({
             vol.Required(CONF_LANGUAGE, default=current_language): SelectSelector(SelectSelectorConfig(options=SUPPORTED_LANGUAGES, mode=SelectSelectorMode.DROPDOWN)),
             vol.Required(CONF_MODEL, default=current_model): SelectSelector(SelectSelectorConfig(options=SUPPORTED_MODELS, mode=SelectSelectorMode.DROPDOWN)),
+            vol.Optional(CONF_ENABLE_MODEL_ROUTER, default=current_enable_model_router): BooleanSelector(),
             vol.Optional(CONF_CUSTOM_SYSTEM_PROMPT, default=current_custom_system_prompt): text_selector,
         })
         
@@ -360,3 +384,118 @@ class PerplexityOptionsFlowHandler(config_entries.OptionsFlow):
         })
 
         return self.async_show_form(step_id="authorization", data_schema=options_schema,)
+
+    async def async_step_performance(self, user_input: dict[str, any] | None = None) -> config_entries.ConfigFlowResult:
+        """Manage the options step.
+
+        Args:
+            user_input (dict | None): Dictionary containing the user input or None.
+        Returns:
+            ConfigFlowResult: Shows the form or creates the options entry.
+        """
+        if user_input is not None:
+            options = dict(self.config_entry.options)
+            options.update(user_input)
+            return self.async_create_entry(title="", data=options)
+
+        # Show the form to update options
+        current_connect_timeout: float = self.config_entry.options.get(CONF_CONNECT_TIMEOUT, self.config_entry.data.get(CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT))
+        current_read_timeout: float = self.config_entry.options.get(CONF_READ_TIMEOUT, self.config_entry.data.get(CONF_READ_TIMEOUT, DEFAULT_READ_TIMEOUT))
+        current_enable_streaming: bool = self.config_entry.options.get(CONF_ENABLE_STREAMING, self.config_entry.data.get(CONF_ENABLE_STREAMING, DEFAULT_ENABLE_STREAMING))
+        current_enable_warm_up: bool = self.config_entry.options.get(CONF_ENABLE_WARM_UP, self.config_entry.data.get(CONF_ENABLE_WARM_UP, DEFAULT_ENABLE_WARM_UP))
+        current_enable_fast_path: bool = self.config_entry.options.get(CONF_ENABLE_FAST_PATH, self.config_entry.data.get(CONF_ENABLE_FAST_PATH, DEFAULT_ENABLE_FAST_PATH))
+        current_cache_ttl: float = self.config_entry.options.get(CONF_CACHE_TTL, self.config_entry.data.get(CONF_CACHE_TTL, DEFAULT_CACHE_TTL))
+        current_cache_max_entries: int = self.config_entry.options.get(CONF_CACHE_MAX_ENTRIES, self.config_entry.data.get(CONF_CACHE_MAX_ENTRIES, DEFAULT_CACHE_MAX_ENTRIES))
+        current_context_max_entities: int = self.config_entry.options.get(CONF_CONTEXT_MAX_ENTITIES, self.config_entry.data.get(CONF_CONTEXT_MAX_ENTITIES, DEFAULT_CONTEXT_MAX_ENTITIES))
+        current_context_token_budget: int = self.config_entry.options.get(CONF_CONTEXT_TOKEN_BUDGET, self.config_entry.data.get(CONF_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_TOKEN_BUDGET))
+        current_entities_format: str = self.config_entry.options.get(CONF_ENTITIES_FORMAT, self.config_entry.data.get(CONF_ENTITIES_FORMAT, DEFAULT_ENTITIES_FORMAT))
+        current_entities_background_refresh: bool = self.config_entry.options.get(CONF_ENTITIES_BACKGROUND_REFRESH, self.config_entry.data.get(CONF_ENTITIES_BACKGROUND_REFRESH, DEFAULT_ENTITIES_BACKGROUND_REFRESH))
+        current_cache_action_responses: bool = self.config_entry.options.get(CONF_CACHE_ACTION_RESPONSES, self.config_entry.data.get(CONF_CACHE_ACTION_RESPONSES, DEFAULT_CACHE_ACTION_RESPONSES))
+        current_rate_limit: int = self.config_entry.options.get(CONF_RATE_LIMIT, self.config_entry.data.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT))
+        current_max_concurrent_requests: int = self.config_entry.options.get(CONF_MAX_CONCURRENT_REQUESTS, self.config_entry.data.get(CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS))
+        current_queue_deadline: float = self.config_entry.options.get(CONF_QUEUE_DEADLINE, self.config_entry.data.get(CONF_QUEUE_DEADLINE, DEFAULT_QUEUE_DEADLINE))
+        current_max_retries: int = self.config_entry.options.get(CONF_MAX_RETRIES, self.config_entry.data.get(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES))
+        current_enable_hedging: bool = self.config_entry.options.get(CONF_ENABLE_HEDGING, self.config_entry.data.get(CONF_ENABLE_HEDGING, DEFAULT_ENABLE_HEDGING))
+        current_enable_model_fallback: bool = self.config_entry.options.get(CONF_ENABLE_MODEL_FALLBACK, self.config_entry.data.get(CONF_ENABLE_MODEL_FALLBACK, DEFAULT_ENABLE_MODEL_FALLBACK))
+        current_prompt_layout: str = self.config_entry.options.get(CONF_PROMPT_LAYOUT, self.config_entry.data.get(CONF_PROMPT_LAYOUT, DEFAULT_PROMPT_LAYOUT))
+
+        # Define the options schema with current values as defaults
+        options_schema = vol.Schema({
+            vol.Required(CONF_CONNECT_TIMEOUT, default=current_connect_timeout): NumberSelector({"min": 1, "step": 1, "mode": "box", "unit_of_measurement": "s", "max": 60}),
+            vol.Required(CONF_READ_TIMEOUT, default=current_read_timeout): NumberSelector({"min": 5, "step": 5, "mode": "box", "unit_of_measurement": "s", "max": 1800}),
+            vol.Optional(CONF_ENABLE_STREAMING, default=current_enable_streaming): BooleanSelector(),
+            vol.Optional(CONF_ENABLE_WARM_UP, default=current_enable_warm_up): BooleanSelector(),
+            vol.Optional(CONF_ENABLE_FAST_PATH, default=current_enable_fast_path): BooleanSelector(),
+            vol.Required(CONF_CACHE_TTL, default=current_cache_ttl): NumberSelector({"min": 0, "step": 60, "mode": "box", "unit_of_measurement": "s", "max": 604800}),
+            vol.Required(CONF_CACHE_MAX_ENTRIES, default=current_cache_max_entries): NumberSelector({"min": 1, "step": 1, "mode": "box", "max": 10000}),
+            vol.Optional(CONF_CACHE_ACTION_RESPONSES, default=current_cache_action_responses): BooleanSelector(),
+            vol.Required(CONF_CONTEXT_TOKEN_BUDGET, default=current_context_token_budget): NumberSelector({"min": 0, "step": 100, "mode": "box", "unit_of_measurement": "tokens", "max": 100000}),
+            vol.Required(CONF_CONTEXT_MAX_ENTITIES, default=current_context_max_entities): NumberSelector({"min": 1, "step": 1, "mode": "box", "max": 1000}),
+            vol.Required(CONF_ENTITIES_FORMAT, default=current_entities_format): SelectSelector(SelectSelectorConfig(options=ENTITIES_FORMATS, mode=SelectSelectorMode.DROPDOWN, translation_key="entities_format")),
+            vol.Optional(CONF_ENTITIES_BACKGROUND_REFRESH, default=current_entities_background_refresh): BooleanSelector(),
+            vol.Required(CONF_RATE_LIMIT, default=current_rate_limit): NumberSelector({"min": 0, "step": 1, "mode": "box", "unit_of_measurement": "requests/min", "max": 10000}),
+            vol.Required(CONF_MAX_CONCURRENT_REQUESTS, default=current_max_concurrent_requests): NumberSelector({"min": 1, "step": 1, "mode": "box", "max": DEFAULT_POOL_SIZE}),
+            vol.Required(CONF_QUEUE_DEADLINE, default=current_queue_deadline): NumberSelector({"min": 0, "step": 1, "mode": "box", "unit_of_measurement": "s", "max": 3600}),
+            vol.Required(CONF_MAX_RETRIES, default=current_max_retries): NumberSelector({"min": 0, "step": 1, "mode": "box", "max": 5}),
+            vol.Optional(CONF_ENABLE_HEDGING, default=current_enable_hedging): BooleanSelector(),
+            vol.Optional(CONF_ENABLE_MODEL_FALLBACK, default=current_enable_model_fallback): BooleanSelector(),
+            vol.Required(CONF_PROMPT_LAYOUT, default=current_prompt_layout): SelectSelector(SelectSelectorConfig(options=PROMPT_LAYOUTS, mode=SelectSelectorMode.DROPDOWN, translation_key="prompt_layout")),
+        })
+
+        return self.async_show_form(step_id="performance", data_schema=options_schema,)
+
+    async def async_step_memory(self, user_input: dict[str, any] | None = None) -> config_entries.ConfigFlowResult:
+        """Manage the options step.
+
+        Args:
+            user_input (dict | None): Dictionary containing the user input or None.
+        Returns:
+            ConfigFlowResult: Shows the form or creates the options entry.
+        """
+        if user_input is not None:
+            options = dict(self.config_entry.options)
+            options.update(user_input)
+            return self.async_create_entry(title="", data=options)
+
+        # Show the form to update options
+        current_memory_max_turns: int = self.config_entry.options.get(CONF_MEMORY_MAX_TURNS, self.config_entry.data.get(CONF_MEMORY_MAX_TURNS, DEFAULT_MEMORY_MAX_TURNS))
+        current_memory_max_age: int = self.config_entry.options.get(CONF_MEMORY_MAX_AGE, self.config_entry.data.get(CONF_MEMORY_MAX_AGE, DEFAULT_MEMORY_MAX_AGE))
+        current_memory_token_budget: int = self.config_entry.options.get(CONF_MEMORY_TOKEN_BUDGET, self.config_entry.data.get(CONF_MEMORY_TOKEN_BUDGET, DEFAULT_MEMORY_TOKEN_BUDGET))
+
+        # Define the options schema with current values as defaults
+        options_schema = vol.Schema({
+            vol.Required(CONF_MEMORY_MAX_TURNS, default=current_memory_max_turns): NumberSelector({"min": 0, "step": 1, "mode": "box", "max": 50}),
+            vol.Required(CONF_MEMORY_MAX_AGE, default=current_memory_max_age): NumberSelector({"min": 30, "step": 30, "mode": "box", "unit_of_measurement": "s", "max": 86400}),
+            vol.Required(CONF_MEMORY_TOKEN_BUDGET, default=current_memory_token_budget): NumberSelector({"min": 100, "step": 100, "mode": "box", "unit_of_measurement": "tokens", "max": 20000}),
+        })
+
+        return self.async_show_form(step_id="memory", data_schema=options_schema,)
+
+    async def async_step_budget(self, user_input: dict[str, any] | None = None) -> config_entries.ConfigFlowResult:
+        """Manage the options step.
+
+        Args:
+            user_input (dict | None): Dictionary containing the user input or None.
+        Returns:
+            ConfigFlowResult: Shows the form or creates the options entry.
+        """
+        if user_input is not None:
+            options = dict(self.config_entry.options)
+            options.update(user_input)
+            return self.async_create_entry(title="", data=options)
+
+        # Show the form to update options
+        current_daily_budget: float = self.config_entry.options.get(CONF_DAILY_BUDGET, self.config_entry.data.get(CONF_DAILY_BUDGET, DEFAULT_DAILY_BUDGET))
+        current_monthly_budget: float = self.config_entry.options.get(CONF_MONTHLY_BUDGET, self.config_entry.data.get(CONF_MONTHLY_BUDGET, DEFAULT_MONTHLY_BUDGET))
+        current_budget_downgrade_threshold: int = self.config_entry.options.get(CONF_BUDGET_DOWNGRADE_THRESHOLD, self.config_entry.data.get(CONF_BUDGET_DOWNGRADE_THRESHOLD, DEFAULT_BUDGET_DOWNGRADE_THRESHOLD))
+        current_budget_max_tokens: int = self.config_entry.options.get(CONF_BUDGET_MAX_TOKENS, self.config_entry.data.get(CONF_BUDGET_MAX_TOKENS, DEFAULT_BUDGET_MAX_TOKENS))
+
+        # Define the options schema with current values as defaults
+        options_schema = vol.Schema({
+            vol.Required(CONF_DAILY_BUDGET, default=current_daily_budget): NumberSelector({"min": 0, "step": 0.01, "mode": "box", "unit_of_measurement": "$", "max": 10000}),
+            vol.Required(CONF_MONTHLY_BUDGET, default=current_monthly_budget): NumberSelector({"min": 0, "step": 0.01, "mode": "box", "unit_of_measurement": "$", "max": 100000}),
+            vol.Required(CONF_BUDGET_DOWNGRADE_THRESHOLD, default=current_budget_downgrade_threshold): NumberSelector({"min": 0, "step": 5, "mode": "slider", "unit_of_measurement": "%", "max": 100}),
+            vol.Required(CONF_BUDGET_MAX_TOKENS, default=current_budget_max_tokens): NumberSelector({"min": 50, "step": 50, "mode": "box", "unit_of_measurement": "tokens", "max": 4000}),
+        })
+
+        return self.async_show_form(step_id="budget", data_schema=options_schema,)
@@ -6,6 +6,7 @@ DOMAIN: str = "perplexity_assistant"
 
 # Configuration and option keys
 CONF_API_KEY: str = "api_key"
+CONF_EXTRA_API_KEYS: str = "extra_api_keys"
 CONF_MODEL: str = "model"
 CONF_LANGUAGE: str = "language"
 CONF_CUSTOM_SYSTEM_PROMPT: str = "custom_system_prompt"
@@ -22,6 +23,34 @@ CONF_CREATIVITY: str = "creativity"
 CONF_DIVERSITY: str = "diversity"
 CONF_FREQUENCY_PENALTY: str = "frequency_penalty"
 
+CONF_CONNECT_TIMEOUT: str = "connect_timeout"
+CONF_READ_TIMEOUT: str = "read_timeout"
+CONF_ENABLE_STREAMING: str = "enable_streaming"
+CONF_ENABLE_WARM_UP: str = "enable_warm_up"
+CONF_CACHE_TTL: str = "cache_ttl"
+CONF_CACHE_MAX_ENTRIES: str = "cache_max_entries"
+CONF_CACHE_ACTION_RESPONSES: str = "cache_action_responses"
+CONF_CONTEXT_MAX_ENTITIES: str = "context_max_entities"
+CONF_CONTEXT_TOKEN_BUDGET: str = "context_token_budget"
+CONF_ENTITIES_FORMAT: str = "entities_format"
+CONF_ENTITIES_BACKGROUND_REFRESH: str = "entities_background_refresh"
+CONF_MEMORY_MAX_TURNS: str = "memory_max_turns"
+CONF_MEMORY_MAX_AGE: str = "memory_max_age"
+CONF_MEMORY_TOKEN_BUDGET: str = "memory_token_budget"
+CONF_ENABLE_FAST_PATH: str = "enable_fast_path"
+CONF_RATE_LIMIT: str = "rate_limit"
+CONF_MAX_CONCURRENT_REQUESTS: str = "max_concurrent_requests"
+CONF_QUEUE_DEADLINE: str = "queue_deadline"
+CONF_MAX_RETRIES: str = "max_retries"
+CONF_ENABLE_HEDGING: str = "enable_hedging"
+CONF_ENABLE_MODEL_FALLBACK: str = "enable_model_fallback"
+CONF_PROMPT_LAYOUT: str = "prompt_layout"
+CONF_ENABLE_MODEL_ROUTER: str = "enable_model_router"
+CONF_DAILY_BUDGET: str = "daily_budget"
+CONF_MONTHLY_BUDGET: str = "monthly_budget"
+CONF_BUDGET_DOWNGRADE_THRESHOLD: str = "budget_downgrade_threshold"
+CONF_BUDGET_MAX_TOKENS: str = "budget_max_tokens"
+
 # Perplexity API endpoint
 BASE_URL: str = "https://api.perplexity.ai/chat/completions"
 
@@ -33,6 +62,26 @@ SUPPORTED_MODELS: list[dict] = [
     {"value": "sonar-reasoning-pro", "label": "Sonar Reasoning Pro"},
     {"value": "sonar-deep-research", "label": "Sonar Deep Research"}
 ]
+MODEL_FALLBACKS: dict[str, str] = {             # Cheaper model used while a model is unavailable
+    "sonar-pro": "sonar",
+    "sonar-reasoning": "sonar",
+    "sonar-reasoning-pro": "sonar-reasoning",
+    "sonar-deep-research": "sonar-pro",
+}
+MODEL_PRICING: dict[str, dict[str, float]] = {  # in $ per request, input token and output token, used to estimate the cost before sending
+    "sonar": {"request": 0.005, "input": 0.000001, "output": 0.000001},
+    "sonar-pro": {"request": 0.006, "input": 0.000003, "output": 0.000015},
+    "sonar-reasoning": {"request": 0.005, "input": 0.000001, "output": 0.000005},
+    "sonar-reasoning-pro": {"request": 0.006, "input": 0.000002, "output": 0.000008},
+    "sonar-deep-research": {"request": 0.5, "input": 0.000002, "output": 0.000008},  # Searches and reasoning tokens come on top, about $0.5 in total
+}
+PROMPT_LAYOUT_STABLE_FIRST: str = "stable_first"   # Most stable content first, so consecutive requests share a long identical prefix
+PROMPT_LAYOUT_CLASSIC: str = "classic"             # Date and full entities summary in a single message, before the user messages
+PROMPT_LAYOUTS: list[str] = [PROMPT_LAYOUT_STABLE_FIRST, PROMPT_LAYOUT_CLASSIC]
+ENTITIES_FORMAT_GROUPED: str = "grouped"    # Per room and domain, object IDs with their state, unavailable entities counted
+ENTITIES_FORMAT_TERSE: str = "terse"        # Grouped, with the common prefix of the object IDs of each group factored out
+ENTITIES_FORMAT_LINES: str = "lines"        # One line per entity with its full ID, state and room
+ENTITIES_FORMATS: list[str] = [ENTITIES_FORMAT_LINES, ENTITIES_FORMAT_GROUPED, ENTITIES_FORMAT_TERSE]
 SUPPORTED_LANGUAGES: list[dict] = [
     {"value": "en", "label": "English"},
     {"value": "fr", "label": "Français"},
@@ -62,6 +111,63 @@ DEFAULT_CREATIVITY: float = 0.9             # Control creativity         0.1=mor
 DEFAULT_DIVERSITY: float = 0.95             # Control diversity          0.1=more focused, 0.9=more diverse
 DEFAULT_FREQUENCY_PENALTY: float = 0.5      # Reduce repetition          0.0=none, 1.0=full
 
+DEFAULT_CONNECT_TIMEOUT: float = 10         # in seconds, includes the TLS handshake
+DEFAULT_READ_TIMEOUT: float = 300           # in seconds between two reads (deep research can be slow)
+DEFAULT_POOL_SIZE: int = 10                 # Simultaneous connections to the API per config entry
+KEEPALIVE_TIMEOUT: float = 120              # in seconds an idle pooled connection is kept open
+DNS_CACHE_TTL: int = 300                    # in seconds
+DEFAULT_ENABLE_STREAMING: bool = False      # Stream voice responses sentence by sentence
+DEFAULT_ENABLE_WARM_UP: bool = True         # Prepare the connection and the entities context while the user speaks
+WARM_CONNECTION_AGE: float = 30             # in seconds, a connection used more recently is assumed still open (the API may close idle ones sooner)
+DEFAULT_CACHE_TTL: int = 0                  # in seconds, 0 disables the response cache
+DEFAULT_CACHE_MAX_ENTRIES: int = 200        # Least recently used responses are evicted beyond this
+DEFAULT_CACHE_ACTION_RESPONSES: bool = False # Responses containing actions always reach the API unless enabled
+DEFAULT_CONTEXT_MAX_ENTITIES: int = 50      # Entities listed in full when the summary exceeds the token budget
+DEFAULT_CONTEXT_TOKEN_BUDGET: int = 0       # in tokens (approx.), 0 always sends the full entities summary
+DEFAULT_ENTITIES_FORMAT: str = ENTITIES_FORMAT_LINES   # Compact formats are opt-in, they leave out diagnostic entities
+DEFAULT_ENTITIES_BACKGROUND_REFRESH: bool = True # Serve the previous entities summary while it is re-encoded off the event loop
+DEFAULT_MEMORY_MAX_TURNS: int = 6          # Turns kept verbatim per conversation, 0 disables the conversation memory
+DEFAULT_MEMORY_MAX_AGE: int = 600           # in seconds of inactivity before a conversation is forgotten
+DEFAULT_MEMORY_TOKEN_BUDGET: int = 1500     # in tokens (approx.), older turns are compacted beyond this
+MEMORY_MAX_CONVERSATIONS: int = 50          # Least recently used conversations are forgotten beyond this
+DEFAULT_ENABLE_FAST_PATH: bool = True       # Execute simple device commands locally (requires actions on entities)
+MAX_PARALLEL_ACTIONS: int = 8               # Service calls running at the same time, across all responses
+ACTION_TIMEOUT: float = 30                  # in seconds, after which an action is reported as failed
+DEFAULT_RATE_LIMIT: int = 50                # in requests per minute, 0 disables the rate limit
+RATE_LIMIT_BURST: int = 5                   # Requests that may start at once after an idle period
+KEY_RATE_LIMIT_EJECTION: float = 60         # in seconds (at least) an API key answered with 429 is left out of the pool
+KEY_AUTH_EJECTION: float = 900              # in seconds an API key answered with 401 or 403 is left out of the pool
+DEFAULT_MAX_CONCURRENT_REQUESTS: int = 4    # Requests to the API running at the same time (deep research excluded)
+DEEP_RESEARCH_MAX_CONCURRENT: int = 1       # Deep research requests running at the same time
+DEFAULT_QUEUE_DEADLINE: int = 0             # in seconds a request may wait for a slot, 0 waits indefinitely
+DEFAULT_BATCH_CONCURRENCY: int = 4         # Requests of an ask_batch call running at the same time
+DEFAULT_MAX_RETRIES: int = 2                # Retries of a request failing with a rate limit, server or network error
+DEFAULT_ENABLE_HEDGING: bool = False        # Send a second request when a voice request is slower than usual
+DEFAULT_ENABLE_MODEL_FALLBACK: bool = True  # Use a cheaper model while the configured one is unavailable
+DEFAULT_PROMPT_LAYOUT: str = PROMPT_LAYOUT_CLASSIC   # The stable-first layout is opt-in, it changes the prompt of existing entries
+DEFAULT_ENABLE_MODEL_ROUTER: bool = False  # Route each prompt to the fastest adequate model, up to the configured one
+ROUTER_RECENT: int = 50                     # Routing decisions and outcomes kept for the diagnostics
+DEFAULT_DAILY_BUDGET: float = 0             # in $, 0 disables the daily spending limit
+DEFAULT_MONTHLY_BUDGET: float = 0           # in $, 0 disables the monthly spending limit
+DEFAULT_BUDGET_DOWNGRADE_THRESHOLD: int = 80 # in % of a budget, from which requests go to cheaper models
+DEFAULT_BUDGET_MAX_TOKENS: int = 200        # Response length of the requests downgraded by the budget
+BUDGET_EXCEEDED_MESSAGE: str = "The Perplexity spending limit has been reached, the request was not sent."
+RETRY_BASE_DELAY: float = 0.5               # in seconds, doubled on each retry (with jitter)
+RETRY_MAX_DELAY: float = 10                 # in seconds, longer Retry-After delays give up instead of waiting
+BREAKER_FAILURE_THRESHOLD: int = 5          # Consecutive failures before the requests to a model fail fast
+BREAKER_RECOVERY_TIME: float = 60           # in seconds before a trial request is sent to a failing model
+LATENCY_WINDOW: int = 100                   # Recent latencies used to compute the hedging threshold (p95)
+HEDGE_MIN_SAMPLES: int = 20                 # Latencies needed before requests are hedged
+CACHE_STORAGE_VERSION: int = 1
+CACHE_SAVE_DELAY: int = 30                  # in seconds, writes to disk are batched
+STATS_REFRESH_INTERVAL: int = 60            # in seconds, refresh rate of the statistics sensors
+TRACE_WINDOW: int = 200                     # Recent requests the latency and token percentiles are computed on
+TRACE_RECENT: int = 10                      # Traces of the last requests kept in full for the diagnostics
+USAGE_STORAGE_VERSION: int = 1
+USAGE_SAVE_DELAY: int = 60                  # in seconds, writes of the usage ledger are batched
+USAGE_DAYS_KEPT: int = 90                   # Days of daily usage kept (monthly and per model/user totals are kept forever)
+USAGE_REPORT_DAYS: int = 30                 # Days of daily usage returned by default by the get_usage service
+
 # System prompt template for the AI assistant
 SYSTEM_PROMPT: str = f"""
     You are an assistant integrated with Home Assistant, a smart home automation platform.
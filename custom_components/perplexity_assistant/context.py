@@ -0,0 +1,137 @@
+"""Relevance scoring of Home Assistant entities against a user prompt."""
+import heapq
+import math
+import re
+
+from collections import defaultdict
+
+
+TOKEN_PATTERN: re.Pattern = re.compile(r"[^\W_]+")
+STOPWORDS: frozenset[str] = frozenset({
+    "a", "an", "and", "are", "at", "be", "can", "do", "does", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "please", "set", "the", "to", "turn", "what", "which", "with", "you",
+})
+FIELD_WEIGHTS: dict[str, float] = {
+    "name": 1.0,        # Friendly name
+    "object_id": 1.0,   # Part of the entity ID after the domain
+    "area": 0.8,
+    "domain": 0.6,
+}
+CHARS_PER_TOKEN: int = 4
+
+
+def normalize_token(token: str) -> str:
+    """Reduce a token to a crude singular form, so "lights" matches "light".
+
+    Args:
+        token (str): Lower-cased token.
+    Returns:
+        str: Normalized token.
+    """
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into normalized tokens, dropping stopwords.
+
+    Args:
+        text (str): Text to split (prompt, entity ID, name...).
+    Returns:
+        list[str]: Normalized tokens, in order.
+    """
+    return [normalize_token(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def normalize_name(text: str) -> str:
+    """Normalize a name (entity, area, spoken target) for exact comparisons.
+
+    Args:
+        text (str): Name to normalize.
+    Returns:
+        str: Lower-cased words separated by single spaces, without punctuation.
+    """
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens of a text (about 4 characters per token).
+
+    Args:
+        text (str): Text to measure.
+    Returns:
+        int: Estimated token count.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class EntityTokenIndex:
+    """Inverted index from tokens to the entities whose ID, name, area or domain contain them."""
+
+    def __init__(self) -> None:
+        """Initialize the index."""
+        self._postings: dict[str, dict[str, float]] = defaultdict(dict)    # token -> {entity_id: weight}
+        self._entity_tokens: dict[str, dict[str, float]] = {}              # entity_id -> {token: weight}
+
+    def __len__(self) -> int:
+        """Return the number of indexed entities."""
+        return len(self._entity_tokens)
+
+    def set_entity(self, entity_id: str, fields: dict[str, str]) -> None:
+        """Index (or re-index) an entity.
+
+        Args:
+            entity_id (str): Entity ID.
+            fields (dict[str, str]): Text of each field of FIELD_WEIGHTS (missing fields are ignored).
+        """
+        tokens: dict[str, float] = {}
+        for field, text in fields.items():
+            for token in tokenize(text or ""):
+                tokens[token] = max(tokens.get(token, 0.0), FIELD_WEIGHTS[field])
+
+        self.remove_entity(entity_id)
+        self._entity_tokens[entity_id] = tokens
+        for token, weight in tokens.items():
+            self._postings[token][entity_id] = weight
+
+    def remove_entity(self, entity_id: str) -> None:
+        """Remove an entity from the index.
+
+        Args:
+            entity_id (str): Entity ID.
+        """
+        for token in self._entity_tokens.pop(entity_id, {}):
+            postings = self._postings[token]
+            postings.pop(entity_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def clear(self) -> None:
+        """Remove every entity from the index."""
+        self._postings.clear()
+        self._entity_tokens.clear()
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        """Score the entities against a query.
+        Each matching token adds its field weight times its inverse document frequency,
+        so rare tokens (a name) outweigh common ones (a domain).
+
+        Args:
+            query (str): User prompt.
+            limit (int): Maximum number of entities to return.
+        Returns:
+            list[tuple[str, float]]: (entity_id, score) pairs, best first.
+        """
+        count = len(self._entity_tokens)
+        scores: dict[str, float] = defaultdict(float)
+
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + count / len(postings))
+            for entity_id, weight in postings.items():
+                scores[entity_id] += weight * idf
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
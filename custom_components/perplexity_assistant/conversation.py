@@ -1,24 +1,51 @@
 """Home Assistant conversation agent interface for Perplexity."""
-import aiohttp
+import asyncio
+import hashlib
 import json
 import logging
+import time
 
-from datetime import datetime
+from collections.abc import AsyncGenerator, Callable
+from contextlib import nullcontext
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.components.conversation import AbstractConversationAgent, ConversationInput, ConversationResult
-from homeassistant.core import ServiceCall, HomeAssistant
-from homeassistant.helpers import device_registry, entity_registry
+from homeassistant.components.conversation import AssistantContent, ChatLog, ConversationEntity, ConversationInput, ConversationResult
+from homeassistant.core import Context, ServiceCall, HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.intent import IntentResponse
 from homeassistant.const import __version__ as HA_VERSION
 from pydantic import BaseModel
 from typing import List, Optional, Any
 
+from .budget import BudgetDecision, BudgetGuard
+from .cache import ResponseCache, make_cache_key
+from .client import PerplexityClient
+from .coalesce import RequestCoalescer
 from .const import *
-from .sensor import AlltimeBillSensor, MonthlyBillSensor
+from .context import CHARS_PER_TOKEN, estimate_tokens
+from .encoding import measure
+from .executor import ActionCall, ActionExecutor
+from .fastpath import FastPathCommand, FastPathMatcher
+from .keypool import KeyPool
+from .memory import ConversationMemory
+from .repair import ResponseRepairer
+from .resilience import ResilientCaller
+from .router import ModelRouter, RouteDecision
+from .scheduler import LANE_DEEP_RESEARCH, LANE_DEFAULT, PRIORITY_AUTOMATION, PRIORITY_VOICE, QueueTimeoutError, RequestScheduler
+from .streaming import ContentStreamParser, SentenceSplitter
+from .summary import EntitiesSummaryIndex
+from .template import RequestTemplate
+from .tracing import SOURCE_CACHE, SOURCE_FAST_PATH, STAGE_ACTIONS, STAGE_ENTITIES, STAGE_PAYLOAD, STAGE_QUEUE, STAGE_USER_LOOKUP, STAGE_VALIDATION, RequestTrace, RequestTracer
+from .usage import CALLER_CONVERSATION, CALLER_SERVICE, UsageLedger, usage_cost
 
 
 _LOGGER = logging.getLogger(__name__)
 
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
+    """Set up the Perplexity conversation entity from a config entry."""
+    agent = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if agent:
+        async_add_entities([PerplexityConversationEntity(entry.entry_id, agent)])
+
 
 class PerplexityAgentAction(BaseModel):
     """Represents an action suggested by the Perplexity agent."""
@@ -38,8 +65,10 @@ class PerplexityAgentResponse(BaseModel):
     actions: Optional[List[PerplexityAgentAction]]
     
 
-class PerplexityAgent(AbstractConversationAgent):
-    """Home Assistant conversation agent based on the Perplexity API."""
+class PerplexityAgent:
+    """Home Assistant conversation agent based on the Perplexity API.
+    Answers the conversation entity of the config entry and its services.
+    """
     RESPONSE_FORMAT: dict = {
             "type": "json_schema",
             "json_schema": {
@@ -47,20 +76,134 @@ class PerplexityAgent(AbstractConversationAgent):
             }
         }
 
-    def __init__(self, hass: HomeAssistant, config_entry_id: str) -> None:
+    def __init__(self, hass: HomeAssistant, config_entry_id: str, client: PerplexityClient) -> None:
         """Initialize the Perplexity agent.
 
         Args:
             hass (HomeAssistant): Home Assistant instance.
             config_entry_id (str): Configuration entry ID.
+            client (PerplexityClient): Pooled HTTP client of the config entry.
         """
         self.hass: HomeAssistant = hass
+        self.client: PerplexityClient = client
         self.config_entry: ConfigEntry = self.hass.config_entries.async_get_entry(config_entry_id)
         self.agent_name = self.config_entry.title
+        self.template: RequestTemplate = self._compile_template()
         
-        self._summary: str | None = None
-        self._last_summary_update: datetime | None = None
+        self._summary_index: EntitiesSummaryIndex = EntitiesSummaryIndex(hass)
+        self.cache: ResponseCache = ResponseCache(hass, config_entry_id)
+        self.memory: ConversationMemory = ConversationMemory(MEMORY_MAX_CONVERSATIONS)
+        self.fast_path: FastPathMatcher = FastPathMatcher(hass, self._summary_index)
+        self.coalescer: RequestCoalescer = RequestCoalescer()
+        self.resilience: ResilientCaller = ResilientCaller(
+            MODEL_FALLBACKS,
+            BREAKER_FAILURE_THRESHOLD,
+            BREAKER_RECOVERY_TIME,
+            RETRY_BASE_DELAY,
+            RETRY_MAX_DELAY,
+            LATENCY_WINDOW,
+            HEDGE_MIN_SAMPLES,
+        )
+        self.scheduler: RequestScheduler = RequestScheduler(
+            self._get_config(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+            RATE_LIMIT_BURST,
+            int(self._get_config(CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS)),
+            DEEP_RESEARCH_MAX_CONCURRENT,
+            self._get_config(CONF_QUEUE_DEADLINE, DEFAULT_QUEUE_DEADLINE),
+        )
+        self.executor: ActionExecutor = ActionExecutor(hass, MAX_PARALLEL_ACTIONS, ACTION_TIMEOUT)
+        self.tracer: RequestTracer = RequestTracer(TRACE_WINDOW, TRACE_RECENT)
+        self.usage: UsageLedger = UsageLedger(hass, config_entry_id)
+        self.budget: BudgetGuard = BudgetGuard(self.usage, MODEL_PRICING, MODEL_FALLBACKS)
+        self.router: ModelRouter = ModelRouter(MODEL_PRICING, ROUTER_RECENT)
+        self.keys: KeyPool = KeyPool(KEY_RATE_LIMIT_EJECTION, KEY_AUTH_EJECTION)
+        self.repairer: ResponseRepairer = ResponseRepairer(PerplexityAgentResponse)
+        self.warm_ups: int = 0
+        self.warm_up_time: float = 0.0  # in seconds, spent on the event loop by the last warm-up
+
+    async def async_setup(self) -> None:
+        """Load the persisted state of the agent (response cache, usage ledger)."""
+        await self.cache.async_load()
+        await self.usage.async_load()
+
+    async def async_unload(self) -> None:
+        """Release the resources held by the agent (event listeners, connections, caches)."""
+        self._summary_index.async_stop()
+        self.memory.clear()
+        await self.cache.async_save()
+        await self.usage.async_save()
+        await self.client.async_close()
     
+    async def async_prepare(self, language: str | None = None) -> None:
+        """Warm up the agent while the user is speaking.
+        Called by the Assist pipeline when speech-to-text starts (right after the wake word), and when the Assist dialog opens.
+
+        Args:
+            language (str | None): Language of the pipeline (the agent answers in the configured language).
+        """
+        await self.async_warm_up()
+
+    async def async_warm_up(self) -> None:
+        """Prepare the next request ahead of time: open a connection to the API and encode the entities context.
+        Only what does not depend on the prompt is prepared, so the request itself just adds the transcript and is sent.
+        """
+        if not self._get_config(CONF_ENABLE_WARM_UP, DEFAULT_ENABLE_WARM_UP):
+            return
+
+        self.warm_ups += 1
+        preconnect = self.hass.async_create_task(self.client.async_preconnect(self.template.connect_timeout), eager_start=True)
+        start = time.perf_counter()
+        try:
+            self._build_system_status(query="") # Encodes the entities context a request would use (the full one, or the compact one beyond the token budget)
+        except Exception as e:
+            _LOGGER.warning(f"Could not prepare the entities context ahead of a request: {e}")
+        self.warm_up_time = time.perf_counter() - start
+        await preconnect
+
+    @property
+    def warm_up_stats(self) -> dict:
+        """Return the number of warm-ups, the connections they opened and the time the last one took on the event loop."""
+        return {
+            "warm_ups": self.warm_ups,
+            "connections_opened": self.client.preconnects,
+            "connections_already_open": self.client.preconnect_skips,
+            "last_context_build_ms": round(self.warm_up_time * 1000, 2),
+        }
+
+    def async_update_template(self) -> None:
+        """Recompile the request template after a change of the config entry."""
+        self.agent_name = self.config_entry.title
+        self.template = self._compile_template()
+        _LOGGER.debug("Request template recompiled after a configuration change.")
+
+    def _compile_template(self) -> RequestTemplate:
+        """Compile the request template from the current configuration.
+
+        Returns:
+            RequestTemplate: The template.
+        """
+        return RequestTemplate(
+            model=self._get_config(CONF_MODEL, DEFAULT_MODEL),
+            enable_websearch=self._get_config(CONF_ENABLE_WEBSEARCH, DEFAULT_ENABLE_WEBSEARCH),
+            max_tokens=self._get_config(CONF_MAX_TOKENS, DEFAULT_MAX_TOKENS),
+            temperature=self._get_config(CONF_CREATIVITY, DEFAULT_CREATIVITY),
+            top_p=self._get_config(CONF_DIVERSITY, DEFAULT_DIVERSITY),
+            frequency_penalty=self._get_config(CONF_FREQUENCY_PENALTY, DEFAULT_FREQUENCY_PENALTY),
+            response_format=self.RESPONSE_FORMAT,
+            system_prompt=SYSTEM_PROMPT,
+            agent_name=self.agent_name,
+            ha_version=HA_VERSION,
+            language=self._get_config(CONF_LANGUAGE, 'en'),
+            enable_vocal_notifications=self._get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS),
+            allow_actions=self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES),
+            allow_entities=self._get_config(CONF_ALLOW_ENTITIES_ACCESS, DEFAULT_ALLOW_ENTITIES_ACCESS),
+            api_keys=[self._get_config(CONF_API_KEY, ''), *self._get_config(CONF_EXTRA_API_KEYS, [])],
+            connect_timeout=self._get_config(CONF_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=self._get_config(CONF_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
+            custom_prompt=self._get_config(CONF_CUSTOM_SYSTEM_PROMPT, ''),
+            layout=self._get_config(CONF_PROMPT_LAYOUT, DEFAULT_PROMPT_LAYOUT),
+        )
+
     def _get_config(self, key: str, default: Any = None) -> Any:
         """Helper to get configuration options with a default.
 
@@ -82,152 +225,548 @@ class PerplexityAgent(AbstractConversationAgent):
         """Return the list of supported languages."""
         return [lang['value'] for lang in SUPPORTED_LANGUAGES]
 
-    def _generate_entities_summary(self) -> str:
+    def _start_summary_index(self) -> None:
+        """Start the entities summary index on first use, and apply the current options to it."""
+        if not self._summary_index.started:
+            self._summary_index.async_start()
+        self._summary_index.background_refresh = self._get_config(CONF_ENTITIES_BACKGROUND_REFRESH, DEFAULT_ENTITIES_BACKGROUND_REFRESH)
+
+    def _generate_entities_summary(self, query: str | None = None) -> str:
         """Generate a summary of Home Assistant entities for context.
+        The summary is maintained incrementally from state and registry events, see EntitiesSummaryIndex.
 
+        Args:
+            query (str | None): User prompt. If given, only the entities relevant to it are listed (within the token budget).
         Returns:
             str: Summary of entities.
         """
-        if self._summary and self._last_summary_update:
-            # Regenerate summary every self.entities_summary_refresh_rate seconds
-            if (datetime.now() - self._last_summary_update).total_seconds() < self._get_config(CONF_ENTITIES_SUMMARY_REFRESH_RATE, DEFAULT_ENTITIES_SUMMARY_REFRESH_RATE):
-                return self._summary
-        
-        _LOGGER.debug("Generating entities summary for Perplexity context.")
-        
-        entities = self.hass.states.async_all() # Get all entities
-        ha_entity_registry = entity_registry.async_get(self.hass) # Get entity registry
-        ha_device_registry = device_registry.async_get(self.hass) # Get device registry
-        
-        summary = f"The Home Assistant instance has {len(entities)} entities."
-                
-        for entity in entities:
-            ha_entity = ha_entity_registry.async_get(entity.entity_id) # Get entity registry entry (to access unique_id)
-            ha_device = ha_device_registry.async_get(ha_entity.device_id) if ha_entity else None # Get device using unique_id
-            room = ha_device.area_id if ha_device and hasattr(ha_device, "area_id") else None # Get area_id safely
-                
-            summary += f"\n- {entity.entity_id}: {entity.state} (in room: {room})"
-        
-        self._summary = summary
-        self._last_summary_update = datetime.now()
-        return summary
+        self._start_summary_index()
+
+        refresh_rate = self._get_config(CONF_ENTITIES_SUMMARY_REFRESH_RATE, DEFAULT_ENTITIES_SUMMARY_REFRESH_RATE)
+        token_budget = int(self._get_config(CONF_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_TOKEN_BUDGET))
+        entity_format = self._get_config(CONF_ENTITIES_FORMAT, DEFAULT_ENTITIES_FORMAT)
+        if query is None or not token_budget:
+            return self._summary_index.get_summary(refresh_rate, entity_format)
+
+        return self._summary_index.get_relevant_summary(
+            query,
+            int(self._get_config(CONF_CONTEXT_MAX_ENTITIES, DEFAULT_CONTEXT_MAX_ENTITIES)),
+            token_budget,
+            refresh_rate,
+            entity_format,
+        )
+
+    def _generate_entities_context(self, query: str | None = None) -> tuple[str, str]:
+        """Generate the entities context of the stable first layout: the inventory (entities and rooms) and their states.
+        When the full summary exceeds the token budget, the inventory only counts the entities per room
+        and the states are limited to the entities relevant to the prompt.
+
+        Args:
+            query (str | None): User prompt, used to select the relevant entities.
+        Returns:
+            tuple[str, str]: The inventory and the states.
+        """
+        self._start_summary_index()
+
+        refresh_rate = self._get_config(CONF_ENTITIES_SUMMARY_REFRESH_RATE, DEFAULT_ENTITIES_SUMMARY_REFRESH_RATE)
+        token_budget = int(self._get_config(CONF_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_TOKEN_BUDGET))
+        entity_format = self._get_config(CONF_ENTITIES_FORMAT, DEFAULT_ENTITIES_FORMAT)
+        if query is None or not token_budget or self._summary_index.fits(token_budget, entity_format, refresh_rate, parts=True):
+            return self._summary_index.get_inventory(entity_format=entity_format), self._summary_index.get_states(refresh_rate, entity_format)
+
+        inventory = self._summary_index.get_inventory(compact=True)
+        states = self._summary_index.get_relevant_states(
+            query,
+            int(self._get_config(CONF_CONTEXT_MAX_ENTITIES, DEFAULT_CONTEXT_MAX_ENTITIES)),
+            max(token_budget - estimate_tokens(inventory), token_budget // 2),
+        )
+        return inventory, states
+
+
+    @property
+    def entities_context_stats(self) -> dict:
+        """Return the encoding of the entities context, the number of entities left out and the size of the full summary."""
+        if not self._summary_index.started:
+            return {}
+        entity_format = self._get_config(CONF_ENTITIES_FORMAT, DEFAULT_ENTITIES_FORMAT)
+        summary = self._summary_index.get_summary(self._get_config(CONF_ENTITIES_SUMMARY_REFRESH_RATE, DEFAULT_ENTITIES_SUMMARY_REFRESH_RATE), entity_format)
+        return {"format": entity_format, **self._summary_index.stats, **measure(summary)}
+
+    def _get_cache_key(self, user_messages: list[dict], username: str = "UNKNOWN", override_model: str | None = None, force_websearch_access: bool = False) -> str | None:
+        """Compute the response cache key of a request.
+
+        Args:
+            user_messages (list[dict]): The user messages.
+            username (str): The name of the user making the request.
+            override_model (str | None): Model to use instead of the configured one.
+            force_websearch_access (bool): Whether to force web search access.
+        Returns:
+            str | None: The cache key, or None if the cache is disabled.
+        """
+        if not self._get_config(CONF_CACHE_TTL, DEFAULT_CACHE_TTL):
+            return None
+        return self._get_request_key(user_messages, username, override_model, force_websearch_access)
+
+
+    def _get_request_key(self, user_messages: list[dict], username: str = "UNKNOWN", override_model: str | None = None, force_websearch_access: bool = False, fingerprint: str | None = None) -> str:
+        """Compute the identity of a request: two requests with the same key get the same answer.
+        The key covers the normalized prompts, the model, the websearch flag and a fingerprint
+        of the context the answer depends on.
+
+        Args:
+            user_messages (list[dict]): The user messages.
+            username (str): The name of the user making the request.
+            override_model (str | None): Model to use instead of the configured one.
+            force_websearch_access (bool): Whether to force web search access.
+            fingerprint (str | None): Context fingerprint from _get_context_fingerprint (computed if None).
+        Returns:
+            str: The request key.
+        """
+        return make_cache_key(
+            [message["content"] for message in user_messages],
+            override_model if override_model else self._get_config(CONF_MODEL, DEFAULT_MODEL),
+            bool(self._get_config(CONF_ENABLE_WEBSEARCH, DEFAULT_ENABLE_WEBSEARCH) or force_websearch_access),
+            fingerprint or self._get_context_fingerprint(username),
+        )
+
+
+    def _get_context_fingerprint(self, username: str = "UNKNOWN") -> str:
+        """Compute a fingerprint of the context an answer depends on (entities, user, language, authorizations, custom prompt).
+        The entities are identified by the revision of the summary index, so no summary is built.
+
+        Args:
+            username (str): The name of the user making the request.
+        Returns:
+            str: Hex digest of the context.
+        """
+        entities: str = ""
+        if self._get_config(CONF_ALLOW_ENTITIES_ACCESS, DEFAULT_ALLOW_ENTITIES_ACCESS):
+            self._start_summary_index()
+            entities = ":".join((
+                self._summary_index.fingerprint(self._get_config(CONF_ENTITIES_SUMMARY_REFRESH_RATE, DEFAULT_ENTITIES_SUMMARY_REFRESH_RATE)),
+                str(self._get_config(CONF_ENTITIES_FORMAT, DEFAULT_ENTITIES_FORMAT)),
+                str(self._get_config(CONF_CONTEXT_TOKEN_BUDGET, DEFAULT_CONTEXT_TOKEN_BUDGET)),
+                str(self._get_config(CONF_CONTEXT_MAX_ENTITIES, DEFAULT_CONTEXT_MAX_ENTITIES)),
+            ))
+        return hashlib.sha256(
+            "|".join((
+                entities,
+                username,
+                str(self._get_config(CONF_LANGUAGE, DEFAULT_LANGUAGE)),
+                str(self._get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS)),
+                str(self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES)),
+                str(self._get_config(CONF_CUSTOM_SYSTEM_PROMPT, '')),
+            )).encode("utf-8")
+        ).hexdigest()
+
+
+    def _cache_response(self, cache_key: str | None, data: dict, processed_response: dict) -> None:
+        """Store a successful response in the cache.
+        Responses containing actions are only cached if enabled in the options, and repaired responses (possibly incomplete) never are.
+
+        Args:
+            cache_key (str | None): Key computed by _get_cache_key (None if the cache is disabled).
+            data (dict): The raw response from the Perplexity API.
+            processed_response (dict): The response returned by _process_response.
+        """
+        if cache_key is None or processed_response.get("error") or processed_response.get("cached") or processed_response.get("repaired"):
+            return
+        if processed_response.get("actions") and not self._get_config(CONF_CACHE_ACTION_RESPONSES, DEFAULT_CACHE_ACTION_RESPONSES):
+            return
+
+        self.cache.put(
+            cache_key,
+            data,
+            ttl=self._get_config(CONF_CACHE_TTL, DEFAULT_CACHE_TTL),
+            max_entries=self._get_config(CONF_CACHE_MAX_ENTRIES, DEFAULT_CACHE_MAX_ENTRIES),
+        )
+
+
+    def _build_system_status(self, username: str = "UNKNOWN", query: str | None = None) -> list[dict]:
+        """Build the SYSTEM_STATUS messages: date, entities, authorizations, user (in the order of the prompt layout).
+
+        Args:
+            username (str): The name of the user making the request.
+            query (str | None): Raw user prompt, used to select the relevant entities.
+        Returns:
+            list[dict]: The messages.
+        """
+        template = self.template
+        if not template.allow_entities:
+            return template.system_status("Access not allowed.", username)
+        if template.layout == PROMPT_LAYOUT_STABLE_FIRST:
+            inventory, states = self._generate_entities_context(query)
+            return template.system_status(inventory, username, states)
+        return template.system_status(self._generate_entities_summary(query), username)
+
+
+    def _build_payload(self, user_messages: list[dict], username: str = "UNKNOWN", override_model: str | None = None, force_websearch_access: bool = False, query: str | None = None, system_status: list[dict] | None = None, trace: RequestTrace | None = None) -> dict:
+        """Build the dynamic fields of a request to the Perplexity API (the static ones come from the request template).
+
+        Args:
+            user_messages (list[dict]): The user messages.
+            username (str): The name of the user making the request.
+            override_model (str | None): Model to use instead of the configured one.
+            force_websearch_access (bool): Whether to force web search access.
+            query (str | None): Raw user prompt, used to select the relevant entities.
+            system_status (list[dict] | None): Prebuilt SYSTEM_STATUS messages, shared by several requests (built if None).
+            trace (RequestTrace | None): Trace of the request.
+        Returns:
+            dict: The request payload.
+        """
+        trace = trace or RequestTrace("internal")
+        if system_status is None:
+            with trace.stage(STAGE_ENTITIES):
+                system_status = self._build_system_status(username, query)
+        with trace.stage(STAGE_PAYLOAD):
+            return self.template.payload(user_messages, system_status, override_model, force_websearch_access)
+
+
+    def _route(self, payload: dict, query: str | None, force_websearch_access: bool = False) -> tuple[dict, RouteDecision | None]:
+        """Route a request to the fastest adequate model, if enabled in the options.
+
+        Args:
+            payload (dict): The request payload, with the configured model.
+            query (str | None): Raw user prompt, classified by the router (not routed if None).
+            force_websearch_access (bool): Whether web search was forced for the request (kept on).
+        Returns:
+            tuple[dict, RouteDecision | None]: The payload with the chosen model and web search setting, and the decision (None if not routed).
+        """
+        if not query or not self._get_config(CONF_ENABLE_MODEL_ROUTER, DEFAULT_ENABLE_MODEL_ROUTER):
+            return payload, None
+        route = self.router.route(query, payload["model"], not payload["disable_search"])
+        return {**payload, "model": route.model, "disable_search": not (route.search or force_websearch_access)}, route
+
+
+    def _record_route(self, route: RouteDecision | None, data: dict, payload: dict, latency: float) -> None:
+        """Report the outcome of a routed request to the router.
+
+        Args:
+            route (RouteDecision | None): The decision of _route (nothing is reported if None).
+            data (dict): The response.
+            payload (dict): The request payload.
+            latency (float): Duration of the request in seconds, without the wait in the queue.
+        """
+        if route:
+            self.router.record(route, data.get("model") or payload["model"], latency, usage_cost(data.get("usage")), data.get("error"))
+
+
+    def _check_budget(self, payload: dict) -> BudgetDecision:
+        """Check a request against the spending limits of the options (the estimate is reserved until released).
+
+        Args:
+            payload (dict): The request payload.
+        Returns:
+            BudgetDecision: The model and response length to use, or blocked.
+        """
+        prompt_tokens = estimate_tokens(" ".join(message["content"] for message in payload["messages"])) + self.template.prefix_length // CHARS_PER_TOKEN
+        return self.budget.check(
+            payload["model"],
+            prompt_tokens,
+            payload["max_tokens"],
+            self._get_config(CONF_DAILY_BUDGET, DEFAULT_DAILY_BUDGET),
+            self._get_config(CONF_MONTHLY_BUDGET, DEFAULT_MONTHLY_BUDGET),
+            self._get_config(CONF_BUDGET_DOWNGRADE_THRESHOLD, DEFAULT_BUDGET_DOWNGRADE_THRESHOLD),
+            int(self._get_config(CONF_BUDGET_MAX_TOKENS, DEFAULT_BUDGET_MAX_TOKENS)),
+        )
 
 
-    async def _async_send_request(self, user_messages: list[dict], username: str = "UNKNOWN", override_model: str | None = None, force_websearch_access: bool = False) -> dict:
-        """Send a request to the Perplexity API.
+    def _request_slot(self, payload: dict, priority: int):
+        """Return the scheduler slot to hold while a request is sent, with the current options applied.
+        The rate limit applies to each API key, so the scheduler allows it once per key of the pool that is not left out.
 
         Args:
-            messages (list[dict]): The request payload.
+            payload (dict): The request body (deep research requests have their own lane).
+            priority (int): PRIORITY_VOICE or PRIORITY_AUTOMATION.
+        Returns:
+            An async context manager, raising QueueTimeoutError if the queue deadline passes.
+        """
+        rate_limit = self._get_config(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT)
+        self.keys.configure(self.template.api_keys, rate_limit, RATE_LIMIT_BURST)
+        self.scheduler.configure(
+            rate_limit * max(1, self.keys.available),
+            RATE_LIMIT_BURST,
+            int(self._get_config(CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS)),
+            self._get_config(CONF_QUEUE_DEADLINE, DEFAULT_QUEUE_DEADLINE),
+        )
+        lane = LANE_DEEP_RESEARCH if payload.get("model") == "sonar-deep-research" else LANE_DEFAULT
+        return self.scheduler.async_slot(priority, lane)
+
+
+    async def _async_send_request(self, user_messages: list[dict], username: str = "UNKNOWN", override_model: str | None = None, force_websearch_access: bool = False, query: str | None = None, priority: int = PRIORITY_AUTOMATION, hedge: bool = False, system_status: list[dict] | None = None, trace: RequestTrace | None = None, route_query: str | None = None) -> dict:
+        """Send a request to the Perplexity API, once the budget and the scheduler allow it.
+        Without an override, the router may send the request to a faster model (if enabled).
+        Near a spending limit the request goes to a cheaper model with a shorter response, past it the request is refused.
+        Transient failures are retried, and the circuit breaker may redirect the request to a fallback model.
+
+        Args:
+            user_messages (list[dict]): The user messages.
             username (str): The name of the user making the request.
-            force_web_search_access (bool): Whether to force web search access.
+            override_model (str | None): Model to use instead of the configured one.
+            force_websearch_access (bool): Whether to force web search access.
+            query (str | None): Raw user prompt, used to select the relevant entities.
+            priority (int): Scheduling priority (PRIORITY_VOICE or PRIORITY_AUTOMATION).
+            hedge (bool): Whether a slow request may be sent a second time (if enabled in the options).
+            system_status (list[dict] | None): Prebuilt SYSTEM_STATUS messages (built if None).
+            trace (RequestTrace | None): Trace of the request.
+            route_query (str | None): Raw user prompt, classified by the router (query if None).
         Returns:
             dict: The response from the Perplexity API.
         """
-        headers = {
-            "Authorization": f"Bearer {self._get_config('api_key', '')}",
-            "Content-Type": "application/json",
-            "User-Agent": f"HomeAssistant/{HA_VERSION}"
-        }
-        
-        entities_summary: str = "Access not allowed." if not self._get_config(CONF_ALLOW_ENTITIES_ACCESS, DEFAULT_ALLOW_ENTITIES_ACCESS) else self._generate_entities_summary()
-        
-        SYSTEM_STATUS = f"""
-            DATE & TIME: {datetime.now()}
-            HOME ASSISTANT VERSION: {HA_VERSION}
-            ENTITIES: {entities_summary}
-            YOUR NAME IS {self.agent_name}
-            AUTHORIZATIONS
-                - enable_vocal_notifications={self._get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, DEFAULT_ENABLE_RESPONSE_ON_SPEAKERS)}
-                - enable_actions_on_entities={self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES)}
-            USER NAME: {username}
-            USER LANGUAGE: {self._get_config(CONF_LANGUAGE, 'en')}
-            """
-        
-        messages = [ {"role": "system", "content": SYSTEM_PROMPT}, {"role": "system", "content": SYSTEM_STATUS} ]
-        messages.extend(user_messages)
-        
-        payload = {
-            "model": override_model if override_model else self._get_config(CONF_MODEL, DEFAULT_MODEL),
-            "messages": messages,
-            "stream": False,
-            "max_tokens": self._get_config(CONF_MAX_TOKENS, DEFAULT_MAX_TOKENS),
-            "temperature": self._get_config(CONF_CREATIVITY, DEFAULT_CREATIVITY),
-            "top_p": self._get_config(CONF_DIVERSITY, DEFAULT_DIVERSITY),
-            "frequency_penalty": self._get_config(CONF_FREQUENCY_PENALTY, DEFAULT_FREQUENCY_PENALTY),
-            "response_format": self.RESPONSE_FORMAT,
-            "disable_search": not self._get_config(CONF_ENABLE_WEBSEARCH, DEFAULT_ENABLE_WEBSEARCH) and not force_websearch_access
-        }
-        
+        template = self.template
+        trace = trace or RequestTrace("internal")
+        payload = self._build_payload(user_messages, username, override_model, force_websearch_access, query, system_status, trace)
+        payload, route = self._route(payload, route_query or query, force_websearch_access) if override_model is None else (payload, None)
+        decision = self._check_budget(payload)
+        if decision.blocked:
+            return {"error": decision.reason, "message": BUDGET_EXCEEDED_MESSAGE}
+        payload = {**payload, "model": decision.model, "max_tokens": decision.max_tokens}
+
+        async def send(payload: dict) -> dict:
+            queued = time.perf_counter()
+            async with self._request_slot(payload, priority):
+                trace.add(STAGE_QUEUE, time.perf_counter() - queued)
+                while True:
+                    key = self.keys.acquire()
+                    _LOGGER.debug(f"Sending Perplexity API request (model={payload.get('model')}, {len(payload.get('messages', []))} messages, key {key.key_id}).")
+                    data = None
+                    try:
+                        data = await self.client.async_post(
+                            payload,
+                            key.key,
+                            connect_timeout=template.connect_timeout,
+                            read_timeout=template.read_timeout,
+                            template=template,
+                            trace=trace,
+                        )
+                    finally:
+                        switch_key = self.keys.release(key, data)
+                    if not switch_key: # Rejected keys are left out, so another key is tried at most once per key
+                        return data
+
+        start, queued = time.perf_counter(), trace.stages.get(STAGE_QUEUE, 0.0)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(BASE_URL, json=payload, headers=headers) as resp:
-                    _LOGGER.debug(f"Perplexity API raw request sent.\nRequest Headers: {headers}\nRequest Payload: {payload}")
-                    
-                    if resp.status != 200:
-                        _LOGGER.error(f"Perplexity API error: status {resp.status}. Error response: {await resp.text()}")
-                        return {"error": f"Status code: {resp.status}"}
-                    
-                    data: dict = await resp.json()
-                    _LOGGER.debug(f"Perplexity API raw response received: {data}")
-                    return data
-        except Exception as e:
-            _LOGGER.error("Exception while communicating with Perplexity API: %s", e)
-            return {"error": str(e)}
+            data = await self.resilience.async_call(
+                send,
+                payload,
+                max_retries=int(self._get_config(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES)),
+                hedge=hedge and self._get_config(CONF_ENABLE_HEDGING, DEFAULT_ENABLE_HEDGING),
+                fallback=self._get_config(CONF_ENABLE_MODEL_FALLBACK, DEFAULT_ENABLE_MODEL_FALLBACK),
+            )
+        except QueueTimeoutError as e:
+            _LOGGER.warning(f"Perplexity API request rejected: {e}")
+            data = {"error": str(e)}
+        finally:
+            self.budget.release(decision)
+        self._record_route(route, data, payload, time.perf_counter() - start - (trace.stages.get(STAGE_QUEUE, 0.0) - queued))
+        return data
+
+
+    async def _async_send_streaming_request(self, user_messages: list[dict], username: str = "UNKNOWN", on_sentence: Callable[[str], None] | None = None, query: str | None = None, trace: RequestTrace | None = None, route_query: str | None = None) -> dict:
+        """Send a streaming request to the Perplexity API.
+        Sentences of the response content are passed to on_sentence as soon as they are complete.
+        Streamed requests come from conversations, so they are scheduled with the voice priority.
+        The router and the budget apply as for _async_send_request.
+        Failures are retried as long as no sentence has been passed to on_sentence.
+
+        Args:
+            user_messages (list[dict]): The user messages.
+            username (str): The name of the user making the request.
+            on_sentence (Callable[[str], None] | None): Called with each complete sentence.
+            query (str | None): Raw user prompt, used to select the relevant entities.
+            trace (RequestTrace | None): Trace of the request.
+            route_query (str | None): Raw user prompt, classified by the router (query if None).
+        Returns:
+            dict: The response, reassembled in the same shape as a non-streamed one.
+        """
+        template = self.template
+        trace = trace or RequestTrace("internal")
+        payload = self._build_payload(user_messages, username, query=query, trace=trace)
+        payload, route = self._route(payload, route_query or query)
+        decision = self._check_budget(payload)
+        if decision.blocked:
+            return {"error": decision.reason, "message": BUDGET_EXCEEDED_MESSAGE}
+        payload = {**payload, "model": decision.model, "max_tokens": decision.max_tokens}
+
+        async def send(payload: dict) -> dict:
+            parser = ContentStreamParser()
+            splitter = SentenceSplitter()
+            raw_content: list[str] = []
+            last_chunk: dict = {}
+            emitted = False
+
+            queued = time.perf_counter()
+            async with self._request_slot(payload, PRIORITY_VOICE):
+                trace.add(STAGE_QUEUE, time.perf_counter() - queued)
+                error: dict | None = {}
+                while error is not None:
+                    key = self.keys.acquire()
+                    _LOGGER.debug(f"Sending Perplexity API streaming request (model={payload.get('model')}, {len(payload.get('messages', []))} messages, key {key.key_id}).")
+                    outcome, error = None, None
+                    try:
+                        async for chunk in self.client.async_stream(
+                            payload,
+                            key.key,
+                            connect_timeout=template.connect_timeout,
+                            read_timeout=template.read_timeout,
+                            template=template,
+                            trace=trace,
+                        ):
+                            if "error" in chunk:
+                                error = {**chunk, "partial": emitted} # Sentences already spoken cannot be taken back
+                                break
+
+                            last_chunk = chunk
+                            delta: str = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content") or ""
+                            raw_content.append(delta)
+
+                            for sentence in splitter.feed(parser.feed(delta)):
+                                emitted = True
+                                on_sentence(sentence) if on_sentence else None
+                        outcome = error or last_chunk
+                    finally:
+                        switch_key = self.keys.release(key, outcome)
+                    if error is not None and (raw_content or not switch_key): # Only a request with nothing received yet is sent again
+                        return error
+
+            if (rest := splitter.flush()) and on_sentence:
+                on_sentence(rest)
+
+            data = {**last_chunk, "choices": [{"message": {"role": "assistant", "content": "".join(raw_content)}}]}
+            _LOGGER.debug(f"Perplexity API streamed response received: {data}")
+            return data
+
+        start, queued = time.perf_counter(), trace.stages.get(STAGE_QUEUE, 0.0)
+        try:
+            data = await self.resilience.async_call(
+                send,
+                payload,
+                max_retries=int(self._get_config(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES)),
+                fallback=self._get_config(CONF_ENABLE_MODEL_FALLBACK, DEFAULT_ENABLE_MODEL_FALLBACK),
+            )
+        except QueueTimeoutError as e:
+            _LOGGER.warning(f"Perplexity API request rejected: {e}")
+            data = {"error": str(e)}
+        finally:
+            self.budget.release(decision)
+        self._record_route(route, data, payload, time.perf_counter() - start - (trace.stages.get(STAGE_QUEUE, 0.0) - queued))
+        return data
+
+
+    async def _async_stream_to_chat_log(self, user_input: ConversationInput, chat_log: ChatLog, user_messages: list[dict], username: str, query: str | None = None, trace: RequestTrace | None = None) -> tuple[dict, str]:
+        """Stream the response into the chat log of the conversation, sentence by sentence.
+        The Assist pipeline listens to the chat log and, as the conversation entity supports streaming,
+        starts text-to-speech with the first sentences. The assistant message only starts with the first
+        sentence, and a request that fails ends it with the error message, so what is spoken and logged
+        always tells the user about the failure.
+
+        Args:
+            user_input (ConversationInput): The user's input.
+            chat_log (ChatLog): Chat log of the conversation.
+            user_messages (list[dict]): The user messages.
+            username (str): The name of the user making the request.
+            query (str | None): Text used to select the relevant entities (the user prompt if None).
+            trace (RequestTrace | None): Trace of the request.
+        Returns:
+            tuple[dict, str]: The reassembled response and the text written to the chat log (empty if none).
+        """
+        sentences: asyncio.Queue[str | None] = asyncio.Queue()
+        written: list[str] = []
+
+        def delta(text: str) -> dict:
+            written.append(text)
+            return {"content": " " + text} if len(written) > 1 else {"role": "assistant", "content": text}
+
+        async def deltas() -> AsyncGenerator[dict, None]:
+            while (sentence := await sentences.get()) is not None:
+                yield delta(sentence)
+            if "error" in (data := request.result()):
+                yield delta(self._error_message(data))
 
+        request = self.hass.async_create_task(self._async_send_streaming_request(user_messages, username, sentences.put_nowait, query=query or user_input.text, trace=trace, route_query=user_input.text))
+        request.add_done_callback(lambda _: sentences.put_nowait(None))
 
-    async def _execute_action(self, action: PerplexityAgentAction, response_text: str = "") -> None:
-        """Execute a given action from the Perplexity response.
+        async for _content in chat_log.async_add_delta_content_stream(user_input.agent_id or self.config_entry.entry_id, deltas()):
+            pass
+
+        return await request, " ".join(written)
+
+
+    def _prepare_action(self, action: PerplexityAgentAction, response_text: str = "") -> ActionCall:
+        """Turn an action from the Perplexity response into a service call for the action executor.
         
         Args:
             action (PerplexityAgentAction): The action to execute.
             response_text (str): The main response text from Perplexity.
+        Returns:
+            ActionCall: The service call to perform.
         """
         _LOGGER.debug(f"Executing action from Perplexity response: {action.domain}.{action.service} on {action.target} with parameters {action.parameters}")
                 
-        try:
-            if action.domain == "tts" and action.service == "speak" and self._get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, False):
-                # Special handling for TTS actions to format parameters correctly
-                tts_data = action.parameters or {}
-                tts_data = {
-                    "media_player_entity_id": tts_data.get("media_player_entity_id") or tts_data.get("entity_id") or action.target,
-                    "message": tts_data.get("message", response_text),
-                    "cache": False,
-                    "entity_id": DEFAULT_TTS
-                }
-                
-                await self.hass.services.async_call(action.domain, action.service, tts_data)
-            else:
-                params = action.parameters or {}
-                await self.hass.services.async_call(action.domain, action.service, {"entity_id": action.target, **params})
-        except Exception as e:
-            _LOGGER.warning(f"Failed to execute action {action.domain}.{action.service} on {action.target}: {e}")
+        if action.domain == "tts" and action.service == "speak" and self._get_config(CONF_ENABLE_RESPONSE_ON_SPEAKERS, False):
+            # Special handling for TTS actions to format parameters correctly
+            tts_data = action.parameters or {}
+            tts_data = {
+                "media_player_entity_id": tts_data.get("media_player_entity_id") or tts_data.get("entity_id") or action.target,
+                "message": tts_data.get("message", response_text),
+                "cache": False,
+            }
+            return ActionCall(str(action), action.domain, action.service, tts_data, [DEFAULT_TTS], batchable=False)
+
+        params = dict(action.parameters or {})
+        targets = params.pop("entity_id", None) or action.target
+        targets = [target.strip() for target in (targets.split(",") if isinstance(targets, str) else targets) if target.strip()]
+        return ActionCall(str(action), action.domain, action.service, params, targets)
+
 
+    def _record_usage(self, data: dict, username: str, caller: str) -> None:
+        """Record a response of the API in the usage ledger (it is billed even if its content turns out to be invalid).
 
-    def _process_response(self, data: dict, execute_actions: bool = True, force_actions_execution: bool = False) -> dict:
+        Args:
+            data (dict): The raw response data.
+            username (str): The name of the user making the request.
+            caller (str): CALLER_CONVERSATION or CALLER_SERVICE.
+        """
+        if "error" not in data:
+            self.usage.record(data.get("model") or self.template.model, username, caller, data.get("usage"))
+
+
+    @staticmethod
+    def _error_message(data: dict) -> str:
+        """Return the message spoken for an error returned by a request (see _async_send_request)."""
+        return data.get("message", "Error communicating with the Perplexity AI service.")
+
+
+    def _process_response(self, data: dict, execute_actions: bool = True, force_actions_execution: bool = False, cached: bool = False, context: Context | None = None, trace: RequestTrace | None = None) -> dict:
         """Process the raw response from Perplexity API.
         Executes any actions if present and authorized to do so.
+        The execution runs in the background; its task is returned under the 'execution' key
+        (to be removed by the caller, which may await it to get the aggregated results).
+        A malformed content (e.g. cut off by the max tokens) is repaired, keeping the answer and the complete actions.
 
         Args:
             data (dict): The raw response data.
             execute_actions (bool): Whether to execute actions in the response. DOES NOT OVERWRITE CONFIG SETTING.
+            cached (bool): Whether the response comes from the response cache (nothing is billed).
+            context (Context | None): Context of the request, passed to the service calls.
+            trace (RequestTrace | None): Trace of the request (validation, tokens and, once they finish, actions).
         Returns:
-            dict: Processed response with keys 'response', 'actions', 'error', and 'cost'.
+            dict: Processed response with keys 'response', 'actions', 'error', 'cost', 'cached', 'repaired' and 'execution'.
         """
         if "error" in data:
-            return {"response": "Error communicating with the Perplexity AI service.", "error": data['error'], "cost": 0.0}
+            return {"response": self._error_message(data), "actions": [], "error": data['error'], "cost": 0.0, "cached": False, "repaired": False}
         
         try:
-            content: PerplexityAgentResponse = PerplexityAgentResponse.model_validate_json(data["choices"][0]["message"]["content"])
-            cost: float = data.get("usage", {}).get("cost", {}).get("total_cost", 0.0)
+            with trace.stage(STAGE_VALIDATION) if trace else nullcontext():
+                content, repairs = self.repairer.decode(data["choices"][0]["message"]["content"])
+            if repairs:
+                _LOGGER.warning(f"Malformed Perplexity response repaired ({', '.join(repairs)}).")
+            if trace and not cached:
+                trace.set_usage(data.get("usage"))
+            cost: float = 0.0 if cached else data.get("usage", {}).get("cost", {}).get("total_cost", 0.0)
             response_text: str = content.content
             
-            _LOGGER.debug(f"Perplexity API has responded successfully (cost={cost}). Response: {content}")
-            
-            # Update cost sensors if they exist
-            monthly_sensor: MonthlyBillSensor = self.hass.data.get("perplexity_assistant_sensors", {}).get("monthly_bill_sensor")
-            monthly_sensor.increment_cost(cost) if monthly_sensor else None
-            alltime_sensor: AlltimeBillSensor = self.hass.data.get("perplexity_assistant_sensors", {}).get("alltime_bill_sensor")
-            alltime_sensor.increment_cost(cost) if alltime_sensor else None
+            _LOGGER.debug(f"Perplexity API has responded successfully (cost={cost}, cached={cached}). Response: {content}")
             
             # Send notification if enabled
             if self._get_config(CONF_NOTIFY_RESPONSE, DEFAULT_NOTIFY_RESPONSE):
@@ -244,15 +783,57 @@ class PerplexityAgent(AbstractConversationAgent):
                 )
         
             # Handle ACTION commands in the response
-            if (execute_actions and content.actions and self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, False)) or force_actions_execution:
-                for action in content.actions:
-                    # Schedule coroutine on HA's event loop (non-blocking)
-                    self.hass.async_create_task(self._execute_action(action, response_text))
+            execution: asyncio.Task | None = None
+            if content.actions and ((execute_actions and self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, False)) or force_actions_execution):
+                # Schedule the execution on HA's event loop (non-blocking)
+                calls = [self._prepare_action(action, response_text) for action in content.actions]
+                execution = self.hass.async_create_task(self.executor.async_run(calls, context))
+                execution.add_done_callback(lambda task: self._trace_actions(trace, task)) if trace else None
 
-            return {"response": response_text, "error": None, "cost": cost}
+            return {"response": response_text, "actions": [str(a) for a in content.actions or []], "error": None, "cost": cost, "cached": cached, "repaired": bool(repairs), "execution": execution}
         except Exception as e:
             _LOGGER.error(f"Error processing Perplexity response: {e}")
-            return {"response": "Error processing response from the Perplexity AI service.", "error": str(e), "cost": 0.0}
+            return {"response": "Error processing response from the Perplexity AI service.", "actions": [], "error": str(e), "cost": 0.0, "cached": False, "repaired": False}
+
+
+    def _trace_actions(self, trace: RequestTrace, execution: asyncio.Task) -> None:
+        """Record the duration of the actions of a request once they have finished.
+
+        Args:
+            trace (RequestTrace): Trace of the request.
+            execution (asyncio.Task): The finished task of the action executor.
+        """
+        if not execution.cancelled() and execution.exception() is None:
+            self.tracer.add_stage(trace, STAGE_ACTIONS, execution.result()["latency_ms"] / 1000)
+
+
+    async def _async_run_fast_path(self, command: FastPathCommand, user_input: ConversationInput) -> dict | None:
+        """Execute a command recognized locally by the fast path matcher.
+
+        Args:
+            command (FastPathCommand): The recognized command.
+            user_input (ConversationInput): The user's input.
+        Returns:
+            dict | None: Processed response (same keys as _process_response), or None if the command failed and must go through the API.
+        """
+        calls = [
+            ActionCall(f"ACTION: {domain}.{service} > {', '.join(entity_ids)}", domain, service, {}, entity_ids)
+            for (domain, service), entity_ids in command.targets.items()
+        ]
+        result = await self.executor.async_run(calls, user_input.context)
+        if not result["success"]:
+            _LOGGER.warning(f"Fast path command failed, falling back to the Perplexity API: {result['results']}")
+            return None
+
+        self.fast_path.record_execution(result["latency_ms"])
+        return {
+            "response": command.reply,
+            "actions": [f"ACTION: {domain}.{service} > {', '.join(entity_ids)}" for (domain, service), entity_ids in command.targets.items()],
+            "error": None,
+            "cost": 0.0,
+            "cached": False,
+            "repaired": False,
+        }
 
 
     # Service call handler
@@ -263,48 +844,255 @@ class PerplexityAgent(AbstractConversationAgent):
         Args:
             call (ServiceCall): The service call containing user input.
         Returns:
-            dict: The response from Perplexity: {"response": str, "actions": list, "error": str | None, "cost": float}.
-        """
-        prompt = call.data.get("prompt", "")
-        model = call.data.get("model", None)
-        execute_actions = call.data.get("execute_actions", True)
-        force_actions_execution = call.data.get("force_actions_execution", False)
-        enable_websearch = call.data.get("enable_websearch", None)
-        response: dict = {"response": "", "actions": [], "error": None, "cost": 0.0}
+            dict: The response from Perplexity: {"response": str, "actions": list, "error": str | None, "cost": float, "cached": bool, "repaired": bool, "coalesced": bool}.
+        """
+        response = await self._async_ask_item(call.data, call.context)
+        
+        self.hass.bus.async_fire(f"{DOMAIN}_response", {"response": response})
+        return response
+
+
+    async def async_get_usage(self, call: ServiceCall) -> dict:
+        """Service call handler.
+        Return the usage ledger: tokens, cost and requests in total, this month, today, per model, user, caller and day.
+
+        Args:
+            call (ServiceCall): The service call containing the number of days of daily usage to return ("days").
+        Returns:
+            dict: {"total", "month", "today", "models", "users", "callers", "days"}, each total being
+                {"requests": int, "prompt_tokens": int, "completion_tokens": int, "cost": float}.
+        """
+        return self.usage.report(int(call.data.get("days", USAGE_REPORT_DAYS)))
+
+
+    async def async_ask_batch(self, call: ServiceCall) -> dict:
+        """Service call handler.
+        Send several requests to Perplexity at once, sharing the SYSTEM_STATUS context.
+
+        Args:
+            call (ServiceCall): The service call containing the list of requests ("items") and the concurrency limit.
+        Returns:
+            dict: {"results": list, "cost": float, "errors": int, "latency_ms": float}, one result per item in order
+                (the response of async_ask with the prompt and the latency of the item).
+        """
+        items: list[dict] = call.data.get("items", [])
+        semaphore = asyncio.Semaphore(int(call.data.get("max_concurrency", DEFAULT_BATCH_CONCURRENCY)))
+        start = time.perf_counter()
+
+        # The context is built once for the whole batch, with the entities relevant to any of the prompts
+        prompts = " ".join(item.get("prompt", "") for item in items)
+        system_status = self._build_system_status("AUTOMATED SERVICE CALL", prompts)
+        fingerprint = self._get_context_fingerprint("AUTOMATED SERVICE CALL")
+
+        async def run(item: dict) -> dict:
+            async with semaphore:
+                item_start = time.perf_counter()
+                response = await self._async_ask_item(item, call.context, system_status, fingerprint)
+                return {"prompt": item.get("prompt", ""), **response, "latency_ms": round((time.perf_counter() - item_start) * 1000, 1)}
+
+        results = await asyncio.gather(*(run(item) for item in items))
+        response = {
+            "results": results,
+            "cost": sum(result["cost"] for result in results),
+            "errors": sum(1 for result in results if result["error"]),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+        self.hass.bus.async_fire(f"{DOMAIN}_response", {"batch": response})
+        return response
+
+
+    async def _async_ask_item(self, data: dict, context: Context | None, system_status: list[dict] | None = None, fingerprint: str | None = None) -> dict:
+        """Answer one request of the ask or ask_batch service.
+
+        Args:
+            data (dict): The request: prompt and optional overrides (model, enable_websearch, execute_actions, force_actions_execution, use_cache).
+            context (Context | None): Context of the service call, passed to the actions.
+            system_status (list[dict] | None): Prebuilt SYSTEM_STATUS messages (built if None).
+            fingerprint (str | None): Prebuilt context fingerprint (computed if None).
+        Returns:
+            dict: The response from Perplexity.
+        """
+        prompt = data.get("prompt", "")
+        model = data.get("model", None)
+        execute_actions = data.get("execute_actions", True)
+        force_actions_execution = data.get("force_actions_execution", False)
+        enable_websearch = data.get("enable_websearch", None)
+        use_cache = data.get("use_cache", True)
+        response: dict = {"response": "", "actions": [], "error": None, "cost": 0.0, "cached": False, "repaired": False, "coalesced": False}
         
         if not prompt:
             response['response'] = "No prompt provided."
             response['error'] = "No prompt provided."
+            return response
+
+        messages: list[dict] = [ self.template.user_message(prompt) ]
+        request_key = self._get_request_key(messages, "AUTOMATED SERVICE CALL", override_model=model, force_websearch_access=enable_websearch, fingerprint=fingerprint)
+        cache_key = request_key if use_cache and self._get_config(CONF_CACHE_TTL, DEFAULT_CACHE_TTL) else None
+
+        # Identical requests already in flight share a single API call (and a single execution of the actions)
+        response, coalesced = await self.coalescer.async_run(
+            f"{request_key}:{execute_actions}:{force_actions_execution}:{use_cache}",
+            lambda: self._async_ask(messages, prompt, model, enable_websearch, execute_actions, force_actions_execution, cache_key, context, system_status),
+        )
+        if coalesced:
+            # The cost has already been counted for the first caller
+            response = {**response, "cost": 0.0, "coalesced": True}
+        return response
+
+
+    async def _async_ask(self, messages: list[dict], prompt: str, model: str | None, enable_websearch: bool | None, execute_actions: bool, force_actions_execution: bool, cache_key: str | None, context: Context | None, system_status: list[dict] | None = None) -> dict:
+        """Answer a service call from the cache or the API, and wait for its actions.
+
+        Args:
+            messages (list[dict]): The user messages.
+            prompt (str): Raw user prompt, used to select the relevant entities.
+            model (str | None): Model to use instead of the configured one.
+            enable_websearch (bool | None): Forces web search on or off.
+            execute_actions (bool): Whether to execute actions in the response.
+            force_actions_execution (bool): Whether to execute actions even if not allowed in the configuration.
+            cache_key (str | None): Response cache key (None to bypass the cache).
+            context (Context | None): Context of the service call, passed to the actions.
+            system_status (list[dict] | None): Prebuilt SYSTEM_STATUS messages (built if None).
+        Returns:
+            dict: The processed response, with the results of the actions if any were executed.
+        """
+        trace = RequestTrace(CALLER_SERVICE)
+        if cache_key and (data := self.cache.get(cache_key)) is not None:
+            trace.source = SOURCE_CACHE
+            response = self._process_response(data, execute_actions=execute_actions, force_actions_execution=force_actions_execution, cached=True, context=context, trace=trace)
         else:
-            messages: list[dict] = [ {"role": "user", "content": f"USER SYSTEM PROMPT: {self._get_config(CONF_CUSTOM_SYSTEM_PROMPT, '')} | USER PROMPT: {prompt}"} ]
-            data = await self._async_send_request(messages, "AUTOMATED SERVICE CALL", override_model=model, force_websearch_access=enable_websearch)
-            response = self._process_response(data, execute_actions=execute_actions, force_actions_execution=force_actions_execution)
-        
-        self.hass.bus.async_fire(f"{DOMAIN}_response", {"response": response})
+            data = await self._async_send_request(messages, "AUTOMATED SERVICE CALL", override_model=model, force_websearch_access=enable_websearch, query=prompt, system_status=system_status, trace=trace)
+            self._record_usage(data, "AUTOMATED SERVICE CALL", CALLER_SERVICE)
+            response = self._process_response(data, execute_actions=execute_actions, force_actions_execution=force_actions_execution, context=context, trace=trace)
+            self._cache_response(cache_key, data, response)
+
+        # Wait for the actions, so their results are part of the service response
+        if execution := response.pop("execution", None):
+            response["action_results"] = await execution
+
+        self.tracer.record(trace)
+        response["coalesced"] = False
         return response
 
 
-    async def async_process(self, user_input: ConversationInput) -> ConversationResult:
+    async def async_process(self, user_input: ConversationInput, chat_log: ChatLog) -> ConversationResult:
         """Process agent conversation input.
         Send a request to Perplexity based on user input.
 
         Args:
             user_input (ConversationInput): The user's input.
+            chat_log (ChatLog): Chat log of the conversation, the answer is added to it.
         Returns:
             ConversationResult: The response formatted for Home Assistant.
         """
         # Get config entry options
         prompt: str = user_input.text
         user_name = "UNKNOWN"
+        trace = RequestTrace(CALLER_CONVERSATION)
 
         if user_input.context and user_input.context.user_id:
-            user = await self.hass.auth.async_get_user(user_input.context.user_id)
+            with trace.stage(STAGE_USER_LOOKUP):
+                user = await self.hass.auth.async_get_user(user_input.context.user_id)
             user_name = user.name if user else "UNKNOWN"
         
-        user_messages: list[dict] = [ {"role": "user", "content": f"USER SYSTEM PROMPT: {self._get_config(CONF_CUSTOM_SYSTEM_PROMPT, '')} | USER PROMPT: {prompt}"} ]
-        data: dict = await self._async_send_request(user_messages, user_name)
-        processed_response: dict = self._process_response(data)
+        conversation_id: str = chat_log.conversation_id
+        memory_max_turns: int = int(self._get_config(CONF_MEMORY_MAX_TURNS, DEFAULT_MEMORY_MAX_TURNS))
+        memory_max_age: float = self._get_config(CONF_MEMORY_MAX_AGE, DEFAULT_MEMORY_MAX_AGE)
+        history: list[dict] = self.memory.get_messages(conversation_id, memory_max_age) if memory_max_turns else []
+        
+        # Simple device commands are executed locally, without calling the API
+        processed_response: dict | None = None
+        streamed_text: str = ""
+        if self._get_config(CONF_ENABLE_FAST_PATH, DEFAULT_ENABLE_FAST_PATH) and self._get_config(CONF_ALLOW_ACTIONS_ON_ENTITIES, DEFAULT_ALLOW_ACTIONS_ON_ENTITIES):
+            languages = [(user_input.language or "").split("-")[0].lower(), self._get_config(CONF_LANGUAGE, DEFAULT_LANGUAGE)]
+            if command := self.fast_path.match(prompt, languages):
+                start = time.perf_counter()
+                processed_response = await self._async_run_fast_path(command, user_input)
+                self.tracer.add_stage(trace, STAGE_ACTIONS, time.perf_counter() - start)
+                if processed_response is not None:
+                    trace.source = SOURCE_FAST_PATH
+
+        if processed_response is None:
+            user_messages: list[dict] = [ *history, self.template.user_message(prompt) ]
+            cache_key: str | None = self._get_cache_key(user_messages, user_name)
+            # Follow-ups ("and the kitchen too?") often name only part of what they refer to (the router classifies the prompt alone)
+            context_query: str = " ".join([message["content"] for message in history if message["role"] == "user"][-1:] + [prompt])
+
+            if cache_key and (data := self.cache.get(cache_key)) is not None:
+                trace.source = SOURCE_CACHE
+                processed_response = self._process_response(data, cached=True, context=user_input.context, trace=trace)
+            else:
+                if self._get_config(CONF_ENABLE_STREAMING, DEFAULT_ENABLE_STREAMING):
+                    data, streamed_text = await self._async_stream_to_chat_log(user_input, chat_log, user_messages, user_name, context_query, trace)
+                else:
+                    data: dict = await self._async_send_request(user_messages, user_name, query=context_query, priority=PRIORITY_VOICE, hedge=True, trace=trace, route_query=prompt)
+                self._record_usage(data, user_name, CALLER_CONVERSATION)
+                processed_response = self._process_response(data, context=user_input.context, trace=trace)
+                self._cache_response(cache_key, data, processed_response)
+            processed_response.pop("execution", None) # Actions keep running while the answer is spoken
+
+        self.tracer.record(trace)
+
+        if memory_max_turns and not processed_response.get("error"):
+            self.memory.add_turn(
+                conversation_id,
+                prompt,
+                processed_response["response"],
+                max_turns=memory_max_turns,
+                max_age=memory_max_age,
+                token_budget=int(self._get_config(CONF_MEMORY_TOKEN_BUDGET, DEFAULT_MEMORY_TOKEN_BUDGET)),
+            )
+
+        speech: str = processed_response.get("response", "Unknown response from Perplexity AI service.")
+        if streamed_text:
+            # Already spoken and in the chat log, including the error that may have cut the answer short
+            speech = streamed_text
+        else:
+            chat_log.async_add_assistant_content_without_tools(AssistantContent(agent_id=user_input.agent_id or self.config_entry.entry_id, content=speech))
 
         response = IntentResponse(language=self._get_config(CONF_LANGUAGE, DEFAULT_LANGUAGE))
-        response.async_set_speech(processed_response.get("response", "Unknown response from Perplexity AI service."))
-        return ConversationResult(response=response)
+        response.async_set_speech(speech)
+        return ConversationResult(response=response, conversation_id=conversation_id)
+
+
+class PerplexityConversationEntity(ConversationEntity):
+    """Conversation entity of a config entry, answered by its Perplexity agent.
+    Unlike an agent registered directly, an entity can declare streaming support, so the Assist
+    pipeline starts text-to-speech with the first sentences written to the chat log.
+    """
+    _attr_should_poll = False
+
+    def __init__(self, entry_id: str, agent: PerplexityAgent) -> None:
+        """Initialize the conversation entity.
+
+        Args:
+            entry_id (str): Configuration entry ID.
+            agent (PerplexityAgent): Agent answering the conversations.
+        """
+        self._agent = agent
+        self._attr_unique_id = entry_id
+        self._attr_attribution = agent.attribution
+
+    @property
+    def name(self) -> str:
+        """Return the name of the agent (the title of the config entry)."""
+        return self._agent.agent_name
+
+    @property
+    def supports_streaming(self) -> bool:
+        """Return whether responses are streamed to the chat log (the Stream voice responses option)."""
+        return self._agent._get_config(CONF_ENABLE_STREAMING, DEFAULT_ENABLE_STREAMING)
+
+    @property
+    def supported_languages(self) -> list[str]:
+        """Return the list of supported languages."""
+        return self._agent.supported_languages
+
+    async def async_prepare(self, language: str | None = None) -> None:
+        """Warm up the agent while the user is speaking, see PerplexityAgent.async_prepare."""
+        await self._agent.async_prepare(language)
+
+    async def _async_handle_message(self, user_input: ConversationInput, chat_log: ChatLog) -> ConversationResult:
+        """Answer a message with the agent, which writes its answer to the chat log."""
+        return await self._agent.async_process(user_input, chat_log)
@@ -0,0 +1,47 @@
+"""Diagnostics support for Perplexity Assistant."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import *
+
+
+TO_REDACT: set[str] = {CONF_API_KEY, CONF_EXTRA_API_KEYS}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry.
+
+    Args:
+        hass (HomeAssistant): Home Assistant instance.
+        entry (ConfigEntry): Configuration entry.
+    Returns:
+        dict[str, Any]: Configuration (without secrets) and runtime statistics of the agent.
+    """
+    diagnostics: dict[str, Any] = {
+        "data": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+    }
+
+    agent = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if agent:
+        diagnostics["response_cache"] = agent.cache.stats
+        diagnostics["conversation_memory"] = agent.memory.stats
+        diagnostics["fast_path"] = agent.fast_path.stats
+        diagnostics["request_coalescing"] = agent.coalescer.stats
+        diagnostics["request_queue"] = agent.scheduler.stats
+        diagnostics["resilience"] = agent.resilience.stats
+        diagnostics["request_tracing"] = agent.tracer.stats
+        diagnostics["entities_context"] = agent.entities_context_stats
+        diagnostics["model_router"] = agent.router.stats
+        diagnostics["budget"] = agent.budget.stats
+        diagnostics["api_keys"] = agent.keys.stats
+        diagnostics["response_repair"] = agent.repairer.stats
+        diagnostics["warm_up"] = agent.warm_up_stats
+        diagnostics["usage"] = {key: value for key, value in agent.usage.report(7).items() if key != "users"} # User names are personal data
+
+    return diagnostics
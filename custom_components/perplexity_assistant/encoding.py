@@ -0,0 +1,177 @@
+"""Compact encodings of the entities context, and a tokenizer-free estimate of their size."""
+import re
+
+from collections import defaultdict
+from collections.abc import Iterable
+
+from .const import ENTITIES_FORMAT_TERSE
+from .context import estimate_tokens
+
+
+COLLAPSED_STATES: frozenset[str] = frozenset({"unavailable", "unknown"})   # Written once per domain instead of once per entity
+EXCLUDED_CATEGORIES: frozenset[str] = frozenset({"diagnostic"})            # Entity categories left out of the context
+TERSE_MIN_STEM: int = 4             # Shorter common starts of object IDs are not worth factoring out
+LETTERS_PER_TOKEN: int = 8          # Longer words are split in several tokens by the estimate
+PIECE_PATTERN: re.Pattern = re.compile(r"[^\W\d_]+|\d{1,3}|\S")
+
+SUMMARY_HEADER: str = (
+    "The Home Assistant instance has {count} entities, listed per room and domain as object_id=state (the entity ID is domain.object_id)."
+    " Diagnostic and hidden entities are left out."
+)
+INVENTORY_HEADER: str = (
+    "The entities of the Home Assistant instance, listed per room and domain by object ID (the entity ID is domain.object_id)."
+    " Diagnostic and hidden entities are left out."
+)
+STATES_HEADER: str = "Current states, per domain as object_id=state."
+GROUPED_NOTE: str = " Unavailable and unknown entities are grouped at the end of their domain, as (unavailable: object_id, object_id)."
+SHORTENED_NOTE: str = " Object IDs that start alike are shortened: kitchen_light_{3=on, 17=off} stands for kitchen_light_3 and kitchen_light_17."
+COUNTED_NOTE: str = " Unavailable and unknown entities are only counted."
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text without a tokenizer.
+    Words count as one token up to LETTERS_PER_TOKEN letters, numbers as one token per three
+    digits and every other character (punctuation, underscore, dot) as one token. Closer to
+    the actual count than a division of the length for texts full of entity IDs and states.
+
+    Args:
+        text (str): Text to measure.
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return sum(1 + (len(piece) - 1) // LETTERS_PER_TOKEN if piece[0].isalpha() else 1 for piece in PIECE_PATTERN.findall(text))
+
+
+def measure(text: str) -> dict[str, int]:
+    """Measure a context text, for the diagnostics and the benchmarks.
+
+    Args:
+        text (str): Text to measure.
+    Returns:
+        dict[str, int]: Size in bytes, and estimated tokens by length and by counting the word pieces.
+    """
+    return {"bytes": len(text.encode()), "tokens": estimate_tokens(text), "token_pieces": count_tokens(text)}
+
+
+def is_excluded(entity_category: str | None, hidden_by: str | None) -> bool:
+    """Return whether an entity is left out of the compact encodings.
+
+    Args:
+        entity_category (str | None): Category of the entity registry entry.
+        hidden_by (str | None): Who hid the entity, if it is hidden.
+    Returns:
+        bool: True for diagnostic and hidden entities.
+    """
+    return entity_category in EXCLUDED_CATEGORIES or hidden_by is not None
+
+
+def split_stem(object_id: str) -> str:
+    """Return the start of an object ID up to its last underscore, shared by the entities of a same device or series.
+
+    Args:
+        object_id (str): Object ID (entity ID without the domain).
+    Returns:
+        str: e.g. "kitchen_light_" for "kitchen_light_3" (empty if too short to be worth factoring out).
+    """
+    stem = object_id[:object_id.rfind("_") + 1]
+    return stem if len(stem) >= TERSE_MIN_STEM else ""
+
+
+def encode_group(domain: str, entities: list[tuple[str, str | None]], terse: bool) -> str:
+    """Encode the entities of one domain (in one room).
+
+    Args:
+        domain (str): Domain of the entities.
+        entities (list[tuple[str, str | None]]): (object ID, state or None) of the entities.
+        terse (bool): Factor out the common start of the object IDs and only count the unavailable entities.
+    Returns:
+        str: e.g. "light: ceiling=on, island=off, (unavailable: pendant)".
+    """
+    listed: list[tuple[str, str | None]] = []
+    collapsed: dict[str, list[str]] = {}
+    for object_id, state in entities:
+        if state in COLLAPSED_STATES:
+            collapsed.setdefault(state, []).append(object_id)
+        else:
+            listed.append((object_id, state))
+
+    if terse:
+        stems: dict[str, list[tuple[str, str | None]]] = {}
+        for object_id, state in listed:
+            stems.setdefault(split_stem(object_id) or object_id, []).append((object_id, state))
+        items = []
+        for stem, members in stems.items():
+            if len(members) == 1:
+                stem = ""
+            cut = len(stem)
+            encoded = ", ".join(object_id[cut:] if state is None else f"{object_id[cut:]}={state}" for object_id, state in members)
+            items.append(f"{stem}{{{encoded}}}" if stem else encoded)
+        items.extend(f"{len(object_ids)} {state}" for state, object_ids in collapsed.items())
+    else:
+        items = [object_id if state is None else f"{object_id}={state}" for object_id, state in listed]
+        items.extend(f"({state}: {', '.join(object_ids)})" for state, object_ids in collapsed.items())
+    return f"{domain}: " + ", ".join(items)
+
+
+def encode_entities(entities: Iterable[tuple[str, str | None, str | None]], terse: bool, per_room: bool = True) -> list[str]:
+    """Encode entities grouped per room, then per domain.
+    Rooms and domains keep the order in which they first appear, so the encoding of an unchanged set of entities is stable.
+
+    Args:
+        entities (Iterable[tuple[str, str | None, str | None]]): (entity ID, area ID, state or None) of the entities.
+        terse (bool): See encode_group.
+        per_room (bool): Group per room, then per domain (one line per room). Otherwise, one line per domain.
+    Returns:
+        list[str]: Lines of the encoding.
+    """
+    groups: dict[str | None, dict[str, list[tuple[str, str | None]]]] = defaultdict(dict)
+    for entity_id, room, state in entities:
+        domain, _, object_id = entity_id.partition(".")
+        groups[room if per_room else None].setdefault(domain, []).append((object_id, state))
+
+    if not per_room:
+        return [encode_group(domain, group, terse) for domain, group in groups.get(None, {}).items()]
+    return [
+        f"room {room}: " + "; ".join(encode_group(domain, group, terse) for domain, group in domains.items())
+        for room, domains in groups.items()
+    ]
+
+
+def format_header(template: str, entity_format: str, **values) -> str:
+    """Return the header of an encoded text, which explains how to read it.
+
+    Args:
+        template (str): SUMMARY_HEADER, INVENTORY_HEADER or STATES_HEADER.
+        entity_format (str): Encoding of the entities.
+        **values: Values of the template fields.
+    Returns:
+        str: The header.
+    """
+    text = template.format(**values)
+    if entity_format == ENTITIES_FORMAT_TERSE:
+        return text + SHORTENED_NOTE + ("" if template is INVENTORY_HEADER else COUNTED_NOTE)
+    return text if template is INVENTORY_HEADER else text + GROUPED_NOTE
+
+
+def encode_text(part: str, entity_format: str, entities: list[tuple[str, str | None, str | None]]) -> str:
+    """Encode a part of the entities context, from a snapshot of the entities.
+    Only reads its arguments, so it can run in an executor while the index keeps changing.
+
+    Args:
+        part (str): "summary" (rooms and states), "inventory" (rooms) or "states" (states per domain).
+        entity_format (str): ENTITIES_FORMAT_GROUPED or ENTITIES_FORMAT_TERSE.
+        entities (list[tuple[str, str | None, str | None]]): (entity ID, area ID, state) of the entities listed.
+    Returns:
+        str: The encoded text.
+    """
+    terse = entity_format == ENTITIES_FORMAT_TERSE
+    if part == "inventory":
+        # The number of entities goes last, so an entity added only changes the end of the prefix
+        lines = encode_entities(((entity_id, room, None) for entity_id, room, _state in entities), terse)
+        lines.append(f"{len(entities)} entities in total.")
+        return "\n- ".join((format_header(INVENTORY_HEADER, entity_format), *lines))
+    if part == "states":
+        lines = encode_entities(((entity_id, None, state) for entity_id, _room, state in entities), terse, per_room=False)
+        return "\n- ".join((format_header(STATES_HEADER, entity_format), *lines))
+    lines = encode_entities(entities, terse)
+    return "\n- ".join((format_header(SUMMARY_HEADER, entity_format, count=len(entities)), *lines))
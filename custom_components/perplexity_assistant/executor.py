@@ -0,0 +1,177 @@
+"""Execution of the actions returned by Perplexity."""
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from homeassistant.core import Context, HomeAssistant
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ActionCall:
+    """A service call to perform for one action of a response."""
+    __slots__ = ("label", "domain", "service", "data", "targets", "batchable")
+
+    def __init__(self, label: str, domain: str, service: str, data: dict, targets: list[str], batchable: bool = True) -> None:
+        """Initialize the call.
+
+        Args:
+            label (str): Description of the action, reported in the results.
+            domain (str): Service domain.
+            service (str): Service name.
+            data (dict): Service data, without the target entities.
+            targets (list[str]): Entity IDs the service is called on.
+            batchable (bool): Whether the call may be merged with identical calls on other entities.
+        """
+        self.label: str = label
+        self.domain: str = domain
+        self.service: str = service
+        self.data: dict = data
+        self.targets: list[str] = targets
+        self.batchable: bool = batchable
+
+    @property
+    def batch_key(self) -> str | None:
+        """Return the key shared by the calls that can be merged into one service call."""
+        if not self.batchable or not self.targets:
+            return None
+        return f"{self.domain}.{self.service}:{json.dumps(self.data, sort_keys=True, default=str)}"
+
+
+class _Batch:
+    """Calls merged into a single service call."""
+
+    def __init__(self, call: ActionCall) -> None:
+        self.key: str | None = call.batch_key
+        self.domain: str = call.domain
+        self.service: str = call.service
+        self.data: dict = call.data
+        self.calls: list[ActionCall] = [call]
+        self.targets: list[str] = list(call.targets)
+
+    def add(self, call: ActionCall) -> None:
+        self.calls.append(call)
+        self.targets.extend(target for target in call.targets if target not in self.targets)
+
+
+class ActionExecutor:
+    """Runs the actions of a response concurrently, while keeping the order of the actions on each entity.
+
+    Identical calls (same domain, service and data) on different entities are merged into
+    one service call with a list of entities. Calls on independent entities run in parallel,
+    up to a global limit shared by every response; calls on the same entity are serialized,
+    within a response (in the order given by Perplexity) and across concurrent responses.
+    """
+
+    def __init__(self, hass: HomeAssistant, max_parallel: int, timeout: float) -> None:
+        """Initialize the executor.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            max_parallel (int): Maximum number of service calls running at the same time.
+            timeout (float): Seconds after which a service call is reported as failed.
+        """
+        self.hass: HomeAssistant = hass
+        self.timeout: float = timeout
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_parallel)
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()   # A lock is dropped once no run holds or awaits it
+
+    async def async_run(self, calls: list[ActionCall], context: Context | None = None) -> dict:
+        """Execute calls and wait for all of them.
+
+        Args:
+            calls (list[ActionCall]): Calls, in the order returned by Perplexity.
+            context (Context | None): Context of the request the calls originate from.
+        Returns:
+            dict: {"success": bool, "latency_ms": float, "results": [{"action", "success", "latency_ms", "error"}]} with one result per call, in order.
+        """
+        start = time.perf_counter()
+        batches = self._plan(calls)
+        results: dict[int, dict] = {}
+
+        # Each batch waits for the previous batches of this run that share one of its entities
+        last_task: dict[str, asyncio.Task] = {}
+        tasks: list[asyncio.Task] = []
+        for batch in batches:
+            dependencies = {last_task[target] for target in batch.targets if target in last_task}
+            task = self.hass.async_create_task(self._async_run_batch(batch, dependencies, results, context))
+            for target in batch.targets:
+                last_task[target] = task
+            tasks.append(task)
+
+        await asyncio.gather(*tasks)
+
+        ordered = [results[id(call)] for call in calls]
+        return {
+            "success": all(result["success"] for result in ordered),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "results": ordered,
+        }
+
+    @staticmethod
+    def _plan(calls: list[ActionCall]) -> list[_Batch]:
+        """Merge identical calls into batches without reordering the calls of any entity.
+
+        Args:
+            calls (list[ActionCall]): Calls, in order.
+        Returns:
+            list[_Batch]: Batches, in execution order.
+        """
+        batches: list[_Batch] = []
+        for call in calls:
+            merged = False
+            if call.batch_key is not None:
+                for index in range(len(batches) - 1, -1, -1):
+                    batch = batches[index]
+                    later_targets = {target for later in batches[index + 1:] for target in later.targets}
+                    if batch.key == call.batch_key and not set(call.targets) & (later_targets | set(batch.targets)):
+                        batch.add(call)
+                        merged = True
+                        break
+            if not merged:
+                batches.append(_Batch(call))
+        return batches
+
+    async def _async_run_batch(self, batch: _Batch, dependencies: set[asyncio.Task], results: dict[int, dict], context: Context | None) -> None:
+        """Execute one batch and record the result of each of its calls.
+
+        Args:
+            batch (_Batch): The batch to execute.
+            dependencies (set[asyncio.Task]): Batches that must complete first.
+            results (dict[int, dict]): Results, keyed by id() of the calls.
+            context (Context | None): Context of the originating request.
+        """
+        if dependencies:
+            await asyncio.gather(*dependencies, return_exceptions=True)
+
+        acquired: list[asyncio.Lock] = []
+        error: str | None = None
+        start = time.perf_counter()
+
+        try:
+            # Sorted acquisition, so concurrent runs cannot deadlock
+            for target in sorted(batch.targets):
+                lock = self._locks.setdefault(target, asyncio.Lock())
+                await lock.acquire()
+                acquired.append(lock)
+            start = time.perf_counter()
+            async with self._semaphore:
+                data = {**batch.data, "entity_id": batch.targets if len(batch.targets) > 1 else batch.targets[0]} if batch.targets else batch.data
+                async with asyncio.timeout(self.timeout):
+                    await self.hass.services.async_call(batch.domain, batch.service, data, blocking=True, context=context)
+        except TimeoutError:
+            error = f"Timed out after {self.timeout}s"
+        except Exception as e:
+            error = str(e)
+        finally:
+            for lock in acquired:
+                lock.release()
+
+        latency = round((time.perf_counter() - start) * 1000, 1)
+        if error:
+            _LOGGER.warning(f"Failed to execute action {batch.domain}.{batch.service} on {batch.targets}: {error}")
+        for call in batch.calls:
+            results[id(call)] = {"action": call.label, "success": error is None, "latency_ms": latency, "error": error}
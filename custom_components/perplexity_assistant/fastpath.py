@@ -0,0 +1,320 @@
+"""Local matcher for simple device commands, answered without calling the Perplexity API."""
+import logging
+import re
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import area_registry
+
+from .context import normalize_name
+from .summary import EntitiesSummaryIndex
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# Command patterns per language: (intent, pattern capturing the spoken target)
+COMMAND_PATTERNS: dict[str, list[tuple[str, str]]] = {
+    "en": [
+        ("on", r"^(?:please )?(?:turn|switch) on (?P<target>.+)$"),
+        ("on", r"^(?:please )?(?:turn|switch) (?P<target>.+) on$"),
+        ("off", r"^(?:please )?(?:turn|switch) off (?P<target>.+)$"),
+        ("off", r"^(?:please )?(?:turn|switch) (?P<target>.+) off$"),
+        ("open", r"^(?:please )?open (?P<target>.+)$"),
+        ("close", r"^(?:please )?close (?P<target>.+)$"),
+        ("lock", r"^(?:please )?lock (?P<target>.+)$"),
+    ],
+    "fr": [
+        ("on", r"^(?:allume|allumer) (?P<target>.+)$"),
+        ("off", r"^(?:éteins|éteindre|eteins) (?P<target>.+)$"),
+        ("open", r"^(?:ouvre|ouvrir) (?P<target>.+)$"),
+        ("close", r"^(?:ferme|fermer) (?P<target>.+)$"),
+        ("lock", r"^(?:verrouille|verrouiller) (?P<target>.+)$"),
+    ],
+    "es": [
+        ("on", r"^(?:enciende|encender|prende) (?P<target>.+)$"),
+        ("off", r"^(?:apaga|apagar) (?P<target>.+)$"),
+        ("open", r"^(?:abre|abrir) (?P<target>.+)$"),
+        ("close", r"^(?:cierra|cerrar) (?P<target>.+)$"),
+        ("lock", r"^(?:bloquea|bloquear) (?P<target>.+)$"),
+    ],
+    "de": [
+        ("on", r"^(?:schalte|schalt|mach|mache) (?P<target>.+) (?:ein|an)$"),
+        ("off", r"^(?:schalte|schalt|mach|mache) (?P<target>.+) aus$"),
+        ("open", r"^(?:öffne|öffnen) (?P<target>.+)$"),
+        ("close", r"^(?:schließe|schliesse|schließen) (?P<target>.+)$"),
+        ("lock", r"^(?:verriegle|verriegeln|sperre) (?P<target>.+)$"),
+    ],
+    "it": [
+        ("on", r"^(?:accendi|accendere) (?P<target>.+)$"),
+        ("off", r"^(?:spegni|spegnere) (?P<target>.+)$"),
+        ("open", r"^(?:apri|aprire) (?P<target>.+)$"),
+        ("close", r"^(?:chiudi|chiudere) (?P<target>.+)$"),
+        ("lock", r"^(?:blocca|bloccare) (?P<target>.+)$"),
+    ],
+    "pt": [
+        ("on", r"^(?:liga|ligue|ligar|acende|acenda) (?P<target>.+)$"),
+        ("off", r"^(?:desliga|desligue|desligar|apaga|apague) (?P<target>.+)$"),
+        ("open", r"^(?:abre|abra|abrir) (?P<target>.+)$"),
+        ("close", r"^(?:fecha|feche|fechar) (?P<target>.+)$"),
+        ("lock", r"^(?:tranca|tranque|trancar) (?P<target>.+)$"),
+    ],
+    "nl": [
+        ("on", r"^(?:zet|doe) (?P<target>.+) aan$"),
+        ("on", r"^schakel (?P<target>.+) in$"),
+        ("off", r"^(?:zet|doe) (?P<target>.+) uit$"),
+        ("off", r"^schakel (?P<target>.+) uit$"),
+        ("open", r"^open (?P<target>.+)$"),
+        ("close", r"^sluit (?P<target>.+)$"),
+        ("lock", r"^vergrendel (?P<target>.+)$"),
+    ],
+    "zh": [
+        ("on", r"^(?:请)?(?:打开|开启)(?P<target>.+?)(?:吧)?$"),
+        ("off", r"^(?:请)?(?:关闭|关掉|关上)(?P<target>.+?)(?:吧)?$"),
+        ("lock", r"^(?:请)?锁上(?P<target>.+?)(?:吧)?$"),
+    ],
+    "ja": [
+        ("on", r"^(?P<target>.+?)を?(?:つけて|点けて|オンにして)(?:ください)?$"),
+        ("off", r"^(?P<target>.+?)を?(?:けして|消して|オフにして)(?:ください)?$"),
+        ("open", r"^(?P<target>.+?)を?(?:あけて|開けて)(?:ください)?$"),
+        ("close", r"^(?P<target>.+?)を?(?:しめて|閉めて)(?:ください)?$"),
+        ("lock", r"^(?P<target>.+?)を?(?:ロックして|施錠して)(?:ください)?$"),
+    ],
+    "ko": [
+        ("on", r"^(?P<target>.+?)(?:을|를)? ?(?:켜줘|켜 줘|켜주세요|켜)$"),
+        ("off", r"^(?P<target>.+?)(?:을|를)? ?(?:꺼줘|꺼 줘|꺼주세요|꺼)$"),
+        ("open", r"^(?P<target>.+?)(?:을|를)? ?(?:열어줘|열어 줘|열어주세요|열어)$"),
+        ("close", r"^(?P<target>.+?)(?:을|를)? ?(?:닫아줘|닫아 줘|닫아주세요|닫아)$"),
+        ("lock", r"^(?P<target>.+?)(?:을|를)? ?(?:잠가줘|잠가 줘|잠가주세요|잠가)$"),
+    ],
+}
+
+# Words that may surround the name of a target ("the", "in the"...), ignored when resolving it
+FILLER_WORDS: dict[str, set[str]] = {
+    "en": {"the", "all", "in", "of", "my"},
+    "fr": {"le", "la", "les", "l", "du", "de", "des", "dans", "tout", "toutes", "tous"},
+    "es": {"el", "la", "los", "las", "del", "de", "en", "todas", "todos"},
+    "de": {"der", "die", "das", "den", "dem", "im", "in", "alle"},
+    "it": {"il", "lo", "la", "i", "gli", "le", "l", "del", "della", "nel", "nella", "in", "tutte", "tutti"},
+    "pt": {"o", "a", "os", "as", "do", "da", "dos", "das", "no", "na", "em", "todas", "todos"},
+    "nl": {"de", "het", "in", "alle", "van"},
+    "zh": {"的"},
+    "ja": {"の"},
+    "ko": {"의"},
+}
+
+# Spoken names of the domains, used to resolve "<area> <domain>" targets such as "kitchen lights"
+DOMAIN_WORDS: dict[str, dict[str, set[str]]] = {
+    "light": {
+        "en": {"light", "lights", "lamp", "lamps"}, "fr": {"lumière", "lumières", "lampe", "lampes"},
+        "es": {"luz", "luces", "lámpara", "lámparas"}, "de": {"licht", "lichter", "lampe", "lampen"},
+        "it": {"luce", "luci", "lampada", "lampade"}, "pt": {"luz", "luzes", "lâmpada", "lâmpadas"},
+        "nl": {"licht", "lichten", "lamp", "lampen"}, "zh": {"灯"}, "ja": {"電気", "ライト", "照明"}, "ko": {"불", "조명"},
+    },
+    "switch": {
+        "en": {"switch", "switches", "plug", "plugs"}, "fr": {"prise", "prises"}, "es": {"enchufe", "enchufes"},
+        "de": {"steckdose", "steckdosen"}, "it": {"presa", "prese"}, "pt": {"tomada", "tomadas"},
+        "nl": {"stekker", "stekkers"}, "zh": {"插座", "开关"}, "ja": {"スイッチ", "コンセント"}, "ko": {"스위치", "플러그"},
+    },
+    "fan": {
+        "en": {"fan", "fans"}, "fr": {"ventilateur", "ventilateurs"}, "es": {"ventilador", "ventiladores"},
+        "de": {"ventilator", "ventilatoren"}, "it": {"ventilatore", "ventilatori"}, "pt": {"ventilador", "ventiladores"},
+        "nl": {"ventilator", "ventilatoren"}, "zh": {"风扇"}, "ja": {"扇風機"}, "ko": {"선풍기"},
+    },
+    "cover": {
+        "en": {"blind", "blinds", "shutter", "shutters", "cover", "covers", "curtain", "curtains"}, "fr": {"volet", "volets", "store", "stores"},
+        "es": {"persiana", "persianas"}, "de": {"rollladen", "rollläden", "jalousie", "jalousien"}, "it": {"tapparella", "tapparelle"},
+        "pt": {"persiana", "persianas", "estore", "estores"}, "nl": {"rolluik", "rolluiken", "gordijn", "gordijnen"},
+        "zh": {"窗帘"}, "ja": {"カーテン", "シャッター"}, "ko": {"커튼", "블라인드"},
+    },
+    "lock": {
+        "en": {"lock", "locks"}, "fr": {"serrure", "serrures"}, "es": {"cerradura", "cerraduras"}, "de": {"schloss", "schlösser"},
+        "it": {"serratura", "serrature"}, "pt": {"fechadura", "fechaduras"}, "nl": {"slot", "sloten"},
+        "zh": {"锁", "门锁"}, "ja": {"鍵", "ロック"}, "ko": {"잠금장치", "도어락"},
+    },
+}
+
+# Service called for each intent, per domain. Unlocking and opening locks always go through the API.
+INTENT_SERVICES: dict[str, dict[str, str]] = {
+    "on": {"light": "turn_on", "switch": "turn_on", "fan": "turn_on", "input_boolean": "turn_on", "cover": "open_cover"},
+    "off": {"light": "turn_off", "switch": "turn_off", "fan": "turn_off", "input_boolean": "turn_off", "cover": "close_cover"},
+    "open": {"cover": "open_cover"},
+    "close": {"cover": "close_cover"},
+    "lock": {"lock": "lock"},
+}
+
+# Spoken replies per language and intent
+REPLY_TEMPLATES: dict[str, dict[str, str]] = {
+    "en": {"on": "Turned on {target}.", "off": "Turned off {target}.", "open": "Opened {target}.", "close": "Closed {target}.", "lock": "Locked {target}."},
+    "fr": {"on": "J'ai allumé {target}.", "off": "J'ai éteint {target}.", "open": "J'ai ouvert {target}.", "close": "J'ai fermé {target}.", "lock": "J'ai verrouillé {target}."},
+    "es": {"on": "He encendido {target}.", "off": "He apagado {target}.", "open": "He abierto {target}.", "close": "He cerrado {target}.", "lock": "He bloqueado {target}."},
+    "de": {"on": "{target} eingeschaltet.", "off": "{target} ausgeschaltet.", "open": "{target} geöffnet.", "close": "{target} geschlossen.", "lock": "{target} verriegelt."},
+    "it": {"on": "Ho acceso {target}.", "off": "Ho spento {target}.", "open": "Ho aperto {target}.", "close": "Ho chiuso {target}.", "lock": "Ho bloccato {target}."},
+    "pt": {"on": "Liguei {target}.", "off": "Desliguei {target}.", "open": "Abri {target}.", "close": "Fechei {target}.", "lock": "Tranquei {target}."},
+    "nl": {"on": "{target} aangezet.", "off": "{target} uitgezet.", "open": "{target} geopend.", "close": "{target} gesloten.", "lock": "{target} vergrendeld."},
+    "zh": {"on": "已打开{target}。", "off": "已关闭{target}。", "open": "已打开{target}。", "close": "已关闭{target}。", "lock": "已锁上{target}。"},
+    "ja": {"on": "{target}をつけました。", "off": "{target}を消しました。", "open": "{target}を開けました。", "close": "{target}を閉めました。", "lock": "{target}をロックしました。"},
+    "ko": {"on": "{target}을(를) 켰습니다.", "off": "{target}을(를) 껐습니다.", "open": "{target}을(를) 열었습니다.", "close": "{target}을(를) 닫았습니다.", "lock": "{target}을(를) 잠갔습니다."},
+}
+
+COMPILED_PATTERNS: dict[str, list[tuple[str, re.Pattern]]] = {
+    language: [(intent, re.compile(pattern)) for intent, pattern in patterns] for language, patterns in COMMAND_PATTERNS.items()
+}
+DOMAIN_BY_WORD: dict[str, dict[str, str]] = {
+    language: {word: domain for domain, words in DOMAIN_WORDS.items() for word in words.get(language, ())} for language in COMMAND_PATTERNS
+}
+
+
+class FastPathCommand:
+    """A command recognized locally."""
+    __slots__ = ("intent", "language", "targets", "reply")
+
+    def __init__(self, intent: str, language: str, targets: dict[tuple[str, str], list[str]], reply: str) -> None:
+        """Initialize the command.
+
+        Args:
+            intent (str): Recognized intent (on, off, open, close, lock).
+            language (str): Language of the command.
+            targets (dict[tuple[str, str], list[str]]): Entity IDs to act on, per (domain, service).
+            reply (str): Spoken reply once the command is executed.
+        """
+        self.intent: str = intent
+        self.language: str = language
+        self.targets: dict[tuple[str, str], list[str]] = targets
+        self.reply: str = reply
+
+
+class FastPathMatcher:
+    """Recognizes VERB + ENTITY commands in the supported languages.
+
+    A command is only recognized if its target resolves unambiguously, either to a
+    single entity by its friendly name, or to the entities of one domain in an area
+    ("kitchen lights"). Everything else is left to the Perplexity API.
+    """
+
+    def __init__(self, hass: HomeAssistant, index: EntitiesSummaryIndex) -> None:
+        """Initialize the matcher.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            index (EntitiesSummaryIndex): Entities index providing the name and room lookups.
+        """
+        self.hass: HomeAssistant = hass
+        self._index: EntitiesSummaryIndex = index
+        self.matched: int = 0
+        self.missed: int = 0
+        self.ambiguous: int = 0
+        self._match_time: float = 0.0       # Total time spent matching, in milliseconds
+        self._execution_time: float = 0.0   # Total time spent executing matched commands, in milliseconds
+        self._executions: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Return the fast path counters."""
+        total = self.matched + self.missed + self.ambiguous
+        return {
+            "matched": self.matched,
+            "missed": self.missed,
+            "ambiguous": self.ambiguous,
+            "rate": round(100 * self.matched / total, 1) if total else 0.0,
+            "average_match_ms": round(self._match_time / total, 3) if total else 0.0,
+            "average_execution_ms": round(self._execution_time / self._executions, 1) if self._executions else 0.0,
+        }
+
+    def record_execution(self, duration: float) -> None:
+        """Record the duration of a command executed through the fast path.
+
+        Args:
+            duration (float): Duration in milliseconds.
+        """
+        self._execution_time += duration
+        self._executions += 1
+
+    def match(self, text: str, languages: list[str]) -> FastPathCommand | None:
+        """Recognize a command.
+
+        Args:
+            text (str): User prompt.
+            languages (list[str]): Languages to try, in order.
+        Returns:
+            FastPathCommand | None: The command, or None if it must go through the API.
+        """
+        if not self._index.started:
+            self._index.async_start()
+
+        start = time.perf_counter()
+        try:
+            return self._match(text, languages)
+        finally:
+            self._match_time += (time.perf_counter() - start) * 1000
+
+    def _match(self, text: str, languages: list[str]) -> FastPathCommand | None:
+        """Recognize a command and update the counters (see match)."""
+        sentence = " ".join(text.lower().split()).rstrip(".!?。！？")
+        recognized = False
+
+        for language in dict.fromkeys(languages):
+            for intent, pattern in COMPILED_PATTERNS.get(language, []):
+                if not (found := pattern.match(sentence)):
+                    continue
+
+                recognized = True
+                spoken, entity_ids = self._resolve_target(found.group("target"), language)
+                targets: dict[tuple[str, str], list[str]] = {}
+                for entity_id in sorted(entity_ids):
+                    domain = entity_id.split(".", 1)[0]
+                    if service := INTENT_SERVICES[intent].get(domain):
+                        targets.setdefault((domain, service), []).append(entity_id)
+
+                if targets and len({domain for domain, _ in targets}) == 1:
+                    self.matched += 1
+                    _LOGGER.debug(f"Fast path command recognized: {intent} {targets} ({language}).")
+                    return FastPathCommand(intent, language, targets, REPLY_TEMPLATES[language][intent].format(target=spoken))
+
+        if recognized:
+            self.ambiguous += 1
+        else:
+            self.missed += 1
+        return None
+
+    def _resolve_target(self, target: str, language: str) -> tuple[str, set[str]]:
+        """Resolve a spoken target to entities.
+
+        Args:
+            target (str): Spoken target, as captured by a command pattern.
+            language (str): Language of the command.
+        Returns:
+            tuple[str, set[str]]: Text to use in the reply and the matching entity IDs (empty if unresolved or ambiguous).
+        """
+        fillers = FILLER_WORDS.get(language, set())
+        spaced = language not in ("zh", "ja")
+        words = [word for word in normalize_name(target).split() if word not in fillers]
+        name = " ".join(words)
+
+        # A single entity by its friendly name
+        for candidate in dict.fromkeys((normalize_name(target), name)):
+            entity_ids = self._index.entities_named(candidate)
+            if len(entity_ids) == 1:
+                entity_id = next(iter(entity_ids))
+                return self._index.name_of(entity_id) or target, entity_ids
+            if entity_ids:
+                return target, set()
+
+        # The entities of one domain in an area ("kitchen lights", "客厅的灯"), longest area names first
+        area_names: list[tuple[str, str]] = sorted(
+            ((normalize_name(area_name), area.id) for area in area_registry.async_get(self.hass).async_list_areas() for area_name in (area.name, *area.aliases)),
+            key=lambda item: -len(item[0]),
+        )
+        for area_name, area_id in area_names:
+            if not area_name or (f" {area_name} " not in f" {name} " if spaced else area_name not in name):
+                continue
+
+            rest = [word for word in name.replace(area_name, " ").split() if word not in fillers]
+            rest_text = " ".join(rest) if spaced else "".join(rest)
+            for filler in fillers if language in ("zh", "ja", "ko") else ():
+                rest_text = rest_text.strip(filler)
+
+            if domain := DOMAIN_BY_WORD[language].get(rest_text):
+                return target, {entity_id for entity_id in self._index.entities_in_room(area_id) if entity_id.startswith(f"{domain}.")}
+            return target, set()
+
+        return target, set()
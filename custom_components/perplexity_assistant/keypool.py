@@ -0,0 +1,186 @@
+"""Pool of Perplexity API keys of a config entry, with load balancing and temporary ejection."""
+import logging
+import time
+
+from collections import deque
+
+from .scheduler import TokenBucket
+
+
+_LOGGER = logging.getLogger(__name__)
+
+STATUS_UNAUTHORIZED: frozenset[int] = frozenset({401, 403})
+STATUS_RATE_LIMITED: int = 429
+EJECTING_STATUSES: frozenset[int] = STATUS_UNAUTHORIZED | {STATUS_RATE_LIMITED}
+THROUGHPUT_WINDOW: float = 60       # in seconds, over which the throughput of a key is reported
+
+
+def redact_key(api_key: str) -> str:
+    """Return an identifier of an API key that can be logged and reported.
+
+    Args:
+        api_key (str): Perplexity API key.
+    Returns:
+        str: e.g. "pplx-…a1b2".
+    """
+    return f"pplx-…{api_key[-4:]}"
+
+
+class ApiKey:
+    """An API key of the pool, with its own rate limit, in-flight requests and counters."""
+    __slots__ = ("key", "key_id", "bucket", "outstanding", "requests", "errors", "rate_limited", "unauthorized", "ejected_until", "last_used", "completed")
+
+    def __init__(self, key: str, key_id: str, rate: float, burst: int) -> None:
+        """Initialize the key.
+
+        Args:
+            key (str): Perplexity API key.
+            key_id (str): Redacted identifier of the key.
+            rate (float): Requests per second allowed with this key (0 for unlimited).
+            burst (int): Requests that may start at once after an idle period.
+        """
+        self.key: str = key
+        self.key_id: str = key_id
+        self.bucket: TokenBucket = TokenBucket(rate, burst)
+        self.outstanding: int = 0       # Requests in flight
+        self.requests: int = 0
+        self.errors: int = 0
+        self.rate_limited: int = 0      # 429 responses
+        self.unauthorized: int = 0      # 401 and 403 responses
+        self.ejected_until: float = 0.0
+        self.last_used: float = 0.0
+        self.completed: deque[float] = deque()  # Completion times of the requests of the last THROUGHPUT_WINDOW
+
+    @property
+    def ejected(self) -> bool:
+        """Return whether the key is temporarily out of the pool."""
+        return time.monotonic() < self.ejected_until
+
+    def throughput(self) -> int:
+        """Return the number of requests completed with the key in the last THROUGHPUT_WINDOW seconds."""
+        threshold = time.monotonic() - THROUGHPUT_WINDOW
+        while self.completed and self.completed[0] < threshold:
+            self.completed.popleft()
+        return len(self.completed)
+
+
+class KeyPool:
+    """Spreads the requests of a config entry over its API keys.
+
+    Each request goes to the usable key with the fewest requests in flight (least outstanding),
+    ties going to the least recently used one, and preferably to a key within its own rate
+    limit. A key answered with 429 is left out until the Retry-After delay (at least
+    rate_limit_ejection) has passed, and a key answered with 401 or 403 for auth_ejection
+    (a single key is never left out).
+    """
+
+    def __init__(self, rate_limit_ejection: float, auth_ejection: float) -> None:
+        """Initialize an empty pool.
+
+        Args:
+            rate_limit_ejection (float): Minimum seconds a rate limited key is left out.
+            auth_ejection (float): Seconds a rejected key is left out.
+        """
+        self.rate_limit_ejection: float = rate_limit_ejection
+        self.auth_ejection: float = auth_ejection
+        self.keys: list[ApiKey] = []
+        self.switches: int = 0          # Requests sent again with another key after a rejection
+
+    @property
+    def available(self) -> int:
+        """Return the number of keys that are not ejected."""
+        return sum(not key.ejected for key in self.keys)
+
+    @property
+    def stats(self) -> dict:
+        """Return the state and counters of each key, by redacted identifier."""
+        now = time.monotonic()
+        return {
+            "keys": {
+                key.key_id: {
+                    "outstanding": key.outstanding,
+                    "requests": key.requests,
+                    "requests_last_minute": key.throughput(),
+                    "errors": key.errors,
+                    "rate_limited": key.rate_limited,
+                    "unauthorized": key.unauthorized,
+                    "ejected_for_s": round(max(0.0, key.ejected_until - now), 1),
+                }
+                for key in self.keys
+            },
+            "available": self.available,
+            "switches": self.switches,
+        }
+
+    def configure(self, api_keys: list[str], rate_limit: float, burst: int) -> None:
+        """Apply the keys and the per-key rate limit of the options. Keys kept keep their state and counters.
+
+        Args:
+            api_keys (list[str]): API keys of the config entry (duplicates are ignored).
+            rate_limit (float): Requests per minute allowed with each key (0 for unlimited).
+            burst (int): Requests that may start at once with a key after an idle period.
+        """
+        if [key.key for key in self.keys] != list(dict.fromkeys(api_keys)):
+            current = {key.key: key for key in self.keys}
+            self.keys = []
+            for api_key in dict.fromkeys(api_keys):
+                key_id = redact_key(api_key)
+                if any(key.key_id == key_id for key in self.keys):
+                    key_id = f"{key_id} ({len(self.keys) + 1})"
+                self.keys.append(current.get(api_key) or ApiKey(api_key, key_id, rate_limit / 60, burst))
+        for key in self.keys:
+            if (rate_limit / 60, burst) != (key.bucket.rate, key.bucket.capacity):
+                key.bucket.configure(rate_limit / 60, burst)
+
+    def acquire(self) -> ApiKey:
+        """Choose the key of a request and count the request in flight. Release it with release.
+
+        Returns:
+            ApiKey: The chosen key (the one back the soonest if every key is ejected).
+        """
+        candidates = sorted((key for key in self.keys if not key.ejected), key=lambda key: (key.outstanding, key.last_used))
+        if not candidates:
+            candidates = [min(self.keys, key=lambda key: key.ejected_until)]
+        # The scheduler already enforces the total rate, so an over-limit key is used when no key has a token left
+        chosen = next((key for key in candidates if key.bucket.try_take() == 0), candidates[0])
+        chosen.outstanding += 1
+        chosen.last_used = time.monotonic()
+        return chosen
+
+    def release(self, key: ApiKey, result: dict | None) -> bool:
+        """Count the outcome of a request, ejecting the key if it was rejected.
+
+        Args:
+            key (ApiKey): Key returned by acquire.
+            result (dict | None): Response or error of the request (None if it was cancelled).
+        Returns:
+            bool: True if the key was rejected and another key is available to send the request again.
+        """
+        key.outstanding = max(0, key.outstanding - 1)
+        if result is None:
+            return False
+
+        key.requests += 1
+        key.completed.append(time.monotonic())
+        key.throughput() # Drops the completions out of the window
+        if "error" not in result:
+            return False
+
+        key.errors += 1
+        status = result.get("status")
+        if status == STATUS_RATE_LIMITED:
+            key.rate_limited += 1
+            duration = max(self.rate_limit_ejection, result.get("retry_after") or 0.0)
+        elif status in STATUS_UNAUTHORIZED:
+            key.unauthorized += 1
+            duration = self.auth_ejection
+        if status not in EJECTING_STATUSES or len(self.keys) < 2:
+            return False
+
+        key.ejected_until = time.monotonic() + duration
+        _LOGGER.warning(f"Perplexity API key {key.key_id} rejected with status {status}, left out of the pool for {duration:.0f}s.")
+
+        if self.available:
+            self.switches += 1
+            return True
+        return False
@@ -0,0 +1,167 @@
+"""Bounded multi-turn memory of the conversations held with the agent."""
+import logging
+import time
+
+from collections import OrderedDict, deque
+
+from .context import CHARS_PER_TOKEN, estimate_tokens
+
+
+_LOGGER = logging.getLogger(__name__)
+
+COMPACTED_TEXT_LENGTH: int = 80     # Characters kept from each side of a compacted turn
+
+
+class ConversationTurn:
+    """One exchange of a conversation: the user prompt and the answer of the agent."""
+    __slots__ = ("user", "assistant", "timestamp")
+
+    def __init__(self, user: str, assistant: str) -> None:
+        """Initialize the turn.
+
+        Args:
+            user (str): User prompt.
+            assistant (str): Answer of the agent.
+        """
+        self.user: str = user
+        self.assistant: str = assistant
+        self.timestamp: float = time.monotonic()
+
+    @property
+    def tokens(self) -> int:
+        """Return the estimated number of tokens of the turn."""
+        return estimate_tokens(self.user) + estimate_tokens(self.assistant)
+
+
+class Conversation:
+    """History of one conversation: a ring buffer of recent turns and a compacted summary of the older ones."""
+
+    def __init__(self) -> None:
+        """Initialize the conversation."""
+        self.turns: deque[ConversationTurn] = deque()
+        self.summary: str = ""
+        self.last_activity: float = time.monotonic()
+
+    @property
+    def characters(self) -> int:
+        """Return the number of characters held by the conversation."""
+        return len(self.summary) + sum(len(turn.user) + len(turn.assistant) for turn in self.turns)
+
+    def compact_oldest(self, max_summary_chars: int) -> None:
+        """Fold the oldest turn into the summary, keeping only the most recent part of the summary.
+
+        Args:
+            max_summary_chars (int): Maximum length of the summary.
+        """
+        turn = self.turns.popleft()
+        self.summary = f"{self.summary} User: {turn.user[:COMPACTED_TEXT_LENGTH]} / You: {turn.assistant[:COMPACTED_TEXT_LENGTH]}.".strip()
+        if len(self.summary) > max_summary_chars:
+            self.summary = "..." + self.summary[-max_summary_chars:]
+
+
+class ConversationMemory:
+    """Per-conversation history with size and age limits, and LRU eviction across conversations."""
+
+    def __init__(self, max_conversations: int) -> None:
+        """Initialize the memory.
+
+        Args:
+            max_conversations (int): Maximum number of conversations kept; the least recently used are dropped first.
+        """
+        self.max_conversations: int = max_conversations
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+
+    @property
+    def stats(self) -> dict:
+        """Return the size of the memory."""
+        conversations = list(self._conversations.values())
+        characters = sum(conversation.characters for conversation in conversations)
+        return {
+            "conversations": len(conversations),
+            "turns": sum(len(conversation.turns) for conversation in conversations),
+            "compacted_conversations": sum(1 for conversation in conversations if conversation.summary),
+            "characters": characters,
+            "estimated_tokens": characters // CHARS_PER_TOKEN,
+        }
+
+    def get_messages(self, conversation_id: str | None, max_age: float) -> list[dict]:
+        """Return the history of a conversation as API messages.
+
+        Args:
+            conversation_id (str | None): Conversation ID.
+            max_age (float): Seconds of inactivity after which a conversation is forgotten.
+        Returns:
+            list[dict]: A system message with the compacted summary (if any), then alternating user and assistant messages.
+        """
+        conversation = self._get(conversation_id, max_age)
+        if conversation is None:
+            return []
+
+        messages: list[dict] = []
+        if conversation.summary:
+            messages.append({"role": "system", "content": f"EARLIER IN THIS CONVERSATION: {conversation.summary}"})
+        for turn in conversation.turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        return messages
+
+    def add_turn(self, conversation_id: str, user: str, assistant: str, max_turns: int, max_age: float, token_budget: int) -> None:
+        """Record a turn, then enforce the limits of the conversation and of the memory.
+        Turns beyond max_turns, or beyond the token budget, are compacted into the summary of the conversation.
+
+        Args:
+            conversation_id (str): Conversation ID.
+            user (str): User prompt.
+            assistant (str): Answer of the agent.
+            max_turns (int): Maximum number of turns kept verbatim.
+            max_age (float): Seconds of inactivity after which a conversation is forgotten.
+            token_budget (int): Approximate maximum number of tokens of the history (summary included).
+        """
+        conversation = self._get(conversation_id, max_age)
+        if conversation is None:
+            conversation = self._conversations[conversation_id] = Conversation()
+
+        conversation.turns.append(ConversationTurn(user, assistant))
+        conversation.last_activity = time.monotonic()
+
+        max_summary_chars = token_budget * CHARS_PER_TOKEN // 4 # A quarter of the budget for the summary
+        while len(conversation.turns) > max_turns:
+            conversation.compact_oldest(max_summary_chars)
+        while len(conversation.turns) > 1 and estimate_tokens(conversation.summary) + sum(turn.tokens for turn in conversation.turns) > token_budget:
+            conversation.compact_oldest(max_summary_chars)
+
+        while len(self._conversations) > self.max_conversations:
+            evicted_id, _ = self._conversations.popitem(last=False)
+            _LOGGER.debug(f"Conversation {evicted_id} evicted from the memory.")
+
+    def forget(self, conversation_id: str) -> None:
+        """Drop a conversation.
+
+        Args:
+            conversation_id (str): Conversation ID.
+        """
+        self._conversations.pop(conversation_id, None)
+
+    def clear(self) -> None:
+        """Drop every conversation."""
+        self._conversations.clear()
+
+    def _get(self, conversation_id: str | None, max_age: float) -> Conversation | None:
+        """Return a conversation if it exists and has not expired, marking it as recently used.
+
+        Args:
+            conversation_id (str | None): Conversation ID.
+            max_age (float): Seconds of inactivity after which a conversation is forgotten.
+        Returns:
+            Conversation | None: The conversation, or None.
+        """
+        conversation = self._conversations.get(conversation_id) if conversation_id else None
+        if conversation is None:
+            return None
+
+        if time.monotonic() - conversation.last_activity > max_age:
+            del self._conversations[conversation_id]
+            return None
+
+        self._conversations.move_to_end(conversation_id)
+        return conversation
@@ -0,0 +1,266 @@
+"""Tolerant decoding of the structured responses of the model: repair of malformed JSON and salvage of its valid parts."""
+import json
+import logging
+import re
+
+from collections import Counter
+from types import NoneType
+from typing import get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+
+
+_LOGGER = logging.getLogger(__name__)
+
+REPAIR_FENCES: str = "fences"                           # Markdown code fences around the document
+REPAIR_SURROUNDING_TEXT: str = "surrounding_text"       # Text before or after the document
+REPAIR_CONTROL_CHARACTERS: str = "control_characters"   # Raw line breaks and tabs inside strings
+REPAIR_INVALID_ESCAPES: str = "invalid_escapes"         # Backslashes not starting a JSON escape sequence
+REPAIR_TRAILING_COMMAS: str = "trailing_commas"
+REPAIR_UNTERMINATED_STRING: str = "unterminated_string" # Top-level string value cut off, kept up to the cut
+REPAIR_INCOMPLETE_MEMBER: str = "incomplete_member"     # Member or list item cut off, left out
+REPAIR_UNCLOSED_BRACKETS: str = "unclosed_brackets"
+REPAIR_MISSING_FIELDS: str = "missing_fields"           # Optional fields absent from the document, set to None
+REPAIR_INVALID_ITEMS: str = "invalid_items"             # List items failing validation, left out
+
+FENCE_START: re.Pattern = re.compile(r"^```[\w-]*[ \t]*\n?")
+FENCE_END: re.Pattern = re.compile(r"\n?[ \t]*```$")
+HIGH_SURROGATE_END: re.Pattern = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}$")     # First half of a character cut in two
+VALID_ESCAPES: str = '"\\/bfnrtu'
+CLOSERS: dict[str, str] = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str) -> tuple[str, list[str]]:
+    """Repair the common defects of a JSON document written by a model.
+    Removes markdown fences, surrounding text and trailing commas, escapes raw control characters
+    and stray backslashes, and completes a document cut off (e.g. by max_tokens): a string value of
+    the top-level object is closed where it was cut, while a cut member of a nested container is left
+    out with the incomplete list item it belongs to, so a truncated value is never taken for a complete one.
+
+    Args:
+        text (str): Document to repair.
+    Returns:
+        tuple[str, list[str]]: The repaired document and the repairs applied (REPAIR_* constants).
+    Raises:
+        ValueError: If the text contains no JSON object or array.
+    """
+    repairs: list[str] = []
+    text = text.strip()
+    if text.startswith("```"):
+        text = FENCE_END.sub("", FENCE_START.sub("", text, count=1), count=1)
+        repairs.append(REPAIR_FENCES)
+
+    start = min((index for index in (text.find("{"), text.find("[")) if index >= 0), default=-1)
+    if start < 0:
+        raise ValueError("No JSON object in the response")
+    if start > 0:
+        repairs.append(REPAIR_SURROUNDING_TEXT)
+
+    out: list[str] = []
+    stack: list[list] = []          # [closing bracket, length of out after the last complete member, expecting a key]
+    in_string = is_key = in_literal = False
+    escape_start = -1               # Index in out of the backslash of a pending escape sequence
+    index = start
+
+    def complete_value() -> None:
+        """Mark the value just written as a complete member of its container."""
+        if stack:
+            stack[-1][1] = len(out)
+
+    def add_repair(repair: str) -> None:
+        if repair not in repairs:
+            repairs.append(repair)
+
+    while index < len(text):
+        char = text[index]
+        index += 1
+
+        if in_string:
+            if escape_start >= 0:
+                out.append(char)
+                if out[escape_start + 1] != "u" or len(out) - escape_start == 6:
+                    escape_start = -1
+            elif char == "\\":
+                if index < len(text) and text[index] not in VALID_ESCAPES:
+                    out.append("\\")
+                    add_repair(REPAIR_INVALID_ESCAPES)
+                else:
+                    escape_start = len(out)
+                out.append(char)
+            elif char == '"':
+                out.append(char)
+                in_string = False
+                if not is_key:
+                    complete_value()
+            elif char < " ":
+                out.append(json.dumps(char)[1:-1])
+                add_repair(REPAIR_CONTROL_CHARACTERS)
+            else:
+                out.append(char)
+            continue
+
+        if in_literal and (char in ",:]}\"" or char.isspace()):
+            in_literal = False
+            complete_value()
+
+        if char == '"':
+            in_string = True
+            is_key = bool(stack) and stack[-1][2]
+            out.append(char)
+        elif char in CLOSERS:
+            out.append(char)
+            stack.append([CLOSERS[char], len(out), char == "{"])
+        elif char in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                add_repair(REPAIR_TRAILING_COMMAS)
+            out.append(stack.pop()[0])
+            complete_value()
+            if not stack:
+                break
+        elif char == ",":
+            out.append(char)
+            stack[-1][2] = stack[-1][0] == "}"
+        elif char == ":":
+            out.append(char)
+            stack[-1][2] = False
+        elif char.isspace():
+            out.append(char)
+        else:
+            in_literal = True
+            out.append(char)
+
+    if text[index:].strip():
+        add_repair(REPAIR_SURROUNDING_TEXT)
+
+    if stack:
+        # Cut off: only a string value of the top-level object is kept incomplete
+        if in_string and not is_key and len(stack) == 1:
+            if escape_start >= 0:
+                del out[escape_start:]
+            if HIGH_SURROGATE_END.search("".join(out[-6:])):
+                del out[-6:]
+            out.append('"')
+            complete_value()
+            repairs.append(REPAIR_UNTERMINATED_STRING)
+        cut = stack[min(1, len(stack) - 1)][1]
+        if "".join(out[cut:]).strip(" \t\r\n,"):
+            repairs.append(REPAIR_INCOMPLETE_MEMBER)
+        del out[cut:]
+        del stack[2:]
+        out.extend(closer for closer, _safe, _key in reversed(stack))
+        repairs.append(REPAIR_UNCLOSED_BRACKETS)
+
+    return "".join(out), repairs
+
+
+def fill_missing_fields(model: type[BaseModel], document: dict) -> bool:
+    """Set the optional fields absent from a document to None, in the items of its lists of models too.
+
+    Args:
+        model (type[BaseModel]): Model of the document.
+        document (dict): Decoded document, modified in place.
+    Returns:
+        bool: True if a field was added.
+    """
+    filled = False
+    for name, field in model.model_fields.items():
+        if name not in document:
+            if NoneType in get_args(field.annotation):
+                document[name] = None
+                filled = True
+            continue
+
+        # Items of a list of models, e.g. Optional[List[Model]]
+        item_models = [
+            item for member in (field.annotation, *get_args(field.annotation)) if get_origin(member) is list
+            for item in get_args(member) if isinstance(item, type) and issubclass(item, BaseModel)
+        ]
+        if item_models and isinstance(document[name], list):
+            for item in document[name]:
+                if isinstance(item, dict):
+                    filled = fill_missing_fields(item_models[0], item) or filled
+    return filled
+
+
+class ResponseRepairer:
+    """Decodes the responses of the model into a pydantic model, repairing and salvaging the malformed ones.
+
+    A response that does not validate is repaired with repair_json, then its optional fields
+    missing (e.g. cut off) are set to None and the list items still failing validation are left out.
+    It fails only if what remains still does not validate.
+    """
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        """Initialize the repairer.
+
+        Args:
+            model (type[BaseModel]): Model of the responses.
+        """
+        self.model: type[BaseModel] = model
+        self.valid: int = 0
+        self.repaired: int = 0
+        self.failed: int = 0
+        self.repairs: Counter[str] = Counter()
+
+    @property
+    def stats(self) -> dict:
+        """Return the number of valid, repaired and failed responses, and of each repair."""
+        return {"valid": self.valid, "repaired": self.repaired, "failed": self.failed, "repairs": dict(self.repairs)}
+
+    def decode(self, text: str) -> tuple[BaseModel, list[str]]:
+        """Decode a response, repairing it if needed.
+
+        Args:
+            text (str): JSON document returned by the model.
+        Returns:
+            tuple[BaseModel, list[str]]: The decoded response and the repairs applied (empty if it was valid).
+        Raises:
+            ValidationError: The original error, if the response cannot be salvaged.
+        """
+        try:
+            decoded = self.model.model_validate_json(text)
+        except ValidationError as error:
+            try:
+                decoded, repairs = self._salvage(text)
+            except ValueError as salvage_error:
+                self.failed += 1
+                _LOGGER.debug(f"Response could not be repaired: {salvage_error}")
+                raise error from None
+            self.repaired += 1
+            self.repairs.update(repairs)
+            return decoded, repairs
+
+        self.valid += 1
+        return decoded, []
+
+    def _salvage(self, text: str) -> tuple[BaseModel, list[str]]:
+        """Repair a response and keep its valid parts.
+
+        Args:
+            text (str): JSON document returned by the model.
+        Returns:
+            tuple[BaseModel, list[str]]: The decoded response and the repairs applied.
+        Raises:
+            ValueError: If nothing valid can be salvaged (ValidationError and JSONDecodeError are ValueErrors).
+        """
+        repaired, repairs = repair_json(text)
+        document = json.loads(repaired)
+        if not isinstance(document, dict):
+            raise ValueError("The response is not a JSON object")
+
+        if fill_missing_fields(self.model, document):
+            repairs.append(REPAIR_MISSING_FIELDS)
+
+        try:
+            return self.model.model_validate(document), repairs
+        except ValidationError as error:
+            locations = [error_details["loc"] for error_details in error.errors()]
+            if not all(len(location) > 1 and isinstance(document.get(location[0]), list) and isinstance(location[1], int) for location in locations):
+                raise
+            for name, position in sorted({location[:2] for location in locations}, reverse=True):
+                del document[name][position]
+            repairs.append(REPAIR_INVALID_ITEMS)
+            return self.model.model_validate(document), repairs
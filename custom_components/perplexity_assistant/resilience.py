@@ -0,0 +1,286 @@
+"""Retries, hedged requests and circuit breaking around the calls to the Perplexity API."""
+import asyncio
+import logging
+import random
+import time
+
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+
+_LOGGER = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES: frozenset[int] = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+STATE_CLOSED: str = "closed"          # Requests go through
+STATE_OPEN: str = "open"              # Requests fail fast (or use the fallback model)
+STATE_HALF_OPEN: str = "half_open"    # One trial request decides whether to close again
+
+
+def is_retryable(result: dict) -> bool:
+    """Tell whether a failed request may succeed if sent again.
+
+    Args:
+        result (dict): Result of the request ({"error", "status", ...} on failure).
+    Returns:
+        bool: True for rate limiting, server errors and connection problems.
+    """
+    if "error" not in result or result.get("partial"):
+        return False
+    status = result.get("status")
+    return status is None or status in RETRYABLE_STATUSES
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    """Return the delay before a retry: exponential backoff with full jitter, at least Retry-After.
+
+    Args:
+        attempt (int): Number of the retry (0 for the first).
+        base (float): Delay of the first retry, in seconds.
+        cap (float): Maximum backoff, in seconds.
+        retry_after (float | None): Delay requested by the server, in seconds.
+    Returns:
+        float: Seconds to wait.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+class LatencyTracker:
+    """Sliding window of the latencies of successful requests."""
+
+    def __init__(self, window: int) -> None:
+        """Initialize the tracker.
+
+        Args:
+            window (int): Number of latencies kept.
+        """
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        """Return the number of latencies kept."""
+        return len(self._samples)
+
+    def add(self, latency: float) -> None:
+        """Record the latency of a request, in seconds."""
+        self._samples.append(latency)
+
+    def percentile(self, percent: float) -> float | None:
+        """Return a percentile of the recorded latencies, in seconds (None without samples)."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class CircuitBreaker:
+    """Stops sending requests after consecutive failures, then lets a trial request through after a recovery time."""
+
+    def __init__(self, failure_threshold: int, recovery_time: float) -> None:
+        """Initialize the breaker, closed.
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the breaker.
+            recovery_time (float): Seconds the breaker stays open before a trial request.
+        """
+        self.failure_threshold: int = failure_threshold
+        self.recovery_time: float = recovery_time
+        self.failures: int = 0
+        self.opened: int = 0      # Times the breaker opened
+        self._opened_at: float | None = None
+        self._trial_at: float | None = None   # Start of the trial request, when half open
+
+    @property
+    def state(self) -> str:
+        """Return the state of the breaker."""
+        if self._opened_at is None:
+            return STATE_CLOSED
+        if time.monotonic() - self._opened_at >= self.recovery_time:
+            return STATE_HALF_OPEN
+        return STATE_OPEN
+
+    def allow(self) -> bool:
+        """Tell whether a request may be sent (a single trial request when half open)."""
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        # A trial request that never reported back (cancelled) does not block the breaker forever
+        if state == STATE_HALF_OPEN and (self._trial_at is None or time.monotonic() - self._trial_at >= self.recovery_time):
+            self._trial_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Record a successful request, closing the breaker."""
+        if self._opened_at is not None:
+            _LOGGER.info("Perplexity API is healthy again, circuit breaker closed.")
+        self.failures = 0
+        self._opened_at = None
+        self._trial_at = None
+
+    def record_failure(self) -> None:
+        """Record a failed request, opening the breaker after too many consecutive failures (or a failed trial)."""
+        self.failures += 1
+        if self._trial_at is not None or (self._opened_at is None and self.failures >= self.failure_threshold):
+            if self._opened_at is None:
+                self.opened += 1
+                _LOGGER.warning(f"Perplexity API failed {self.failures} times in a row, circuit breaker opened for {self.recovery_time}s.")
+            self._opened_at = time.monotonic()
+        self._trial_at = None
+
+
+class ResilientCaller:
+    """Sends requests with retries and optional hedging, one circuit breaker per model.
+
+    When the breaker of the requested model is open, the request goes to its fallback model
+    (a cheaper one) if that model is healthy, else it fails immediately.
+    """
+
+    def __init__(self, fallbacks: dict[str, str], failure_threshold: int, recovery_time: float, base_delay: float, max_delay: float, latency_window: int, hedge_min_samples: int) -> None:
+        """Initialize the caller.
+
+        Args:
+            fallbacks (dict[str, str]): Fallback model of each model.
+            failure_threshold (int): Consecutive failures that open the breaker of a model.
+            recovery_time (float): Seconds a breaker stays open before a trial request.
+            base_delay (float): Backoff of the first retry, in seconds.
+            max_delay (float): Maximum delay of a retry (Retry-After included); longer waits give up instead.
+            latency_window (int): Number of latencies used to compute the hedging threshold.
+            hedge_min_samples (int): Latencies needed before requests are hedged.
+        """
+        self.fallbacks: dict[str, str] = fallbacks
+        self.failure_threshold: int = failure_threshold
+        self.recovery_time: float = recovery_time
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.hedge_min_samples: int = hedge_min_samples
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.latency: LatencyTracker = LatencyTracker(latency_window)
+
+        self.retries: int = 0
+        self.hedges: int = 0
+        self.hedge_wins: int = 0    # Hedged requests that answered first
+        self.fallbacks_used: int = 0
+        self.rejected: int = 0      # Requests failed fast by an open breaker
+
+    @property
+    def state(self) -> str:
+        """Return the worst state among the breakers."""
+        states = {breaker.state for breaker in self.breakers.values()}
+        for state in (STATE_OPEN, STATE_HALF_OPEN):
+            if state in states:
+                return state
+        return STATE_CLOSED
+
+    @property
+    def stats(self) -> dict:
+        """Return the breaker states and the retry counters."""
+        p95 = self.latency.percentile(95)
+        return {
+            "state": self.state,
+            "breakers": {model: breaker.state for model, breaker in self.breakers.items()},
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks_used,
+            "rejected": self.rejected,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Return the circuit breaker of a model."""
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(self.failure_threshold, self.recovery_time)
+        return self.breakers[model]
+
+    async def async_call(self, send: Callable[[dict], Awaitable[dict]], payload: dict, max_retries: int, hedge: bool = False, fallback: bool = True) -> dict:
+        """Send a request, retrying transient failures.
+
+        Args:
+            send (Callable[[dict], Awaitable[dict]]): Sends a payload, returning the response or {"error", "status", "retry_after"}.
+            payload (dict): The request body.
+            max_retries (int): Maximum number of retries after the first attempt.
+            hedge (bool): Whether to send a second request when the first is slower than the p95 latency.
+            fallback (bool): Whether to use the fallback model while the breaker of the model is open.
+        Returns:
+            dict: The response, or the last error.
+        """
+        model = payload.get("model", "")
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            fallback_model = self.fallbacks.get(model) if fallback else None
+            if fallback_model is None or not self.breaker(fallback_model).allow():
+                self.rejected += 1
+                return {"error": "Perplexity API temporarily unavailable (circuit breaker open).", "status": None, "retry_after": None}
+            _LOGGER.info(f"Model {model} is unhealthy, falling back to {fallback_model}.")
+            self.fallbacks_used += 1
+            payload = {**payload, "model": fallback_model}
+            breaker = self.breaker(fallback_model)
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            result = await (self._async_hedged(send, payload) if hedge else send(payload))
+
+            if "error" not in result:
+                breaker.record_success()
+                self.latency.add(time.monotonic() - start)
+                return result
+            if not is_retryable(result):
+                # The API answered (bad request, authentication...): it is healthy, the request is not
+                breaker.record_success() if result.get("status") is not None else breaker.record_failure()
+                return result
+
+            breaker.record_failure()
+            if attempt >= max_retries or breaker.state != STATE_CLOSED:
+                return result
+
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay, result.get("retry_after"))
+            if delay > self.max_delay:
+                _LOGGER.warning(f"Perplexity API asked to retry in {delay:.0f}s, giving up.")
+                return result
+
+            attempt += 1
+            self.retries += 1
+            _LOGGER.debug(f"Retrying Perplexity API request in {delay:.2f}s (attempt {attempt + 1}, {result['error']}).")
+            await asyncio.sleep(delay)
+
+    async def _async_hedged(self, send: Callable[[dict], Awaitable[dict]], payload: dict) -> dict:
+        """Send a request, and a second identical one if the first is slower than the p95 latency.
+        The first successful response wins and the other request is cancelled.
+
+        Args:
+            send (Callable[[dict], Awaitable[dict]]): Sends a payload.
+            payload (dict): The request body.
+        Returns:
+            dict: The first successful response, or an error if both failed.
+        """
+        threshold = self.latency.percentile(95) if len(self.latency) >= self.hedge_min_samples else None
+        if threshold is None:
+            return await send(payload)
+
+        first = asyncio.ensure_future(send(payload))
+        pending: set[asyncio.Future] = {first}
+        result: dict = {}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=threshold)
+            if done:
+                return first.result()
+
+            self.hedges += 1
+            _LOGGER.debug(f"No response after {threshold * 1000:.0f}ms (p95), sending a hedged request.")
+            second = asyncio.ensure_future(send(payload))
+            pending.add(second)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None and pending:
+                        continue # The other request may still succeed
+                    result = task.result()
+                    if "error" not in result:
+                        self.hedge_wins += task is second
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,191 @@
+"""Local routing of each prompt to the fastest model able to answer it."""
+import json
+import logging
+import re
+
+from collections import deque
+
+
+_LOGGER = logging.getLogger(__name__)
+_DECISIONS_LOGGER = logging.getLogger(f"{__name__}.decisions") # One JSON line per routed request, for offline evaluation
+
+CLASS_ACTION: str = "action"       # Device command, answered from the home context
+CLASS_SIMPLE: str = "simple"       # Short question
+CLASS_SEARCH: str = "search"       # Needs fresh information from the web
+CLASS_COMPLEX: str = "complex"     # Explanation, comparison, planning, long prompt
+CLASS_RESEARCH: str = "research"   # Explicit request for an in-depth report
+CLASSES: list[str] = [CLASS_ACTION, CLASS_SIMPLE, CLASS_SEARCH, CLASS_COMPLEX, CLASS_RESEARCH]
+
+ACTION_VERBS: set[str] = {
+    "turn", "switch", "set", "open", "close", "lock", "dim", "brighten", "start", "stop", "play", "pause", "activate", "deactivate", "enable", "disable",
+    "allume", "éteins", "eteins", "ouvre", "ferme", "mets", "lance", "schalte", "mach", "öffne", "schließe", "enciende", "apaga", "abre", "cierra",
+}
+SEARCH_CUES: re.Pattern = re.compile(
+    r"\b(news|weather|forecast|latest|today's|tonight|tomorrow|score|who won|stock|price|traffic|search|look up|recipe|"
+    r"météo|actualités|wetter|nachrichten|noticias|tiempo)\b"
+)
+COMPLEX_CUES: re.Pattern = re.compile(
+    r"\b(why|explain|compare|analy[sz]e|plan|should i|pros and cons|step by step|calculate|summari[sz]e|recommend|"
+    r"pourquoi|explique|warum|erkläre|por qué|explica)\b"
+)
+RESEARCH_CUES: re.Pattern = re.compile(r"\b(research|in-depth|in depth|detailed report|comprehensive|thorough)\b")
+COMPLEX_MIN_WORDS: int = 40         # Longer prompts are treated as complex
+ACTION_MAX_WORDS: int = 20          # Longer commands usually ask for more than an action
+
+ROUTES: dict[str, list[str]] = {    # Models able to answer each class of prompt
+    CLASS_ACTION: ["sonar"],
+    CLASS_SIMPLE: ["sonar"],
+    CLASS_SEARCH: ["sonar", "sonar-pro"],
+    CLASS_COMPLEX: ["sonar-reasoning", "sonar-reasoning-pro"],
+    CLASS_RESEARCH: ["sonar-deep-research"],
+}
+MODEL_RANK: dict[str, int] = {      # Models are never routed above the configured one
+    "sonar": 1,
+    "sonar-pro": 2,
+    "sonar-reasoning": 2,
+    "sonar-reasoning-pro": 3,
+    "sonar-deep-research": 4,
+}
+LATENCY_PRIOR: dict[str, float] = { # in seconds, until latencies are observed
+    "sonar": 1.5,
+    "sonar-pro": 3.0,
+    "sonar-reasoning": 5.0,
+    "sonar-reasoning-pro": 8.0,
+    "sonar-deep-research": 120.0,
+}
+SMOOTHING: float = 0.2              # Weight of a new observation in the latency and cost averages
+
+
+def classify(prompt: str) -> str:
+    """Classify a prompt with cheap local heuristics.
+
+    Args:
+        prompt (str): The user prompt.
+    Returns:
+        str: One of CLASSES.
+    """
+    text = prompt.lower()
+    words = text.split()
+    if RESEARCH_CUES.search(text):
+        return CLASS_RESEARCH
+    if words and words[0].strip(",.!") in ACTION_VERBS and len(words) <= ACTION_MAX_WORDS and "?" not in text:
+        return CLASS_ACTION
+    if SEARCH_CUES.search(text):
+        return CLASS_SEARCH
+    if len(words) > COMPLEX_MIN_WORDS or COMPLEX_CUES.search(text) or text.count("?") > 1:
+        return CLASS_COMPLEX
+    return CLASS_SIMPLE
+
+
+class RouteDecision:
+    """Model and web search setting chosen for a request."""
+    __slots__ = ("prompt_class", "words", "model", "search", "configured_model", "expected_latency")
+
+    def __init__(self, prompt_class: str, words: int, model: str, search: bool, configured_model: str, expected_latency: float) -> None:
+        """Initialize the decision.
+
+        Args:
+            prompt_class (str): Class of the prompt.
+            words (int): Length of the prompt in words.
+            model (str): Chosen model.
+            search (bool): Whether web search is enabled for the request.
+            configured_model (str): Model of the configuration (the highest that may be chosen).
+            expected_latency (float): Expected duration of the request with the chosen model, in seconds.
+        """
+        self.prompt_class: str = prompt_class
+        self.words: int = words
+        self.model: str = model
+        self.search: bool = search
+        self.configured_model: str = configured_model
+        self.expected_latency: float = expected_latency
+
+
+class ModelRouter:
+    """Routes each prompt to the fastest model adequate for its class, no higher than the configured model.
+
+    The latency and cost of each model are learned from the responses (exponential moving
+    averages), starting from priors. Web search is only kept for the prompts that need it.
+    """
+
+    def __init__(self, pricing: dict[str, dict[str, float]], recent: int) -> None:
+        """Initialize the router.
+
+        Args:
+            pricing (dict[str, dict[str, float]]): Price of each model (its request price is the prior cost).
+            recent (int): Number of decisions and outcomes kept for the diagnostics.
+        """
+        self.latency: dict[str, float] = dict(LATENCY_PRIOR)                                # seconds
+        self.cost: dict[str, float] = {model: price["request"] for model, price in pricing.items()}
+        self.observed: dict[str, int] = {}
+        self.decisions: dict[str, dict[str, int]] = {}                                      # class -> model -> count
+        self.errors: int = 0
+        self._recent: deque[dict] = deque(maxlen=recent)
+
+    @property
+    def stats(self) -> dict:
+        """Return the learned latency and cost per model, the decisions per class and the recent outcomes."""
+        return {
+            "models": {
+                model: {"latency_s": round(latency, 2), "cost": round(self.cost.get(model, 0.0), 6), "observed": self.observed.get(model, 0)}
+                for model, latency in self.latency.items()
+            },
+            "decisions": self.decisions,
+            "errors": self.errors,
+            "recent": list(reversed(self._recent)),
+        }
+
+    def route(self, prompt: str, configured_model: str, search_allowed: bool) -> RouteDecision:
+        """Choose the model and the web search setting of a request.
+
+        Args:
+            prompt (str): The user prompt.
+            configured_model (str): Model of the configuration.
+            search_allowed (bool): Whether web search is enabled for the request (it is never enabled by the router).
+        Returns:
+            RouteDecision: The decision.
+        """
+        prompt_class = classify(prompt)
+        ceiling = MODEL_RANK.get(configured_model, max(MODEL_RANK.values()))
+        candidates = [model for model in ROUTES[prompt_class] if MODEL_RANK[model] <= ceiling] or [configured_model]
+        model = min(candidates, key=lambda model: (self.latency.get(model, float("inf")), self.cost.get(model, float("inf"))))
+        search = search_allowed and prompt_class in (CLASS_SEARCH, CLASS_RESEARCH)
+
+        self.decisions.setdefault(prompt_class, {}).setdefault(model, 0)
+        self.decisions[prompt_class][model] += 1
+        _LOGGER.debug(f"Prompt routed to {model} (class={prompt_class}, search={search}, configured model={configured_model}).")
+        return RouteDecision(prompt_class, len(prompt.split()), model, search, configured_model, self.latency.get(model, 0.0))
+
+    def record(self, decision: RouteDecision, model: str, latency: float, cost: float, error: str | None = None) -> None:
+        """Learn from the outcome of a routed request, and log the decision with its outcome.
+
+        Args:
+            decision (RouteDecision): The decision of route.
+            model (str): Model that answered (a fallback model may have replaced the chosen one).
+            latency (float): Duration of the request in seconds.
+            cost (float): Billed cost.
+            error (str | None): The error of the request, if it failed (nothing is learned then).
+        """
+        if error is None:
+            self.observed[model] = self.observed.get(model, 0) + 1
+            previous = self.latency.get(model)
+            self.latency[model] = latency if previous is None else previous + SMOOTHING * (latency - previous)
+            if cost:
+                previous = self.cost.get(model)
+                self.cost[model] = cost if previous is None else previous + SMOOTHING * (cost - previous)
+        else:
+            self.errors += 1
+
+        outcome = {
+            "class": decision.prompt_class,
+            "words": decision.words,
+            "configured_model": decision.configured_model,
+            "model": decision.model,
+            "answered_by": model,
+            "search": decision.search,
+            "expected_latency_s": round(decision.expected_latency, 3),
+            "latency_s": round(latency, 3),
+            "cost": cost,
+            "error": error,
+        }
+        self._recent.append(outcome)
+        _DECISIONS_LOGGER.debug(json.dumps(outcome))
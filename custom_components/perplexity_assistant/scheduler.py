@@ -0,0 +1,230 @@
+"""Rate limiting and prioritization of the requests sent to the Perplexity API."""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_VOICE: int = 0         # Conversations (voice and chat), someone is waiting for the answer
+PRIORITY_AUTOMATION: int = 1    # Service calls from automations and scripts
+PRIORITY_NAMES: dict[int, str] = {PRIORITY_VOICE: "voice", PRIORITY_AUTOMATION: "automation"}
+
+LANE_DEFAULT: str = "default"
+LANE_DEEP_RESEARCH: str = "deep_research"   # Long-running requests, kept from occupying the default lane
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited longer than the queue deadline."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """Initialize the bucket, full.
+
+        Args:
+            rate (float): Tokens added per second (0 for unlimited).
+            capacity (float): Maximum number of tokens (burst size).
+        """
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self._tokens: float = capacity
+        self._updated: float = time.monotonic()
+
+    def configure(self, rate: float, capacity: float) -> None:
+        """Change the rate and capacity, keeping the current tokens (up to the new capacity).
+
+        Args:
+            rate (float): Tokens added per second (0 for unlimited).
+            capacity (float): Maximum number of tokens.
+        """
+        self._refill()
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = min(self._tokens, capacity)
+
+    def try_take(self) -> float:
+        """Take a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until the next token is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class _Waiter:
+    """A request waiting for a slot."""
+    __slots__ = ("priority", "future", "enqueued")
+
+    def __init__(self, priority: int, future: asyncio.Future) -> None:
+        self.priority: int = priority
+        self.future: asyncio.Future = future
+        self.enqueued: float = time.monotonic()
+
+
+class _Lane:
+    """Priority queue and concurrency limit of one class of requests."""
+
+    def __init__(self, max_concurrent: int) -> None:
+        self.max_concurrent: int = max_concurrent
+        self.active: int = 0
+        self.queue: list[tuple[int, int, _Waiter]] = []    # (priority, sequence, waiter) heap
+
+
+class RequestScheduler:
+    """Per config entry scheduler: a token-bucket rate limit shared by every request, and lanes with bounded concurrency.
+
+    Within a lane, waiting requests are started by priority (voice before automations), then in
+    arrival order. Deep research requests have their own lane, so they never hold the slots of
+    the quick requests.
+    """
+
+    def __init__(self, rate_limit: float, burst: int, max_concurrent: int, deep_research_concurrent: int, queue_deadline: float) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            rate_limit (float): Requests per minute (0 for unlimited).
+            burst (int): Requests that may start at once after an idle period.
+            max_concurrent (int): Requests running at the same time in the default lane.
+            deep_research_concurrent (int): Requests running at the same time in the deep research lane.
+            queue_deadline (float): Seconds after which a waiting request is rejected (0 to wait indefinitely).
+        """
+        self.queue_deadline: float = queue_deadline
+        self._bucket: TokenBucket = TokenBucket(rate_limit / 60, burst)
+        self._lanes: dict[str, _Lane] = {LANE_DEFAULT: _Lane(max_concurrent), LANE_DEEP_RESEARCH: _Lane(deep_research_concurrent)}
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+        self._started: dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self._wait_time: dict[str, float] = {name: 0.0 for name in PRIORITY_NAMES.values()}  # Total, in milliseconds
+        self._max_wait: float = 0.0
+        self._rejected: int = 0
+
+    @property
+    def stats(self) -> dict:
+        """Return the queue depth, running requests and wait times."""
+        started = sum(self._started.values())
+        return {
+            "queued": sum(len(lane.queue) for lane in self._lanes.values()),
+            "running": sum(lane.active for lane in self._lanes.values()),
+            "lanes": {name: {"queued": len(lane.queue), "running": lane.active} for name, lane in self._lanes.items()},
+            "started": started,
+            "rejected": self._rejected,
+            "average_wait_ms": round(sum(self._wait_time.values()) / started, 1) if started else 0.0,
+            "max_wait_ms": round(self._max_wait, 1),
+            "average_wait_ms_by_priority": {
+                name: round(self._wait_time[name] / count, 1) if count else 0.0 for name, count in self._started.items()
+            },
+        }
+
+    def configure(self, rate_limit: float, burst: int, max_concurrent: int, queue_deadline: float) -> None:
+        """Apply new settings; waiting requests are re-evaluated.
+
+        Args:
+            rate_limit (float): Requests per minute (0 for unlimited).
+            burst (int): Requests that may start at once after an idle period.
+            max_concurrent (int): Requests running at the same time in the default lane.
+            queue_deadline (float): Seconds after which a waiting request is rejected (0 to wait indefinitely).
+        """
+        if (rate_limit / 60, burst) != (self._bucket.rate, self._bucket.capacity):
+            self._bucket.configure(rate_limit / 60, burst)
+        self._lanes[LANE_DEFAULT].max_concurrent = max_concurrent
+        self.queue_deadline = queue_deadline
+        self._dispatch()
+
+    @asynccontextmanager
+    async def async_slot(self, priority: int, lane: str = LANE_DEFAULT) -> AsyncIterator[None]:
+        """Wait for the permission to send a request, and hold a slot of the lane until the block exits.
+
+        Args:
+            priority (int): PRIORITY_VOICE or PRIORITY_AUTOMATION.
+            lane (str): LANE_DEFAULT or LANE_DEEP_RESEARCH.
+        Raises:
+            QueueTimeoutError: If the queue deadline passed before a slot was available.
+        """
+        await self._async_acquire(priority, lane)
+        try:
+            yield
+        finally:
+            self._lanes[lane].active -= 1
+            self._dispatch()
+
+    async def _async_acquire(self, priority: int, lane: str) -> None:
+        """Queue a request and wait until it may start.
+
+        Args:
+            priority (int): Priority of the request (lower starts first).
+            lane (str): Lane of the request.
+        Raises:
+            QueueTimeoutError: If the queue deadline passed before a slot was available.
+        """
+        waiter = _Waiter(priority, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._lanes[lane].queue, (priority, next(self._sequence), waiter))
+        self._dispatch()
+
+        try:
+            async with asyncio.timeout(self.queue_deadline or None):
+                await asyncio.shield(waiter.future)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Started at the same time: give the slot back
+                self._lanes[lane].active -= 1
+                self._dispatch()
+            else:
+                waiter.future.cancel()
+                self._remove(lane, waiter)
+            if isinstance(e, TimeoutError):
+                self._rejected += 1
+                raise QueueTimeoutError(f"No request slot available within {self.queue_deadline}s") from e
+            raise
+
+        wait = (time.monotonic() - waiter.enqueued) * 1000
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self._started[name] = self._started.get(name, 0) + 1
+        self._wait_time[name] = self._wait_time.get(name, 0.0) + wait
+        self._max_wait = max(self._max_wait, wait)
+        if wait > 1000:
+            _LOGGER.debug(f"Request ({name}, {lane}) waited {wait:.0f}ms in the queue.")
+
+    def _remove(self, lane: str, waiter: _Waiter) -> None:
+        """Remove a waiter from the queue of its lane."""
+        queue = self._lanes[lane].queue
+        queue[:] = [item for item in queue if item[2] is not waiter]
+        heapq.heapify(queue)
+
+    def _dispatch(self) -> None:
+        """Start the waiting requests for which a slot and a token are available."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        for lane in self._lanes.values():
+            while lane.queue and lane.active < lane.max_concurrent:
+                wait = self._bucket.try_take()
+                if wait > 0:
+                    # Out of tokens: try again when the next one is available
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                    return
+                _, _, waiter = heapq.heappop(lane.queue)
+                lane.active += 1
+                waiter.future.set_result(None)
@@ -1,153 +1,297 @@
-"""Sensor platform for Perplexity Assistant credits.
+"""Sensor platform for Perplexity Assistant.
 
-This creates a sensor that (placeholder) would fetch remaining credits or usage
-from the Perplexity API. Since the public API for credits may not be available
-or documented, this implementation uses a dummy value and is structured so it
-can be easily extended later.
+The cost and usage sensors read the usage ledger of the agent, the other
+sensors its runtime statistics. All of them refresh at a fixed interval.
 """
 from __future__ import annotations
 
 import logging
 
+from abc import abstractmethod
 from datetime import datetime, timedelta
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN
+from .const import DOMAIN, STATS_REFRESH_INTERVAL
+from .resilience import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
 
 
 _LOGGER = logging.getLogger(__name__)
 SCAN_INTERVAL = timedelta(hours=1)
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    """Set up the Perplexity credit sensor from a config entry."""
-    monthly_bill_sensor = MonthlyBillSensor(hass, entry.entry_id)
-    alltime_bill_sensor = AlltimeBillSensor(hass, entry.entry_id)
-    async_add_entities([monthly_bill_sensor, alltime_bill_sensor])
-    
-    hass.data.setdefault("perplexity_assistant_sensors", {})["monthly_bill_sensor"] = monthly_bill_sensor
-    hass.data.setdefault("perplexity_assistant_sensors", {})["alltime_bill_sensor"] = alltime_bill_sensor
+    """Set up the Perplexity sensors from a config entry.
+    The bill and usage sensors are only created when requested by the config entry, the others always are.
+    """
+    agent = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if agent:
+        if entry.data.get("create_credit_sensor"):
+            async_add_entities([MonthlyBillSensor(hass, entry.entry_id, agent), AlltimeBillSensor(hass, entry.entry_id, agent), UsageTodaySensor(hass, entry.entry_id, agent)])
+        async_add_entities([ResponseCacheSensor(hass, entry.entry_id, agent), FastPathSensor(hass, entry.entry_id, agent), RequestQueueSensor(hass, entry.entry_id, agent)])
+        async_add_entities([CircuitBreakerSensor(hass, entry.entry_id, agent), RetrySensor(hass, entry.entry_id, agent)])
+        async_add_entities([RequestLatencySensor(hass, entry.entry_id, agent, 50), RequestLatencySensor(hass, entry.entry_id, agent, 95), TokensSensor(hass, entry.entry_id, agent)])
     
 
-class MonthlyBillSensor(SensorEntity, RestoreEntity):
-    """Sensor representing remaining Perplexity credits (placeholder)."""
-    _attr_icon = "mdi:robot"
-    _attr_native_unit_of_measurement = "$"
-    
-    _attr_name = "Monthly Cost"
+class PerplexityStatsSensor(SensorEntity):
+    """Base class of the sensors exposing runtime statistics of the Perplexity agent.
+    Statistics are read from the agent at a fixed interval instead of being pushed on every request.
+    """
+    _attr_icon = "mdi:chart-line"
     _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
 
-    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent, key: str) -> None:
+        """Initialize the statistics sensor.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            entry_id (str): Configuration entry ID.
+            agent (PerplexityAgent): Agent the statistics are read from.
+            key (str): Unique key of the statistic.
+        """
         self.hass = hass
         self._entry_id = entry_id
-        self._attr_unique_id = f"{DOMAIN}_perplexity_monthly_bill"
-        self._attr_native_value = 0.0
-        self._last_reset = datetime.now().replace(day=1, hour=0, minute=0, second=0)
+        self._agent = agent
+        self._attr_unique_id = f"{entry_id}_perplexity_{key}"
+
+    async def async_added_to_hass(self):
+        """Start refreshing the statistic."""
+        self.async_on_remove(async_track_time_interval(self.hass, self._async_refresh, timedelta(seconds=STATS_REFRESH_INTERVAL)))
+        self._update_from_agent()
+
+    async def _async_refresh(self, _now: datetime) -> None:
+        """Refresh the statistic and write the new state."""
+        self._update_from_agent()
+        self.async_write_ha_state()
+
+    @abstractmethod
+    def _update_from_agent(self) -> None:
+        """Read the statistic from the agent."""
+
+
+class MonthlyBillSensor(PerplexityStatsSensor, RestoreEntity):
+    """Sensor representing the cost of the requests of the current month, read from the usage ledger."""
+    _attr_icon = "mdi:robot"
+    _attr_native_unit_of_measurement = "$"
+    _attr_name = "Perplexity Monthly Bill"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the monthly bill sensor."""
+        super().__init__(hass, entry_id, agent, "monthly_bill")
 
     async def async_added_to_hass(self):
-        """Restore previous state when HA restarts."""
+        """Import the cost counted by the sensor before the usage ledger existed, then start refreshing."""
         last_state = await self.async_get_last_state()
-        
-        if last_state and last_state.state not in (None, "unknown", "unavailable"):
+        cost = 0.0
+        if last_state and last_state.state not in (None, "unknown", "unavailable") and "last_reset_month" in (last_state.attributes or {}):
             try:
-                self._attr_native_value = float(last_state.state)
+                last_reset = datetime.fromisoformat(str(last_state.attributes["last_reset_month"]))
+                if (last_reset.year, last_reset.month) == (dt_util.now().year, dt_util.now().month):
+                    cost = float(last_state.state)
             except ValueError:
-                self._attr_native_value = 0.0
-            
-            last_attrs = last_state.attributes or {}
-            
-            if "last_reset_month" in last_attrs:
-                try:
-                    self._last_reset = datetime.fromisoformat(last_attrs["last_reset_month"])
-                except Exception:
-                    _LOGGER.warning("Failed to parse last_reset timestamp")
-        else:
-            self._attr_native_value = 0.0
-            self._last_reset = datetime.now().replace(day=1, hour=0, minute=0, second=0)
-            self._attr_extra_state_attributes = {"last_reset_month": self._last_reset}
-            
-            
-
-    @property
-    def native_value(self) -> float:
-        """Return the native value of the sensor."""
-        return round(self._attr_native_value, 4)
-    
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return f"{self._entry_id}_perplexity_monthly_bill"
-
-    @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        return "Perplexity Monthly Bill"
-
-    def increment_cost(self, cost: float):
-        """Add cost to current month."""
-        if datetime.now().month != self._last_reset.month:
-            self.reset_monthly_cost()
-            
-        self._attr_native_value += cost
-        self.async_write_ha_state()
+                _LOGGER.warning("Failed to restore the previous monthly cost")
+        self._agent.usage.import_cost("month", cost)
+        await super().async_added_to_hass()
 
-    def reset_monthly_cost(self):
-        """Reset at the beginning of each month."""
-        _LOGGER.debug("Resetting Perplexity monthly cost")
-        self._attr_native_value = 0.0
-        self._last_reset = datetime.now().replace(day=1, hour=0, minute=0, second=0)
-        self._attr_extra_state_attributes = {"last_reset_month": self._last_reset}
-        self.async_write_ha_state()
+    def _update_from_agent(self) -> None:
+        """Read the cost of the month from the usage ledger."""
+        month: dict = self._agent.usage.month
+        self._attr_native_value = round(month["cost"], 4)
+        self._attr_extra_state_attributes = {
+            "last_reset_month": dt_util.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+            "requests": month["requests"],
+            "prompt_tokens": month["prompt_tokens"],
+            "completion_tokens": month["completion_tokens"],
+        }
 
 
-class AlltimeBillSensor(SensorEntity, RestoreEntity):
-    """Sensor representing remaining Perplexity credits (placeholder)."""
+class AlltimeBillSensor(PerplexityStatsSensor, RestoreEntity):
+    """Sensor representing the cost of all the requests, with the cost per model, user and caller as attributes."""
     _attr_icon = "mdi:robot"
     _attr_native_unit_of_measurement = "$"
-    
-    _attr_name = "Total Cost"
-    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_name = "Perplexity Bill"
 
-    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
-        """Initialize the All-time Bill Sensor."""
-        self.hass = hass
-        self._entry_id = entry_id
-        self._attr_unique_id = f"{DOMAIN}_perplexity_bill"
-        self._attr_native_value = 0.0
-        self._last_reset = datetime.now().replace(day=1, hour=0, minute=0, second=0)
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the all-time bill sensor."""
+        super().__init__(hass, entry_id, agent, "bill")
 
     async def async_added_to_hass(self):
-        """Restore previous state when HA restarts."""
+        """Import the cost counted by the sensor before the usage ledger existed, then start refreshing."""
         last_state = await self.async_get_last_state()
-        
+        cost = 0.0
         if last_state and last_state.state not in (None, "unknown", "unavailable"):
             try:
-                self._attr_native_value = float(last_state.state)
+                cost = float(last_state.state)
             except ValueError:
-                self._attr_native_value = 0.0
-        else:
-            self._attr_native_value = 0.0
-            
-    @property
-    def native_value(self) -> float:
-        """Return the native value of the sensor."""
-        return round(self._attr_native_value, 4)
-    
-    @property
-    def unique_id(self) -> str:
-        """Return the unique ID of the sensor."""
-        return f"{self._entry_id}_perplexity_bill"
-
-    @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        return "Perplexity Bill"
-
-    def increment_cost(self, cost: float):
-        """Add cost to current cost."""
-        self._attr_native_value += cost
-        self.async_write_ha_state()
\ No newline at end of file
+                _LOGGER.warning("Failed to restore the previous total cost")
+        self._agent.usage.import_cost("total", cost)
+        await super().async_added_to_hass()
+
+    def _update_from_agent(self) -> None:
+        """Read the total cost and its breakdown from the usage ledger."""
+        usage = self._agent.usage
+        self._attr_native_value = round(usage.total["cost"], 4)
+        self._attr_extra_state_attributes = {
+            "requests": usage.total["requests"],
+            **{f"cost_per_{key[:-1]}": {name: round(bucket["cost"], 4) for name, bucket in usage.breakdown(key).items()} for key in ("models", "users", "callers")},
+        }
+
+
+class UsageTodaySensor(PerplexityStatsSensor):
+    """Sensor representing the number of tokens of the requests of the current day."""
+    _attr_icon = "mdi:counter"
+    _attr_native_unit_of_measurement = "tokens"
+    _attr_name = "Perplexity Tokens Today"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the usage sensor."""
+        super().__init__(hass, entry_id, agent, "usage_today")
+
+    def _update_from_agent(self) -> None:
+        """Read the usage of the day from the usage ledger."""
+        today: dict = self._agent.usage.today
+        self._attr_native_value = today["prompt_tokens"] + today["completion_tokens"]
+        self._attr_extra_state_attributes = {
+            "requests": today["requests"],
+            "prompt_tokens": today["prompt_tokens"],
+            "completion_tokens": today["completion_tokens"],
+            "cost": round(today["cost"], 4),
+        }
+
+
+class ResponseCacheSensor(PerplexityStatsSensor):
+    """Sensor representing the hit rate of the response cache."""
+    _attr_icon = "mdi:cached"
+    _attr_native_unit_of_measurement = "%"
+    _attr_name = "Perplexity Response Cache Hit Rate"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the response cache sensor."""
+        super().__init__(hass, entry_id, agent, "response_cache")
+
+    def _update_from_agent(self) -> None:
+        """Read the cache counters from the agent."""
+        stats: dict = self._agent.cache.stats
+        self._attr_native_value = stats["hit_rate"]
+        self._attr_extra_state_attributes = {"hits": stats["hits"], "misses": stats["misses"], "entries": stats["entries"]}
+
+
+class FastPathSensor(PerplexityStatsSensor):
+    """Sensor representing the share of conversation requests handled locally by the fast path."""
+    _attr_icon = "mdi:lightning-bolt"
+    _attr_native_unit_of_measurement = "%"
+    _attr_name = "Perplexity Fast Path Rate"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the fast path sensor."""
+        super().__init__(hass, entry_id, agent, "fast_path")
+
+    def _update_from_agent(self) -> None:
+        """Read the fast path counters from the agent."""
+        stats: dict = self._agent.fast_path.stats
+        self._attr_native_value = stats["rate"]
+        self._attr_extra_state_attributes = {key: value for key, value in stats.items() if key != "rate"}
+
+
+class RequestQueueSensor(PerplexityStatsSensor):
+    """Sensor representing the average time requests wait in the scheduler queue before being sent."""
+    _attr_icon = "mdi:tray-full"
+    _attr_native_unit_of_measurement = "ms"
+    _attr_name = "Perplexity Request Queue Wait"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the request queue sensor."""
+        super().__init__(hass, entry_id, agent, "request_queue")
+
+    def _update_from_agent(self) -> None:
+        """Read the queue metrics from the agent."""
+        stats: dict = self._agent.scheduler.stats
+        self._attr_native_value = stats["average_wait_ms"]
+        self._attr_extra_state_attributes = {key: value for key, value in stats.items() if key != "average_wait_ms"}
+
+
+class CircuitBreakerSensor(PerplexityStatsSensor):
+    """Sensor representing the state of the circuit breakers protecting the Perplexity API calls."""
+    _attr_icon = "mdi:electric-switch"
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_options = [STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN]
+    _attr_name = "Perplexity Circuit Breaker"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the circuit breaker sensor."""
+        super().__init__(hass, entry_id, agent, "circuit_breaker")
+
+    def _update_from_agent(self) -> None:
+        """Read the breaker states from the agent."""
+        stats: dict = self._agent.resilience.stats
+        self._attr_native_value = stats["state"]
+        self._attr_extra_state_attributes = {"breakers": stats["breakers"], "fallbacks": stats["fallbacks"], "rejected": stats["rejected"]}
+
+
+class RetrySensor(PerplexityStatsSensor):
+    """Sensor representing the number of requests to the Perplexity API sent again after a failure."""
+    _attr_icon = "mdi:refresh"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_name = "Perplexity Retries"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the retry sensor."""
+        super().__init__(hass, entry_id, agent, "retries")
+
+    def _update_from_agent(self) -> None:
+        """Read the retry counters from the agent."""
+        stats: dict = self._agent.resilience.stats
+        self._attr_native_value = stats["retries"]
+        self._attr_extra_state_attributes = {"hedges": stats["hedges"], "hedge_wins": stats["hedge_wins"], "p95_latency_ms": stats["p95_latency_ms"]}
+
+
+class RequestLatencySensor(PerplexityStatsSensor):
+    """Sensor representing a percentile of the duration of the recent requests, with the same percentile of each stage as attributes."""
+    _attr_icon = "mdi:timer-outline"
+    _attr_native_unit_of_measurement = "ms"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent, percentile: int) -> None:
+        """Initialize the request latency sensor.
+
+        Args:
+            percentile (int): 50 or 95.
+        """
+        self._percentile = f"p{percentile}"
+        self._attr_name = f"Perplexity Request Latency ({self._percentile})"
+        super().__init__(hass, entry_id, agent, f"latency_{self._percentile}")
+
+    def _update_from_agent(self) -> None:
+        """Read the latency histograms from the agent."""
+        stats: dict = self._agent.tracer.stats
+        self._attr_native_value = stats["latency_ms"][self._percentile]
+        self._attr_extra_state_attributes = {
+            "requests": stats["latency_ms"]["count"],
+            **{f"{stage}_ms": summary[self._percentile] for stage, summary in stats["stages_ms"].items()},
+        }
+
+
+class TokensSensor(PerplexityStatsSensor):
+    """Sensor representing the average number of tokens (prompt and completion) of the recent requests."""
+    _attr_icon = "mdi:counter"
+    _attr_native_unit_of_measurement = "tokens"
+    _attr_name = "Perplexity Tokens per Request"
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, agent) -> None:
+        """Initialize the tokens sensor."""
+        super().__init__(hass, entry_id, agent, "tokens")
+
+    def _update_from_agent(self) -> None:
+        """Read the token histograms from the agent."""
+        tokens: dict = self._agent.tracer.stats["tokens"]
+        self._attr_native_value = tokens["total"]["mean"]
+        self._attr_extra_state_attributes = {
+            f"{kind}_{statistic}": summary[statistic]
+            for kind, summary in tokens.items()
+            for statistic in ("p50", "p95")
+        }
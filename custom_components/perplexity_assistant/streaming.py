@@ -0,0 +1,155 @@
+"""Incremental decoding of streamed Perplexity responses."""
+
+
+SENTENCE_TERMINATORS: str = ".!?…"
+CJK_SENTENCE_TERMINATORS: str = "。！？"
+JSON_ESCAPES: dict[str, str] = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ContentStreamParser:
+    """Extracts the top-level "content" string from a JSON document received in pieces.
+
+    The agent asks Perplexity for a PerplexityAgentResponse JSON object. While it is
+    streamed, the document is incomplete and cannot be parsed, but the characters of
+    its "content" value can already be decoded and spoken.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the parser."""
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._escape: str | None = None         # Pending escape sequence (without the backslash)
+        self._high_surrogate: str | None = None
+        self._expect_value: bool = False
+        self._key: list[str] = []
+        self._last_key: str | None = None
+        self._reading_key: bool = False
+        self._capturing: bool = False
+        self.done: bool = False
+
+    def feed(self, chunk: str) -> str:
+        """Consume a piece of the JSON document.
+
+        Args:
+            chunk (str): Next characters of the document.
+        Returns:
+            str: Newly decoded characters of the "content" value (may be empty).
+        """
+        out: list[str] = []
+
+        for char in chunk:
+            if self._in_string:
+                decoded = self._read_string_char(char)
+                if decoded is None:
+                    continue
+                if self._capturing:
+                    out.append(decoded)
+                elif self._reading_key:
+                    self._key.append(decoded)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_value:
+                    self._capturing = self._last_key == "content" and not self.done
+                elif self._depth == 1:
+                    self._reading_key = True
+                    self._key = []
+            elif char == ":" and self._depth == 1:
+                self._expect_value = True
+            elif char == "," and self._depth == 1:
+                self._expect_value = False
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._expect_value = False
+
+        return "".join(out)
+
+    def _read_string_char(self, char: str) -> str | None:
+        """Decode one character inside a JSON string.
+
+        Args:
+            char (str): Character of the document.
+        Returns:
+            str | None: Decoded text, or None if nothing is produced yet.
+        """
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] != "u":
+                decoded = JSON_ESCAPES.get(self._escape, self._escape)
+                self._escape = None
+                return decoded
+            if len(self._escape) < 5:
+                return None
+
+            code_unit = chr(int(self._escape[1:], 16))
+            self._escape = None
+            if "\ud800" <= code_unit <= "\udbff":
+                self._high_surrogate = code_unit
+                return None
+            if self._high_surrogate is not None:
+                pair, self._high_surrogate = self._high_surrogate + code_unit, None
+                return pair.encode("utf-16", "surrogatepass").decode("utf-16")
+            return code_unit
+
+        if char == "\\":
+            self._escape = ""
+            return None
+
+        if char == '"':
+            self._in_string = False
+            if self._capturing:
+                self._capturing = False
+                self.done = True
+            elif self._reading_key:
+                self._reading_key = False
+                self._last_key = "".join(self._key)
+            else:
+                self._expect_value = False
+            return None
+
+        return char
+
+
+class SentenceSplitter:
+    """Groups streamed text into complete sentences."""
+
+    def __init__(self) -> None:
+        """Initialize the splitter."""
+        self._buffer: str = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Add text and return the sentences it completes.
+
+        A sentence ends with a terminator followed by whitespace (so "21.5" is not split),
+        or with a CJK terminator, which needs no whitespace.
+
+        Args:
+            text (str): Newly received text.
+        Returns:
+            list[str]: Complete sentences, in order.
+        """
+        self._buffer += text
+        sentences: list[str] = []
+        start = 0
+
+        for i, char in enumerate(self._buffer):
+            if char in CJK_SENTENCE_TERMINATORS or (char in SENTENCE_TERMINATORS and i + 1 < len(self._buffer) and self._buffer[i + 1].isspace()):
+                if sentence := self._buffer[start:i + 1].strip():
+                    sentences.append(sentence)
+                start = i + 1
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """Return whatever text is left once the stream has ended.
+
+        Returns:
+            str: Remaining text (may be empty).
+        """
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
@@ -0,0 +1,594 @@
+"""Incrementally maintained summary of Home Assistant entities for the Perplexity context."""
+import logging
+import time
+
+from collections import Counter, defaultdict
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers import area_registry, device_registry, entity_registry
+from homeassistant.util.ulid import ulid_now
+
+from .const import DOMAIN, ENTITIES_FORMAT_LINES
+from .context import EntityTokenIndex, estimate_tokens, normalize_name
+from .encoding import encode_text, is_excluded
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def encode_snapshot(part: str, entity_format: str, entity_ids: list[str], rooms: dict[str, str | None], states: dict[str, str], excluded: frozenset[str]) -> str:
+    """Encode a part of the summary from a snapshot of the index (see EntitiesSummaryIndex._snapshot).
+    Only reads its arguments, so it can run in an executor.
+
+    Args:
+        part (str): "summary", "inventory" or "states".
+        entity_format (str): ENTITIES_FORMAT_GROUPED or ENTITIES_FORMAT_TERSE.
+        entity_ids (list[str]): Entity IDs, in the order of the index.
+        rooms (dict[str, str | None]): Area ID of each entity.
+        states (dict[str, str]): State of each entity.
+        excluded (frozenset[str]): Entities left out.
+    Returns:
+        str: The encoded text.
+    """
+    return encode_text(part, entity_format, [(entity_id, rooms.get(entity_id), states.get(entity_id)) for entity_id in entity_ids if entity_id not in excluded])
+
+
+class EntitiesSummaryIndex:
+    """Keeps one summary line per entity, updated from Home Assistant events.
+
+    Instead of walking every state and querying the registries on each request,
+    the index listens to state and registry changes and only rewrites the lines
+    of the entities that are affected. Reading the summary returns the cached
+    text, which is only re-joined when a line actually changed.
+
+    Alongside the lines, the index keeps an inverted index of the entity names and
+    rooms, so the entities relevant to a prompt can be selected without a full scan,
+    and exact lookups by name and by room for the local command matcher.
+
+    The summary can also be read in two parts: the inventory (entities and rooms),
+    which only changes when entities are added, removed or moved, and the states,
+    which change all the time. Sent in this order, consecutive requests share the
+    inventory as an identical prefix.
+
+    Each text can be read as one line per entity (ENTITIES_FORMAT_LINES) or in a
+    compact encoding grouped per room and domain (see encoding.py), which leaves out
+    the diagnostic and hidden entities and collapses the unavailable ones.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the index.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+        """
+        self.hass: HomeAssistant = hass
+        self._entity_registry: entity_registry.EntityRegistry | None = None
+        self._device_registry: device_registry.DeviceRegistry | None = None
+        self._area_registry: area_registry.AreaRegistry | None = None
+
+        self._lines: dict[str, str] = {}                # entity_id -> summary line
+        self._rooms: dict[str, str | None] = {}         # entity_id -> area_id of its device
+        self._names: dict[str, str] = {}                # entity_id -> friendly name
+        self._groups: Counter[tuple[str | None, str]] = Counter()  # (area_id, domain) -> number of entities
+        self._by_name: dict[str, set[str]] = defaultdict(set)       # normalized friendly name -> entity_ids
+        self._by_room: dict[str | None, set[str]] = defaultdict(set) # area_id -> entity_ids
+        self._states: dict[str, str] = {}               # entity_id -> state
+        self._excluded: set[str] = set()                # Diagnostic and hidden entities, left out of the compact encodings
+        self._length: int = 0                           # Total length of the lines
+        self._tokens: EntityTokenIndex = EntityTokenIndex()
+        self._text: str = ""
+        self._dirty: bool = True
+        self._last_join: float = 0.0
+        self._inventory_text: str = ""
+        self._inventory_compact: bool = False
+        self._inventory_dirty: bool = True
+        self._states_text: str = ""
+        self._states_dirty: bool = True
+        self._states_last_join: float = 0.0
+        self._revision: int = 0                         # Incremented on every change of a line
+        self._inventory_revision: int = 0               # Incremented on every change of the inventory
+        self._generation: str = ""                      # Set on every start, so revisions are never compared across restarts
+        self._fingerprint: tuple[int, float] = (-1, 0.0)    # Revision last returned by fingerprint() and when
+        self._encoded: dict[tuple[str, str], tuple[int, float, str]] = {}   # (part, format) -> (revision, build time, text)
+        self._refreshing: set[tuple[str, str]] = set()  # (part, format) being encoded in an executor
+        self.background_refresh: bool = False           # Serve outdated encoded texts while they are re-encoded off the event loop
+        self.background_refreshes: int = 0
+        self.loop_time: float = 0.0                     # Seconds spent on the event loop encoding texts and taking snapshots
+        self._unsubscribers: list[CALLBACK_TYPE] = []
+
+    @property
+    def started(self) -> bool:
+        """Return whether the index is subscribed to Home Assistant events."""
+        return bool(self._unsubscribers)
+
+    @callback
+    def async_start(self) -> None:
+        """Build the initial index and subscribe to state and registry events."""
+        if self.started:
+            return
+
+        self._entity_registry = entity_registry.async_get(self.hass)
+        self._device_registry = device_registry.async_get(self.hass)
+        self._area_registry = area_registry.async_get(self.hass)
+        self._generation = ulid_now()
+        self._async_rebuild()
+
+        self._unsubscribers = [
+            self.hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_on_state_changed),
+            self.hass.bus.async_listen(entity_registry.EVENT_ENTITY_REGISTRY_UPDATED, self._async_on_entity_registry_updated),
+            self.hass.bus.async_listen(device_registry.EVENT_DEVICE_REGISTRY_UPDATED, self._async_on_device_registry_updated),
+            self.hass.bus.async_listen(area_registry.EVENT_AREA_REGISTRY_UPDATED, self._async_on_area_registry_updated),
+        ]
+
+    @callback
+    def async_stop(self) -> None:
+        """Unsubscribe from all events and drop the index."""
+        for unsubscribe in self._unsubscribers:
+            unsubscribe()
+        self._unsubscribers = []
+        self._clear()
+        self._text = ""
+        self._dirty = True
+        self._inventory_text = ""
+        self._states_text = ""
+        self._encoded.clear()
+
+    @property
+    def stats(self) -> dict:
+        """Return the number of entities indexed and left out of the compact encodings, and the cost of the encodings on the event loop."""
+        return {
+            "entities": len(self._lines),
+            "excluded": len(self._excluded),
+            "loop_time_ms": round(self.loop_time * 1000, 1),
+            "background_refreshes": self.background_refreshes,
+        }
+
+    def get_summary(self, max_age: float = 0.0, entity_format: str = ENTITIES_FORMAT_LINES) -> str:
+        """Return the current summary text.
+
+        Args:
+            max_age (float): Seconds during which a previously joined text is served even if lines changed since.
+            entity_format (str): One of ENTITIES_FORMATS.
+        Returns:
+            str: Summary of entities.
+        """
+        if entity_format != ENTITIES_FORMAT_LINES:
+            return self._get_encoded("summary", entity_format, self._revision, max_age)
+        if self._dirty and (time.monotonic() - self._last_join >= max_age or not self._text):
+            self._text = "\n- ".join((f"The Home Assistant instance has {len(self._lines)} entities.", *self._lines.values()))
+            self._dirty = False
+            self._last_join = time.monotonic()
+        return self._text
+
+    def fingerprint(self, max_age: float = 0.0) -> str:
+        """Return an identifier of the indexed entities, which changes with every change of a line.
+        No text is built, so it is cheap to call on every request.
+
+        Args:
+            max_age (float): Seconds during which the identifier last returned is returned again even if lines changed since (as get_summary serves its text).
+        Returns:
+            str: Generation of the index and revision of its lines.
+        """
+        if self._revision != self._fingerprint[0] and time.monotonic() - self._fingerprint[1] >= max_age:
+            self._fingerprint = (self._revision, time.monotonic())
+        return f"{self._generation}:{self._fingerprint[0]}"
+
+    def fits(self, token_budget: int, entity_format: str = ENTITIES_FORMAT_LINES, max_age: float = 0.0, parts: bool = False) -> bool:
+        """Return whether the full summary fits in a token budget.
+
+        Args:
+            token_budget (int): Approximate maximum number of tokens.
+            entity_format (str): One of ENTITIES_FORMATS.
+            max_age (float): See get_summary (the encoded text is measured, and kept for the next read).
+            parts (bool): Measure the inventory and the states instead of the summary, for a context sent in two parts.
+        Returns:
+            bool: True if every entity can be listed.
+        """
+        if entity_format != ENTITIES_FORMAT_LINES:
+            if parts:
+                # The texts measured are the ones sent when they fit, so the full summary is never encoded
+                return estimate_tokens(self.get_inventory(entity_format=entity_format)) + estimate_tokens(self.get_states(max_age, entity_format)) <= token_budget
+            return estimate_tokens(self.get_summary(max_age, entity_format)) <= token_budget
+        return (self._length + 3 * len(self._lines)) // 4 <= token_budget
+
+    def get_inventory(self, compact: bool = False, entity_format: str = ENTITIES_FORMAT_LINES) -> str:
+        """Return the stable part of the summary: the entities and their rooms, without their states.
+        The text is only rebuilt when entities are added, removed or moved to another room.
+
+        Args:
+            compact (bool): Only count the entities per room and domain (for installations that do not fit in the token budget).
+            entity_format (str): One of ENTITIES_FORMATS (ignored when compact).
+        Returns:
+            str: Inventory of the entities.
+        """
+        if entity_format != ENTITIES_FORMAT_LINES and not compact:
+            return self._get_encoded("inventory", entity_format, self._inventory_revision, 0.0)
+        if self._inventory_dirty or compact != self._inventory_compact or not self._inventory_text:
+            if compact:
+                rooms: dict[str | None, dict[str, int]] = defaultdict(dict)
+                for (room, domain), count in self._groups.items():
+                    if count > 0:
+                        rooms[room][domain] = count
+                lines = [
+                    f"room {room}: " + ", ".join(f"{count} {domain}" for domain, count in sorted(domains.items()))
+                    for room, domains in sorted(rooms.items(), key=lambda item: (-sum(item[1].values()), str(item[0])))
+                ]
+                header = f"The Home Assistant instance has {len(self._lines)} entities, counted per room."
+            else:
+                entities: dict[str | None, list[str]] = defaultdict(list)
+                for entity_id in self._lines:
+                    entities[self._rooms.get(entity_id)].append(entity_id)
+                # The number of entities goes last, so an entity added only changes the end of the prefix
+                lines = [f"room {room}: " + ", ".join(entity_ids) for room, entity_ids in entities.items()]
+                lines.append(f"{len(self._lines)} entities in total.")
+                header = "The entities of the Home Assistant instance, listed per room."
+            self._inventory_text = "\n- ".join((header, *lines))
+            self._inventory_compact = compact
+            self._inventory_dirty = False
+        return self._inventory_text
+
+    def get_states(self, max_age: float = 0.0, entity_format: str = ENTITIES_FORMAT_LINES) -> str:
+        """Return the volatile part of the summary: the state of every entity of the inventory.
+
+        Args:
+            max_age (float): Seconds during which a previously joined text is served even if states changed since.
+            entity_format (str): One of ENTITIES_FORMATS.
+        Returns:
+            str: States of the entities.
+        """
+        if entity_format != ENTITIES_FORMAT_LINES:
+            return self._get_encoded("states", entity_format, self._revision, max_age)
+        if self._states_dirty and (time.monotonic() - self._states_last_join >= max_age or not self._states_text):
+            self._states_text = "\n- ".join(("Current states:", *(f"{entity_id}: {state}" for entity_id, state in self._states.items())))
+            self._states_dirty = False
+            self._states_last_join = time.monotonic()
+        return self._states_text
+
+    def get_relevant_states(self, query: str, max_entities: int, token_budget: int) -> str:
+        """Return the state and room of the entities relevant to a prompt, within a token budget.
+        Complements the compact inventory when the full summary does not fit in the budget.
+
+        Args:
+            query (str): User prompt the entities are scored against.
+            max_entities (int): Maximum number of entities listed.
+            token_budget (int): Approximate maximum number of tokens.
+        Returns:
+            str: States of the relevant entities.
+        """
+        parts: list[str] = ["Only the entities relevant to the request are listed:"]
+        used: int = estimate_tokens(parts[0])
+        for entity_id, _score in self._tokens.search(query, max_entities):
+            line = self._lines.get(entity_id)
+            if line is None:
+                continue
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            parts.append(line)
+            used += cost
+        return "\n- ".join(parts)
+
+    def entities_named(self, name: str) -> set[str]:
+        """Return the entities whose friendly name matches a name.
+
+        Args:
+            name (str): Name, normalized with normalize_name.
+        Returns:
+            set[str]: Entity IDs.
+        """
+        return set(self._by_name.get(name, ()))
+
+    def entities_in_room(self, area_id: str) -> set[str]:
+        """Return the entities whose device is in an area.
+
+        Args:
+            area_id (str): Area ID.
+        Returns:
+            set[str]: Entity IDs.
+        """
+        return set(self._by_room.get(area_id, ()))
+
+    def name_of(self, entity_id: str) -> str:
+        """Return the friendly name of an indexed entity.
+
+        Args:
+            entity_id (str): Entity ID.
+        Returns:
+            str: Friendly name (empty if unknown).
+        """
+        return self._names.get(entity_id, "")
+
+    def get_relevant_summary(self, query: str, max_entities: int, token_budget: int, max_age: float = 0.0, entity_format: str = ENTITIES_FORMAT_LINES) -> str:
+        """Return a summary restricted to the entities relevant to a prompt.
+        The best matching entities are listed in full, the others are only counted per room and domain.
+        If the full summary already fits in the token budget, it is returned unchanged.
+
+        Args:
+            query (str): User prompt the entities are scored against.
+            max_entities (int): Maximum number of entities listed in full.
+            token_budget (int): Approximate maximum number of tokens of the summary.
+            max_age (float): See get_summary.
+            entity_format (str): Encoding of the full summary, see get_summary.
+        Returns:
+            str: Summary of entities.
+        """
+        if self.fits(token_budget, entity_format, max_age):
+            return self.get_summary(max_age, entity_format)
+
+        header = f"The Home Assistant instance has {len(self._lines)} entities. Only the ones relevant to the request are listed, the others are counted per room."
+        parts: list[str] = [header]
+        used: int = estimate_tokens(header)
+        others: Counter[tuple[str | None, str]] = Counter(self._groups)
+
+        for entity_id, _score in self._tokens.search(query, max_entities):
+            line = self._lines.get(entity_id)
+            if line is None:
+                continue
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            parts.append(line)
+            used += cost
+            others[(self._rooms.get(entity_id), entity_id.split(".", 1)[0])] -= 1
+
+        rooms: dict[str | None, dict[str, int]] = defaultdict(dict)
+        for (room, domain), count in others.items():
+            if count > 0:
+                rooms[room][domain] = count
+
+        for room, domains in sorted(rooms.items(), key=lambda item: -sum(item[1].values())):
+            line = f"other entities in room {room}: " + ", ".join(f"{count} {domain}" for domain, count in sorted(domains.items()))
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                parts.append("(other rooms omitted)")
+                break
+            parts.append(line)
+            used += cost
+
+        return "\n- ".join(parts)
+
+    def _get_encoded(self, part: str, entity_format: str, revision: int, max_age: float) -> str:
+        """Return a part of the summary in a compact encoding, re-encoded only when its entities changed.
+
+        The entities are copied on the event loop (a single pass over plain strings). With
+        background_refresh, an outdated text is served as is while the copy is encoded in an
+        executor and swapped in when done; otherwise it is encoded right away. The first text
+        of a part is always encoded right away.
+
+        Args:
+            part (str): "summary", "inventory" or "states".
+            entity_format (str): ENTITIES_FORMAT_GROUPED or ENTITIES_FORMAT_TERSE.
+            revision (int): Current revision of the part.
+            max_age (float): Seconds during which a previously encoded text is served even if it is outdated.
+        Returns:
+            str: The encoded text.
+        """
+        key = (part, entity_format)
+        cached = self._encoded.get(key)
+        if cached is not None and (cached[0] == revision or time.monotonic() - cached[1] < max_age):
+            return cached[2]
+
+        if cached is not None and self.background_refresh:
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                self.hass.async_create_background_task(self._async_refresh(key, revision, self._snapshot()), f"{DOMAIN} entities summary refresh")
+            return cached[2]
+
+        snapshot = self._snapshot()
+        start = time.perf_counter()
+        text = encode_snapshot(part, entity_format, *snapshot)
+        self._encoded[key] = (revision, time.monotonic(), text)
+        self.loop_time += time.perf_counter() - start
+        return text
+
+    def _snapshot(self) -> tuple[list[str], dict[str, str | None], dict[str, str], frozenset[str]]:
+        """Copy what the compact encodings read: the entity IDs in the order of the index, their rooms and states, and the excluded entities.
+        Only whole containers are copied, which is much cheaper on the event loop than a pass over the entities."""
+        start = time.perf_counter()
+        snapshot = (list(self._lines), self._rooms.copy(), self._states.copy(), frozenset(self._excluded))
+        self.loop_time += time.perf_counter() - start
+        return snapshot
+
+    async def _async_refresh(self, key: tuple[str, str], revision: int, snapshot: tuple[list[str], dict[str, str | None], dict[str, str], frozenset[str]]) -> None:
+        """Encode a snapshot in an executor and swap the text in.
+
+        Args:
+            key (tuple[str, str]): Part and format of the text.
+            revision (int): Revision of the part when the snapshot was taken.
+            snapshot (tuple[list[str], dict[str, str | None], dict[str, str], frozenset[str]]): See _snapshot.
+        """
+        try:
+            text = await self.hass.async_add_executor_job(encode_snapshot, key[0], key[1], *snapshot)
+            if self.started:
+                self._encoded[key] = (revision, time.monotonic(), text)
+                self.background_refreshes += 1
+        except Exception as err:
+            _LOGGER.warning(f"Background refresh of the entities summary failed: {err}")
+        finally:
+            self._refreshing.discard(key)
+
+    def _resolve_excluded(self, entity_id: str) -> bool:
+        """Return whether an entity is diagnostic or hidden, from its registry entry.
+
+        Args:
+            entity_id (str): Entity ID.
+        Returns:
+            bool: True if the entity is left out of the compact encodings.
+        """
+        ha_entity = self._entity_registry.async_get(entity_id) if self._entity_registry else None
+        return bool(ha_entity) and is_excluded(getattr(ha_entity, "entity_category", None), getattr(ha_entity, "hidden_by", None))
+
+    def _resolve_room(self, entity_id: str) -> str | None:
+        """Resolve the area of the device an entity belongs to.
+
+        Args:
+            entity_id (str): Entity ID.
+        Returns:
+            str | None: Area ID of the entity's device, if any.
+        """
+        ha_entity = self._entity_registry.async_get(entity_id) # Get entity registry entry (to access device_id)
+        ha_device = self._device_registry.async_get(ha_entity.device_id) if ha_entity and ha_entity.device_id else None
+        return ha_device.area_id if ha_device else None
+
+    def _set_line(self, entity_id: str, state: str, name: str | None = None) -> None:
+        """Write the summary line of an entity, marking the text dirty only if it changed.
+        The entity is re-indexed for relevance scoring only if its room or name changed.
+
+        Args:
+            entity_id (str): Entity ID.
+            state (str): Current state of the entity.
+            name (str | None): Friendly name of the entity.
+        """
+        domain, _, object_id = entity_id.partition(".")
+        name = name or self._names.get(entity_id, "")
+
+        if entity_id not in self._rooms or self._names.get(entity_id) != name:
+            if entity_id not in self._rooms:
+                self._rooms[entity_id] = self._resolve_room(entity_id)
+                if self._resolve_excluded(entity_id):
+                    self._excluded.add(entity_id)
+                else:
+                    self._excluded.discard(entity_id)
+                self._inventory_dirty = True
+                self._inventory_revision += 1
+                self._revision += 1
+                self._groups[(self._rooms[entity_id], domain)] += 1
+                self._by_room[self._rooms[entity_id]].add(entity_id)
+            if (old_name := self._names.get(entity_id)) is not None:
+                self._by_name[normalize_name(old_name)].discard(entity_id)
+            self._names[entity_id] = name
+            self._by_name[normalize_name(name)].add(entity_id)
+
+            room = self._rooms[entity_id]
+            area = self._area_registry.async_get_area(room) if self._area_registry and room else None
+            self._tokens.set_entity(entity_id, {
+                "name": name,
+                "object_id": object_id,
+                "area": f"{room} {area.name}" if area else room,
+                "domain": domain,
+            })
+
+        line = f"{entity_id}: {state} (in room: {self._rooms[entity_id]})"
+        old_line = self._lines.get(entity_id)
+        if old_line != line:
+            self._length += len(line) - len(old_line or "")
+            self._lines[entity_id] = line
+            self._dirty = True
+            self._revision += 1
+        if self._states.get(entity_id) != state:
+            self._states[entity_id] = state
+            self._states_dirty = True
+
+    def _forget_room(self, entity_id: str) -> None:
+        """Drop the cached room of an entity, so it is resolved again on the next write.
+
+        Args:
+            entity_id (str): Entity ID.
+        """
+        if entity_id in self._rooms:
+            room = self._rooms.pop(entity_id)
+            self._groups[(room, entity_id.split(".", 1)[0])] -= 1
+            self._by_room[room].discard(entity_id)
+
+    def _remove(self, entity_id: str) -> None:
+        """Remove an entity from the index.
+
+        Args:
+            entity_id (str): Entity ID.
+        """
+        self._forget_room(entity_id)
+        if (name := self._names.pop(entity_id, None)) is not None:
+            self._by_name[normalize_name(name)].discard(entity_id)
+        self._tokens.remove_entity(entity_id)
+        self._excluded.discard(entity_id)
+        if (line := self._lines.pop(entity_id, None)) is not None:
+            self._length -= len(line)
+            self._dirty = True
+            self._inventory_dirty = True
+            self._revision += 1
+            self._inventory_revision += 1
+        if self._states.pop(entity_id, None) is not None:
+            self._states_dirty = True
+
+    def _clear(self) -> None:
+        """Drop every entity from the index."""
+        self._lines.clear()
+        self._rooms.clear()
+        self._names.clear()
+        self._groups.clear()
+        self._by_name.clear()
+        self._by_room.clear()
+        self._tokens.clear()
+        self._states.clear()
+        self._excluded.clear()
+        self._length = 0
+        self._inventory_dirty = True
+        self._revision += 1
+        self._inventory_revision += 1
+        self._states_dirty = True
+
+    def _refresh_room(self, entity_id: str) -> None:
+        """Re-resolve the room of an entity and rewrite its line if it is indexed.
+        An indexed entity without a state is removed, so its line never keeps a room the roll-ups no longer count.
+
+        Args:
+            entity_id (str): Entity ID.
+        """
+        if entity_id not in self._lines:
+            self._forget_room(entity_id)
+        elif state := self.hass.states.get(entity_id):
+            self._forget_room(entity_id)
+            self._set_line(entity_id, state.state, state.name)
+        else:
+            self._remove(entity_id)
+
+    @callback
+    def _async_rebuild(self) -> None:
+        """Rebuild the whole index from the state machine."""
+        _LOGGER.debug("Building entities summary index for Perplexity context.")
+        self._clear()
+        for entity in self.hass.states.async_all():
+            self._set_line(entity.entity_id, entity.state, entity.name)
+        self._dirty = True
+
+    @callback
+    def _async_on_state_changed(self, event: Event) -> None:
+        """Update the line of the entity whose state changed."""
+        entity_id: str = event.data["entity_id"]
+        new_state = event.data.get("new_state")
+
+        if new_state is None:
+            self._remove(entity_id)
+            return
+
+        self._set_line(entity_id, new_state.state, new_state.name)
+
+    @callback
+    def _async_on_entity_registry_updated(self, event: Event) -> None:
+        """Refresh the room of an entity whose registry entry changed.
+        A renamed entity (new entity ID or name) is dropped under its old key and indexed again from its current state,
+        so its old line does not stay in the summary until the state machine removes it.
+        """
+        entity_id: str = event.data["entity_id"]
+        old_entity_id: str | None = event.data.get("old_entity_id")
+        if event.data.get("action") == "update" and (old_entity_id or {"name", "original_name"} & event.data.get("changes", {}).keys()):
+            self._remove(old_entity_id or entity_id)
+            self._remove(entity_id)
+            if state := self.hass.states.get(entity_id):
+                self._set_line(entity_id, state.state, state.name)
+            return
+        self._refresh_room(entity_id)
+
+    @callback
+    def _async_on_device_registry_updated(self, event: Event) -> None:
+        """Refresh the rooms of all entities belonging to a changed device."""
+        for ha_entity in entity_registry.async_entries_for_device(self._entity_registry, event.data["device_id"], include_disabled_entities=True):
+            self._refresh_room(ha_entity.entity_id)
+
+    @callback
+    def _async_on_area_registry_updated(self, event: Event) -> None:
+        """Refresh every room when an area is created, removed or renamed (rare, so a full pass is acceptable)."""
+        if event.data.get("action") not in ("create", "remove", "update"):
+            return
+        for entity_id in list(self._lines):
+            self._refresh_room(entity_id)
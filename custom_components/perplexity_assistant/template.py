@@ -0,0 +1,191 @@
+"""Precompiled body of the requests sent to the Perplexity API."""
+import json
+
+from datetime import datetime
+
+from .const import PROMPT_LAYOUT_CLASSIC, PROMPT_LAYOUT_STABLE_FIRST
+
+
+class RequestTemplate:
+    """Immutable request template, compiled from the configuration whenever the config entry changes.
+
+    The static parts of the JSON body (sampling parameters, response format, system prompt) are
+    serialized once. A request only carries its dynamic fields (model, length, messages, flags), which are
+    serialized and spliced after the static prefix when the request is sent.
+
+    With the stable first layout, the messages go from the most stable to the most volatile content:
+    system prompt, custom prompt and settings (part of the static prefix), entities inventory, then
+    entity states, date and user. Consecutive requests share an identical prefix up to the states,
+    which lets the API reuse its prompt cache. The classic layout sends the date and the full entities
+    summary in a single message and the custom prompt with each user message.
+    """
+    __slots__ = (
+        "model", "max_tokens", "enable_websearch", "allow_entities", "api_keys", "connect_timeout", "read_timeout", "layout",
+        "_custom_prompt", "_status_format", "_prefix",
+    )
+
+    def __init__(
+        self,
+        model: str,
+        enable_websearch: bool,
+        max_tokens: int,
+        temperature: float,
+        top_p: float,
+        frequency_penalty: float,
+        response_format: dict,
+        system_prompt: str,
+        agent_name: str,
+        ha_version: str,
+        language: str,
+        enable_vocal_notifications: bool,
+        allow_actions: bool,
+        allow_entities: bool,
+        api_keys: list[str],
+        connect_timeout: float,
+        read_timeout: float,
+        custom_prompt: str = "",
+        layout: str = PROMPT_LAYOUT_CLASSIC,
+    ) -> None:
+        """Compile the template.
+
+        Args:
+            model (str): Configured model.
+            enable_websearch (bool): Whether web search is enabled in the configuration.
+            max_tokens (int): Maximum length of the response.
+            temperature (float): Creativity.
+            top_p (float): Diversity.
+            frequency_penalty (float): Repetition penalty.
+            response_format (dict): JSON schema of the expected response.
+            system_prompt (str): Static system prompt.
+            agent_name (str): Name of the agent (title of the config entry).
+            ha_version (str): Home Assistant version.
+            language (str): Configured language.
+            enable_vocal_notifications (bool): Whether responses may be spoken on speakers.
+            allow_actions (bool): Whether actions on entities are allowed.
+            allow_entities (bool): Whether the entities may be sent to Perplexity.
+            api_keys (list[str]): Perplexity API keys, the key of the configuration first.
+            connect_timeout (float): Seconds allowed to open a connection.
+            read_timeout (float): Seconds allowed between two reads.
+            custom_prompt (str): Custom system prompt of the user.
+            layout (str): Order of the messages, PROMPT_LAYOUT_STABLE_FIRST or PROMPT_LAYOUT_CLASSIC.
+        """
+        self.model: str = model
+        self.max_tokens: int = max_tokens
+        self.enable_websearch: bool = enable_websearch
+        self.allow_entities: bool = allow_entities
+        self.api_keys: list[str] = api_keys
+        self.connect_timeout: float = connect_timeout
+        self.read_timeout: float = read_timeout
+        self.layout: str = layout
+        self._custom_prompt: str = custom_prompt
+
+        static = json.dumps({
+            "temperature": temperature,
+            "top_p": top_p,
+            "frequency_penalty": frequency_penalty,
+            "response_format": response_format,
+        })
+        system_message = json.dumps({"role": "system", "content": system_prompt})
+
+        if layout == PROMPT_LAYOUT_STABLE_FIRST:
+            # Everything that only changes with the configuration is part of the prefix
+            settings_message = json.dumps({"role": "system", "content": f"""
+            USER SYSTEM PROMPT: {custom_prompt}
+            HOME ASSISTANT VERSION: {ha_version}
+            YOUR NAME IS {agent_name}
+            AUTHORIZATIONS
+                - enable_vocal_notifications={enable_vocal_notifications}
+                - enable_actions_on_entities={allow_actions}
+            USER LANGUAGE: {language}
+            """})
+            self._prefix: bytes = f'{static[:-1]}, "messages": [{system_message}, {settings_message}'.encode()
+            self._status_format: str = """
+            ENTITY STATES: {states}
+            DATE & TIME: {now}
+            USER NAME: {username}
+            """
+        else:
+            # Only the date, the entities and the user change between two requests
+            escaped_name = agent_name.replace("{", "{{").replace("}", "}}")
+            self._prefix = f'{static[:-1]}, "messages": [{system_message}'.encode()
+            self._status_format = f"""
+            DATE & TIME: {{now}}
+            HOME ASSISTANT VERSION: {ha_version}
+            ENTITIES: {{entities}}
+            YOUR NAME IS {escaped_name}
+            AUTHORIZATIONS
+                - enable_vocal_notifications={enable_vocal_notifications}
+                - enable_actions_on_entities={allow_actions}
+            USER NAME: {{username}}
+            USER LANGUAGE: {language}
+            """
+
+    @property
+    def prefix_length(self) -> int:
+        """Return the length of the precompiled prefix of the body (static fields, system prompt and settings)."""
+        return len(self._prefix)
+
+    def system_status(self, entities: str, username: str, states: str = "") -> list[dict]:
+        """Render the SYSTEM_STATUS messages.
+
+        Args:
+            entities (str): Full entities summary (classic layout) or entities inventory (stable first layout), or why it is not available.
+            username (str): The name of the user making the request.
+            states (str): States of the entities (stable first layout only).
+        Returns:
+            list[dict]: The messages, sent before the user messages.
+        """
+        if self.layout == PROMPT_LAYOUT_STABLE_FIRST:
+            return [
+                {"role": "system", "content": f"ENTITIES: {entities}"},
+                {"role": "system", "content": self._status_format.format(states=states, now=datetime.now(), username=username)},
+            ]
+        return [{"role": "system", "content": self._status_format.format(now=datetime.now(), entities=entities, username=username)}]
+
+    def user_message(self, prompt: str) -> dict:
+        """Return the message of a user prompt (with the custom system prompt in the classic layout).
+
+        Args:
+            prompt (str): The user prompt.
+        Returns:
+            dict: The message.
+        """
+        if self.layout == PROMPT_LAYOUT_STABLE_FIRST:
+            return {"role": "user", "content": f"USER PROMPT: {prompt}"}
+        return {"role": "user", "content": f"USER SYSTEM PROMPT: {self._custom_prompt} | USER PROMPT: {prompt}"}
+
+    def payload(self, user_messages: list[dict], system_status: list[dict], override_model: str | None = None, force_websearch_access: bool = False, max_tokens: int | None = None) -> dict:
+        """Return the dynamic fields of a request (the system prompt and static fields are added by serialize).
+
+        Args:
+            user_messages (list[dict]): The user messages.
+            system_status (list[dict]): The SYSTEM_STATUS messages.
+            override_model (str | None): Model to use instead of the configured one.
+            force_websearch_access (bool): Whether to force web search access.
+            max_tokens (int | None): Maximum length of the response instead of the configured one.
+        Returns:
+            dict: {"model", "max_tokens", "messages", "stream", "disable_search"}.
+        """
+        return {
+            "model": override_model or self.model,
+            "max_tokens": max_tokens or self.max_tokens,
+            "messages": [*system_status, *user_messages],
+            "stream": False,
+            "disable_search": not self.enable_websearch and not force_websearch_access,
+        }
+
+    def serialize(self, payload: dict) -> bytes:
+        """Serialize a request: the precompiled prefix, then the dynamic fields.
+
+        Args:
+            payload (dict): Dynamic fields returned by payload (possibly with other fields changed or added).
+        Returns:
+            bytes: The JSON body.
+        """
+        messages = payload.get("messages")
+        rest = {key: value for key, value in payload.items() if key != "messages"}
+        return b"".join((
+            self._prefix,
+            b", " + json.dumps(messages)[1:].encode() if messages else b"]",
+            b", " + json.dumps(rest)[1:].encode() if rest else b"}",
+        ))
@@ -0,0 +1,197 @@
+"""Per-request tracing of the stages of a request, with latency and token histograms."""
+import logging
+import time
+
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+_LOGGER = logging.getLogger(__name__)
+
+STAGE_USER_LOOKUP: str = "user_lookup"         # Name of the user of a conversation
+STAGE_ENTITIES: str = "entities_summary"       # SYSTEM_STATUS messages (entities context)
+STAGE_PAYLOAD: str = "payload_build"           # Request payload and its serialization
+STAGE_QUEUE: str = "queue"                     # Wait for a scheduler slot
+STAGE_CONNECT: str = "connect"                 # New connection (DNS, TCP, TLS), 0 when a pooled one is reused
+STAGE_FIRST_BYTE: str = "first_byte"           # From the request sent to the response headers
+STAGE_BODY_READ: str = "body_read"             # Response body (the whole stream for streamed responses)
+STAGE_VALIDATION: str = "validation"           # Validation of the response content
+STAGE_ACTIONS: str = "action_dispatch"         # Execution of the actions of the response
+STAGES: list[str] = [
+    STAGE_USER_LOOKUP, STAGE_ENTITIES, STAGE_PAYLOAD, STAGE_QUEUE, STAGE_CONNECT,
+    STAGE_FIRST_BYTE, STAGE_BODY_READ, STAGE_VALIDATION, STAGE_ACTIONS,
+]
+
+SOURCE_API: str = "api"
+SOURCE_CACHE: str = "cache"
+SOURCE_FAST_PATH: str = "fast_path"
+
+
+class RequestTrace:
+    """Durations of the stages of one request, and its token counts.
+    The durations of retried or hedged attempts add up.
+    """
+    __slots__ = ("kind", "source", "stages", "prompt_tokens", "completion_tokens", "_start", "_total")
+
+    def __init__(self, kind: str) -> None:
+        """Start the trace.
+
+        Args:
+            kind (str): What started the request ("conversation" or "service").
+        """
+        self.kind: str = kind
+        self.source: str = SOURCE_API
+        self.stages: dict[str, float] = {}     # stage -> seconds
+        self.prompt_tokens: int | None = None
+        self.completion_tokens: int | None = None
+        self._start: float = time.perf_counter()
+        self._total: float | None = None
+
+    @property
+    def total(self) -> float:
+        """Return the duration of the request in seconds (until it was recorded)."""
+        return self._total if self._total is not None else time.perf_counter() - self._start
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the duration of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add a duration to a stage.
+
+        Args:
+            name (str): One of STAGES.
+            seconds (float): Duration.
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def set_usage(self, usage: dict | None) -> None:
+        """Record the token counts of the "usage" field of a response."""
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens")
+            self.completion_tokens = usage.get("completion_tokens")
+
+    def finish(self) -> None:
+        """Stop the clock of the request."""
+        self._total = time.perf_counter() - self._start
+
+    def as_dict(self) -> dict:
+        """Return the trace, durations in milliseconds."""
+        return {
+            "kind": self.kind,
+            "source": self.source,
+            "total_ms": round(self.total * 1000, 1),
+            "stages_ms": {name: round(self.stages[name] * 1000, 1) for name in STAGES if name in self.stages},
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class Histogram:
+    """Sliding window of values, summarized by percentiles."""
+
+    def __init__(self, window: int) -> None:
+        """Initialize the histogram.
+
+        Args:
+            window (int): Number of values kept.
+        """
+        self._values: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        """Return the number of values kept."""
+        return len(self._values)
+
+    def add(self, value: float) -> None:
+        """Record a value."""
+        self._values.append(value)
+
+    def percentile(self, percent: float) -> float | None:
+        """Return a percentile of the recorded values (None without values)."""
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self) -> dict:
+        """Return {"count", "mean", "p50", "p95", "max"} of the recorded values."""
+        if not self._values:
+            return {"count": 0, "mean": None, "p50": None, "p95": None, "max": None}
+        return {
+            "count": len(self._values),
+            "mean": round(sum(self._values) / len(self._values), 1),
+            "p50": round(self.percentile(50), 1),
+            "p95": round(self.percentile(95), 1),
+            "max": round(max(self._values), 1),
+        }
+
+
+class RequestTracer:
+    """Collects the traces of the requests: latency and token histograms, and the most recent traces."""
+
+    def __init__(self, window: int, recent: int) -> None:
+        """Initialize the tracer.
+
+        Args:
+            window (int): Number of requests the histograms are computed on.
+            recent (int): Number of traces kept in full.
+        """
+        self.window: int = window
+        self.requests: int = 0
+        self.latency: Histogram = Histogram(window)                                  # milliseconds
+        self.stages: dict[str, Histogram] = {name: Histogram(window) for name in STAGES} # milliseconds
+        self.prompt_tokens: Histogram = Histogram(window)
+        self.completion_tokens: Histogram = Histogram(window)
+        self.total_tokens: Histogram = Histogram(window)
+        self._recent: deque[RequestTrace] = deque(maxlen=recent)
+
+    @property
+    def stats(self) -> dict:
+        """Return the histograms (durations in milliseconds) and the most recent traces."""
+        return {
+            "requests": self.requests,
+            "latency_ms": self.latency.summary(),
+            "stages_ms": {name: histogram.summary() for name, histogram in self.stages.items() if len(histogram)},
+            "tokens": {
+                "prompt": self.prompt_tokens.summary(),
+                "completion": self.completion_tokens.summary(),
+                "total": self.total_tokens.summary(),
+            },
+            "recent": [trace.as_dict() for trace in reversed(self._recent)],
+        }
+
+    def record(self, trace: RequestTrace) -> None:
+        """Record a finished request.
+
+        Args:
+            trace (RequestTrace): Its trace.
+        """
+        trace.finish()
+        self.requests += 1
+        self.latency.add(trace.total * 1000)
+        for name, seconds in trace.stages.items():
+            if name != STAGE_ACTIONS: # Reported by add_stage when the actions finish, possibly after the request
+                self.stages[name].add(seconds * 1000)
+        if trace.prompt_tokens is not None and trace.completion_tokens is not None:
+            self.prompt_tokens.add(trace.prompt_tokens)
+            self.completion_tokens.add(trace.completion_tokens)
+            self.total_tokens.add(trace.prompt_tokens + trace.completion_tokens)
+        self._recent.append(trace)
+        _LOGGER.debug(f"Perplexity request trace: {trace.as_dict()}")
+
+    def add_stage(self, trace: RequestTrace, name: str, seconds: float) -> None:
+        """Record a stage that finished after its request (the actions of a voice request keep running while the answer is spoken).
+
+        Args:
+            trace (RequestTrace): Trace of the request.
+            name (str): One of STAGES.
+            seconds (float): Duration.
+        """
+        trace.add(name, seconds)
+        self.stages[name].add(seconds * 1000)
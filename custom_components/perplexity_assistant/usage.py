@@ -0,0 +1,165 @@
+"""Persistent ledger of the tokens, cost and requests billed by the Perplexity API."""
+import logging
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import *
+
+
+_LOGGER = logging.getLogger(__name__)
+
+CALLER_CONVERSATION: str = "conversation"   # Voice and chat requests
+CALLER_SERVICE: str = "service"             # ask and ask_batch service calls
+
+
+def new_bucket() -> dict:
+    """Return empty usage totals."""
+    return {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+def usage_cost(usage: dict | None) -> float:
+    """Return the cost of a request from the "usage" field of its response (0 if absent)."""
+    return ((usage or {}).get("cost") or {}).get("total_cost") or 0.0
+
+
+class UsageLedger:
+    """Usage totals per model, user, caller, month and day, persisted in a Home Assistant Store.
+
+    Recording a request only updates a few counters in memory; writes to disk are
+    debounced, so thousands of requests a day cost a handful of writes. Daily totals
+    are kept for a limited number of days, monthly and per-key totals forever.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, days_kept: int = USAGE_DAYS_KEPT) -> None:
+        """Initialize the ledger.
+
+        Args:
+            hass (HomeAssistant): Home Assistant instance.
+            entry_id (str): Configuration entry ID (one ledger per entry).
+            days_kept (int): Number of days the daily totals are kept.
+        """
+        self.hass: HomeAssistant = hass
+        self.days_kept: int = days_kept
+        self._store: Store = Store(hass, USAGE_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.usage")
+        self._data: dict = self._empty()
+
+    @staticmethod
+    def _empty() -> dict:
+        """Return an empty ledger."""
+        return {"total": new_bucket(), "models": {}, "users": {}, "callers": {}, "months": {}, "days": {}, "imported": []}
+
+    @property
+    def total(self) -> dict:
+        """Return the all-time totals."""
+        return self._data["total"]
+
+    @property
+    def today(self) -> dict:
+        """Return the totals of the current day."""
+        return self._data["days"].get(dt_util.now().date().isoformat(), new_bucket())
+
+    @property
+    def month(self) -> dict:
+        """Return the totals of the current month."""
+        return self._data["months"].get(dt_util.now().strftime("%Y-%m"), new_bucket())
+
+    def breakdown(self, key: str) -> dict[str, dict]:
+        """Return the totals per model, user or caller.
+
+        Args:
+            key (str): "models", "users" or "callers".
+        Returns:
+            dict[str, dict]: Totals per value.
+        """
+        return self._data[key]
+
+    async def async_load(self) -> None:
+        """Load the persisted ledger."""
+        stored: dict | None = await self._store.async_load()
+        if stored:
+            self._data = {**self._empty(), **stored}
+
+    async def async_save(self) -> None:
+        """Write the ledger to disk immediately (used on unload)."""
+        await self._store.async_save(self._data)
+
+    def record(self, model: str, user: str, caller: str, usage: dict | None) -> None:
+        """Record a request billed by the API.
+
+        Args:
+            model (str): Model that answered.
+            user (str): Name of the user (or AUTOMATED SERVICE CALL).
+            caller (str): CALLER_CONVERSATION or CALLER_SERVICE.
+            usage (dict | None): The "usage" field of the response.
+        """
+        usage = usage or {}
+        prompt_tokens: int = usage.get("prompt_tokens") or 0
+        completion_tokens: int = usage.get("completion_tokens") or 0
+        cost: float = usage_cost(usage)
+
+        now = dt_util.now()
+        day = now.date().isoformat()
+        days: dict = self._data["days"]
+        if day not in days:
+            days[day] = new_bucket()
+            self._prune_days(days)
+
+        for bucket in (
+            self._data["total"],
+            self._data["models"].setdefault(model, new_bucket()),
+            self._data["users"].setdefault(user, new_bucket()),
+            self._data["callers"].setdefault(caller, new_bucket()),
+            self._data["months"].setdefault(now.strftime("%Y-%m"), new_bucket()),
+            days[day],
+        ):
+            bucket["requests"] += 1
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            bucket["cost"] += cost
+
+        self._store.async_delay_save(lambda: self._data, USAGE_SAVE_DELAY)
+
+    def import_cost(self, kind: str, cost: float) -> None:
+        """Import a cost accumulated before the ledger existed (the restored state of a cost sensor), once.
+
+        Args:
+            kind (str): "total" or "month".
+            cost (float): The cost to import.
+        """
+        if kind in self._data["imported"]:
+            return
+        self._data["imported"].append(kind)
+        if cost > 0:
+            bucket = self._data["total"] if kind == "total" else self._data["months"].setdefault(dt_util.now().strftime("%Y-%m"), new_bucket())
+            bucket["cost"] += cost
+            _LOGGER.info(f"Imported a {kind} cost of {cost} into the Perplexity usage ledger.")
+        self._store.async_delay_save(lambda: self._data, USAGE_SAVE_DELAY)
+
+    def report(self, days: int) -> dict:
+        """Return the usage report of the get_usage service.
+
+        Args:
+            days (int): Number of days of daily totals included.
+        Returns:
+            dict: {"total", "month", "today", "models", "users", "callers", "days"}, costs rounded.
+        """
+        recent = sorted(self._data["days"].items())[-days:] if days else []
+        return {
+            "total": self._rounded(self.total),
+            "month": self._rounded(self.month),
+            "today": self._rounded(self.today),
+            **{key: {name: self._rounded(bucket) for name, bucket in self._data[key].items()} for key in ("models", "users", "callers")},
+            "days": {day: self._rounded(bucket) for day, bucket in recent},
+        }
+
+    def _prune_days(self, days: dict) -> None:
+        """Drop the oldest daily totals beyond days_kept (only called when a day starts)."""
+        for day in sorted(days)[:-self.days_kept]:
+            del days[day]
+
+    @staticmethod
+    def _rounded(bucket: dict) -> dict:
+        """Return a copy of a bucket with its cost rounded."""
+        return {**bucket, "cost": round(bucket["cost"], 6)}